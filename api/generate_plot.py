@@ -10,11 +10,22 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "..", "core"))
 from data_fetcher import SimpleInterval
 from time_pattern import AdvancedPattern  # type: ignore # Add this import
 import utils as utils
-from core.core import generate_visualization
+from core.core import (
+    cached_response,
+    generate_visualization,
+    response_tag,
+    serialize_response,
+    start_preload,
+    store_response,
+)
 
 # Configure logging to write to stderr which Vercel can capture
 logger = logging.getLogger(__name__)
 
+# Opt-in warm-up of a new instance while it waits for its first request
+if os.getenv("ENTSOE_PRELOAD_CACHE"):
+    start_preload()
+
 
 def sanitize_exception(e):
     # Convert exception to string
@@ -27,7 +38,40 @@ def sanitize_exception(e):
     return error_message
 
 
-def handle_request(request_body):
+def _etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/").strip('"') == tag for candidate in candidates
+    )
+
+
+def _cached_response(data_request, if_none_match):
+    """The tag of the response to data_request, and the 304 or stored 200 response
+    if the data has not changed since it was served. Invalid requests are left to
+    generate_visualization."""
+    try:
+        # Tagged by the request and the data generation
+        tag = response_tag(data_request)
+        if tag is None:
+            return None, None
+        if _etag_matches(if_none_match, tag):
+            return tag, {"statusCode": 304, "body": "", "headers": {"ETag": f'"{tag}"'}}
+        cached_body = cached_response(tag)
+    except Exception as e:
+        logger.warning("Response cache lookup failed: %s", sanitize_exception(e))
+        return None, None
+    if cached_body is None:
+        return tag, None
+    return tag, {
+        "statusCode": 200,
+        "body": cached_body,
+        "headers": {"ETag": f'"{tag}"'},
+    }
+
+
+def handle_request(request_body, if_none_match=None):
     body = json.loads(request_body)
     try:
         if body["mode"] == "simple":
@@ -43,6 +87,12 @@ def handle_request(request_body):
                 hours=body["hours"],
             )
 
+        # The tag is taken before the data is fetched, so the response stored
+        # under it below is at least as new as the generation it names
+        tag, cached = _cached_response(data_request, if_none_match)
+        if cached is not None:
+            return cached
+
         aggregated, contributions = generate_visualization(
             data_request,
             config=body,
@@ -66,19 +116,14 @@ def handle_request(request_body):
             ),
         }
 
-    # Serialize the dataframes
-    aggregated_json = aggregated.to_json(orient="split")
-    contributions_json = {
-        country: df.to_json(orient="split") for country, df in contributions.items()
-    }
-
-    # Create the response body
-    response_data = {
-        "aggregated": aggregated_json,
-        "contributions": contributions_json,
-    }
-
-    return {"statusCode": 200, "body": json.dumps({"data": response_data})}
+    response_body = serialize_response(aggregated, contributions)
+    try:
+        tag = store_response(tag, response_body)
+    except Exception as e:
+        logger.warning("Could not cache the response: %s", sanitize_exception(e))
+        tag = None
+    headers = {"ETag": f'"{tag}"'} if tag is not None else {}
+    return {"statusCode": 200, "body": response_body, "headers": headers}
 
 
 class handler(BaseHTTPRequestHandler):
@@ -95,10 +140,14 @@ class handler(BaseHTTPRequestHandler):
         content_length = int(self.headers["Content-Length"])
         post_data = self.rfile.read(content_length).decode("utf-8")
 
-        response = handle_request(post_data)
+        response = handle_request(post_data, self.headers.get("If-None-Match"))
 
         self.send_response(int(response['statusCode']))
-        self.send_header("Content-type", "application/json")
+        if response['statusCode'] != 304:
+            self.send_header("Content-type", "application/json")
+        for name, value in response.get("headers", {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(str(response['body']).encode('utf-8'))
+        if response['statusCode'] != 304:
+            self.wfile.write(str(response['body']).encode('utf-8'))
         return
@@ -0,0 +1,100 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import fields
+from typing import Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+from data_fetcher import DataRequest, ENTSOEDataFetcher
+from time_pattern import AdvancedPattern
+
+logger = logging.getLogger(__name__)
+
+# LRU of analyzer.analyze outputs (aggregated, contributions) of recently served
+# requests. Entries are keyed by the canonical form of the request (request_key)
+# and the data generation they were computed from
+# (ENTSOEDataFetcher.data_generation), so a result is only reused while the data
+# behind it is unchanged. Bounded by the total bytes of the held frames.
+
+DEFAULT_MAX_BYTES = int(os.getenv("ENTSOE_ANALYSIS_CACHE_MB", "64")) * 1024 * 1024
+
+Analysis = Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]
+
+
+def request_key(data_request: DataRequest) -> Hashable:
+    """Canonical form of a request: requests selecting the same hours get the
+    same key, e.g. patterns written "1-3" and "1,2,3". A pattern also keys on the
+    last hour it spans, which moves with the current time when it is open-ended."""
+    start_date, end_date, rules = ENTSOEDataFetcher._request_bounds(data_request)
+    if rules is None:
+        return ("interval", start_date, end_date)
+    assert isinstance(data_request, AdvancedPattern)
+    return (
+        "pattern",
+        end_date,
+        *(tuple(sorted(set(getattr(rules, f.name)))) for f in fields(rules)),
+    )
+
+
+def _nbytes(analysis: Analysis) -> int:
+    aggregated, contributions = analysis
+    return int(
+        sum(
+            df.memory_usage(index=True, deep=False).sum()
+            for df in [aggregated, *contributions.values()]
+        )
+    )
+
+
+def _copy(analysis: Analysis) -> Analysis:
+    aggregated, contributions = analysis
+    return aggregated.copy(), {
+        country: df.copy() for country, df in contributions.items()
+    }
+
+
+class AnalysisMemo:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # (request key, generation) -> (analysis, bytes), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: Hashable) -> Optional[Analysis]:
+        """A copy of the held analysis, None on a miss. Nothing is held for an
+        unknown (None) generation."""
+        if generation is None:
+            return None
+        with self._lock:
+            entry = self._entries.get((key, generation))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, generation))
+            self.hits += 1
+        logger.debug(f"Analysis memo hit ({self.hits} hit(s), {self.misses} miss(es))")
+        return _copy(entry[0])
+
+    def put(self, key: Hashable, generation: Hashable, analysis: Analysis):
+        """Hold a copy of analysis, evicting the least recently used ones to stay
+        within max_bytes."""
+        nbytes = _nbytes(analysis)
+        if generation is None or nbytes > self.max_bytes:
+            return
+        analysis = _copy(analysis)
+        with self._lock:
+            if (key, generation) in self._entries:
+                self.size -= self._entries.pop((key, generation))[1]
+            while self.size + nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+            self._entries[(key, generation)] = (analysis, nbytes)
+            self.size += nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
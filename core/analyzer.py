@@ -34,6 +34,9 @@ def remove_empty_columns(df: pd.DataFrame):
 def prepare_data(data: Data):
     # This is handy while the stash fixing saved/loaded indexes is not fixed
     def _ensure_index_and_sorting(df: pd.DataFrame):
+        if df.attrs.get("canonical"):
+            # Stored sorted, deduplicated and on the hourly grid (utils.canonicalize)
+            return df.set_index("start_time") if "start_time" in df.columns else df
         if "start_time" in df.columns:
             df = df.set_index("start_time")
             df.index = pd.to_datetime(df.index)
@@ -43,6 +46,9 @@ def prepare_data(data: Data):
         return df
 
     def _interpolate_missing_data(df: pd.DataFrame):
+        if df.attrs.get("canonical"):
+            # Gaps were filled when the data was stored
+            return df
         # Remove columns where all values are 0
         df = df.interpolate("linear")
         # Interpolate does not remove first NaNs, which is good.
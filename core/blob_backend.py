@@ -0,0 +1,323 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import utils
+from cache_backend import CacheBackend, ReadOnlyCacheError
+from cache_store import shard_origin
+from interval_set import Interval, IntervalSet
+
+logger = logging.getLogger(__name__)
+
+# Read-only cache backend over plain HTTP(S) blob storage:
+#
+#   <base_url>/index.json -> {
+#       "version": 1,
+#       "series": {
+#           "<cache_name>": {
+#               "params": {...},
+#               "coverage": [[start, end], ...],
+#               "canonical": true | false,
+#               "columns": [...],
+#               "shards": {
+#                   "<year>": {"object": "<cache_name>/<year>-<hash>.f64",
+#                              "first_row": a, "rows": b,
+#                              "columns": {"<column>": <byte offset>, ...}},
+#               },
+#           },
+#       },
+#   }
+#   <base_url>/<cache_name>/<year>-<hash>.f64
+#       -> rows [first_row, rows) of every column of the year shard, as
+#          contiguous little-endian float64 blocks
+#
+# Rows are on the same hourly grid as cache_store, so the bytes of an interval of
+# one column are a single contiguous range: a load sends one HTTP Range request per
+# (shard, column) it needs, all in parallel, instead of downloading whole series.
+# prefetch() downloads whole shards in parallel ahead of time (the fetcher's
+# preload does so for the newest years) and holds them in a byte-bounded LRU.
+# Objects are named by content hash and never change; only index.json is
+# replaced, so a publish is atomic for readers and CDN caching of the objects is
+# safe.
+#
+# Objects are produced from any other backend with export_blob_cache() and
+# uploaded as-is.
+
+
+class BlobBackend(CacheBackend):
+    INDEX_OBJECT = "index.json"
+    VERSION = 1
+    # How long a downloaded index is trusted before it is fetched again
+    INDEX_TTL = 60.0
+    MAX_PARALLEL_REQUESTS = 8
+    TIMEOUT = 30.0
+
+    def __init__(self, base_url: str, max_object_bytes: int = 64 * 1024 * 1024):
+        super().__init__(base_url)
+        self.base_url = base_url.rstrip("/")
+        self._index: Optional[Dict[str, Any]] = None
+        self._index_time = 0.0
+        self.max_object_bytes = max_object_bytes
+        self.object_bytes = 0
+        # Whole shard objects downloaded by prefetch(), least recently used first
+        self._objects: OrderedDict = OrderedDict()
+        # Loads and prefetches run in worker threads
+        self._objects_lock = threading.Lock()
+
+    def _get(self, path: str, byte_range: Optional[Tuple[int, int]] = None) -> bytes:
+        """GET an object, or the bytes [start, end) of it."""
+        request = urllib.request.Request(f"{self.base_url}/{path}")
+        if byte_range is not None:
+            request.add_header("Range", f"bytes={byte_range[0]}-{byte_range[1] - 1}")
+        with urllib.request.urlopen(request, timeout=self.TIMEOUT) as response:
+            data = response.read()
+            if byte_range is not None and response.status != 206:
+                # The server ignored the Range header and sent the whole object
+                data = data[byte_range[0] : byte_range[1]]
+        return data
+
+    def _series_entry(self, cache_name: str) -> Optional[Dict[str, Any]]:
+        if self._index is None or time.monotonic() - self._index_time > self.INDEX_TTL:
+            try:
+                self._index = json.loads(self._get(self.INDEX_OBJECT))
+            except OSError as e:
+                # URLError (HTTPError included) and socket timeouts
+                if isinstance(e, urllib.error.HTTPError) and e.code == 404:
+                    logger.warning(f"No blob cache index at {self.base_url}")
+                    self._index = {"series": {}}
+                else:
+                    # Keep serving the index last read (the local tiers answer the
+                    # rest) and only try again after INDEX_TTL
+                    logger.warning(
+                        f"Could not read the blob cache index at {self.base_url}: {e}"
+                    )
+                    if self._index is None:
+                        self._index = {"series": {}}
+            self._index_time = time.monotonic()
+        return self._index["series"].get(cache_name)
+
+    def series(self) -> List[str]:
+        self._series_entry("")
+        return sorted(self._index["series"])  # type: ignore
+
+    def coverage(self, cache_name: str) -> IntervalSet:
+        entry = self._series_entry(cache_name)
+        return IntervalSet.from_json(entry["coverage"]) if entry else IntervalSet()
+
+    def params(self, cache_name: str) -> Dict[str, Any]:
+        entry = self._series_entry(cache_name)
+        return dict(entry["params"]) if entry else {}
+
+    def canonical(self, cache_name: str) -> bool:
+        entry = self._series_entry(cache_name)
+        return bool(entry and entry.get("canonical", False))
+
+    def version(self, cache_name: str) -> Optional[Hashable]:
+        # Shard objects are named by content hash
+        entry = self._series_entry(cache_name)
+        if not entry:
+            return ()
+        return tuple(sorted(shard["object"] for shard in entry["shards"].values()))
+
+    def _held_object(self, name: str) -> Optional[bytes]:
+        with self._objects_lock:
+            data = self._objects.get(name)
+            if data is not None:
+                self._objects.move_to_end(name)
+            return data
+
+    def _hold_object(self, name: str, data: bytes):
+        """Keep a downloaded shard object, evicting the least recently used ones to
+        stay within max_object_bytes. Objects larger than that are not kept."""
+        if len(data) > self.max_object_bytes:
+            return
+        with self._objects_lock:
+            if name in self._objects:
+                return
+            while self.object_bytes + len(data) > self.max_object_bytes:
+                _, evicted = self._objects.popitem(last=False)
+                self.object_bytes -= len(evicted)
+            self._objects[name] = data
+            self.object_bytes += len(data)
+
+    def prefetch(self, cache_name: str, years: Optional[List[int]] = None):
+        """Download whole shards of the series (all by default) in parallel, so
+        later loads of them need no requests while they stay held."""
+        entry = self._series_entry(cache_name)
+        if not entry:
+            return
+        with self._objects_lock:
+            objects = [
+                shard["object"]
+                for year, shard in entry["shards"].items()
+                if (years is None or int(year) in years)
+                and shard["object"] not in self._objects
+            ]
+        with ThreadPoolExecutor(self.MAX_PARALLEL_REQUESTS) as executor:
+            for name, data in zip(objects, executor.map(self._get, objects)):
+                self._hold_object(name, data)
+
+    def load(
+        self,
+        cache_name: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        entry = self._series_entry(cache_name)
+        stored_columns = entry["columns"] if entry else []
+        if columns is None:
+            columns = stored_columns
+        else:
+            columns = [column for column in columns if column in stored_columns]
+        shards = {
+            int(year): shard for year, shard in (entry or {}).get("shards", {}).items()
+        }
+        if start_date is not None:
+            shards = {y: s for y, s in shards.items() if y >= start_date.year}
+        if end_date is not None:
+            last_year = (end_date - utils.HOUR).year
+            shards = {y: s for y, s in shards.items() if y <= last_year}
+        if not shards:
+            return pd.DataFrame(columns=["start_time"] + columns)
+
+        years = sorted(shards)
+        first = (
+            utils.hour_offset(shard_origin(years[0])) + shards[years[0]]["first_row"]
+        )
+        last = utils.hour_offset(shard_origin(years[-1])) + shards[years[-1]]["rows"]
+        if start_date is not None:
+            first = max(first, utils.hour_offset(start_date))
+        if end_date is not None:
+            last = min(last, utils.hour_offset(end_date))
+        last = max(first, last)
+
+        # One byte range per (shard, column) overlapping [first, last)
+        reads = []
+        for year in years:
+            shard = shards[year]
+            origin = utils.hour_offset(shard_origin(year))
+            shard_first = max(first, origin + shard["first_row"])
+            shard_last = min(last, origin + shard["rows"])
+            if shard_first >= shard_last:
+                continue
+            for column in columns:
+                if column not in shard["columns"]:
+                    continue
+                offset = shard["columns"][column]
+                start_row = shard_first - origin - shard["first_row"]
+                end_row = shard_last - origin - shard["first_row"]
+                byte_range = (offset + start_row * 8, offset + end_row * 8)
+                reads.append((shard["object"], byte_range, column, shard_first))
+
+        def read(shard_object: str, byte_range: Tuple[int, int]) -> bytes:
+            data = self._held_object(shard_object)
+            if data is not None:
+                return data[byte_range[0] : byte_range[1]]
+            return self._get(shard_object, byte_range)
+
+        with ThreadPoolExecutor(self.MAX_PARALLEL_REQUESTS) as executor:
+            blocks = list(
+                executor.map(lambda r: read(r[0], r[1]), reads)  # type: ignore
+            )
+
+        data = {column: np.full(last - first, np.nan) for column in columns}
+        for (_, _, column, block_first), block in zip(reads, blocks):
+            values = np.frombuffer(block, dtype="<f8")
+            data[column][
+                block_first - first : block_first - first + len(values)
+            ] = values
+        times = pd.date_range(
+            utils.hour_at(first), periods=last - first, freq=utils.HOUR
+        )
+        return pd.DataFrame({"start_time": times, **data})
+
+    def append(
+        self,
+        cache_name: str,
+        params: Dict[str, Any],
+        df: pd.DataFrame,
+        covered: List[Interval],
+        canonical: bool = False,
+    ):
+        raise ReadOnlyCacheError(
+            "The blob cache is read-only; publish it with export_blob_cache()"
+        )
+
+    def delete(self, cache_name: str):
+        raise ReadOnlyCacheError(
+            "The blob cache is read-only; publish it with export_blob_cache()"
+        )
+
+
+def export_blob_cache(source: CacheBackend, out_dir: str) -> List[str]:
+    """Write every series of source in the BlobBackend layout under out_dir, ready
+    to be uploaded. Returns the names of the written objects, index last."""
+    index: Dict[str, Any] = {"version": BlobBackend.VERSION, "series": {}}
+    written = []
+    for cache_name in source.series():
+        coverage = source.coverage(cache_name)
+        df = source.load(cache_name)
+        columns = [column for column in df.columns if column != "start_time"]
+        entry = {
+            "params": source.params(cache_name),
+            "coverage": coverage.to_json(),
+            "canonical": source.canonical(cache_name),
+            "columns": columns,
+            "shards": {},
+        }
+        if not df.empty:
+            offsets = (
+                (df["start_time"] - pd.Timestamp(utils.RECORDS_START)) // utils.HOUR
+            ).to_numpy(dtype="int64")
+            years = df["start_time"].dt.year.to_numpy()
+            for year in np.unique(years):
+                in_shard = years == year
+                rows = offsets[in_shard] - utils.hour_offset(shard_origin(int(year)))
+                first_row, end_row = int(rows.min()), int(rows.max()) + 1
+                blocks = {}
+                for column in columns:
+                    values = np.full(end_row - first_row, np.nan, dtype="<f8")
+                    values[rows - first_row] = df[column].to_numpy(dtype="float64")[
+                        in_shard
+                    ]
+                    blocks[column] = values.tobytes()
+                payload = b"".join(blocks.values())
+                digest = hashlib.sha256(payload).hexdigest()[:16]
+                name = f"{cache_name}/{int(year)}-{digest}.f64"
+                os.makedirs(os.path.join(out_dir, cache_name), exist_ok=True)
+                with open(os.path.join(out_dir, name), "wb") as f:
+                    f.write(payload)
+                written.append(name)
+
+                column_offsets, offset = {}, 0
+                for column, block in blocks.items():
+                    column_offsets[column] = offset
+                    offset += len(block)
+                entry["shards"][str(int(year))] = {
+                    "object": name,
+                    "first_row": first_row,
+                    "rows": end_row,
+                    "columns": column_offsets,
+                }
+        index["series"][cache_name] = entry
+
+    os.makedirs(out_dir, exist_ok=True)
+    index_path = os.path.join(out_dir, BlobBackend.INDEX_OBJECT)
+    with open(f"{index_path}.tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(f"{index_path}.tmp", index_path)
+    written.append(BlobBackend.INDEX_OBJECT)
+    return written
@@ -0,0 +1,266 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional
+
+import pandas as pd
+
+from cache_manifest import CacheManifest, ManifestSnapshot
+from cache_store import ColumnarCacheStore, ShardMap
+from file_lock import FileLock
+from interval_set import Interval, IntervalSet
+
+logger = logging.getLogger(__name__)
+
+# Storage backends of the data cache. ENTSOEDataFetcher only talks to this
+# interface, so the on-disk format can be swapped (ENTSOE_CACHE_BACKEND):
+#
+#   - "columnar": per-year column shards plus manifest generations (the default)
+#   - "sqlite":   a single SQLite database, see sqlite_backend
+#
+# blob_backend adds a read-only backend over HTTP blob storage, used as the base
+# tier when ENTSOE_CACHE_BLOB_URL is set.
+
+
+class ReadOnlyCacheError(Exception):
+    """A write to a cache tier that cannot be written, such as the blob tier."""
+
+
+class CacheBackend(ABC):
+    """Storage of cached series: hourly rows plus the intervals they cover."""
+
+    LOCK_DIR = ".locks"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @abstractmethod
+    def series(self) -> List[str]:
+        """Names of the cached series."""
+
+    @abstractmethod
+    def coverage(self, cache_name: str) -> IntervalSet:
+        """The intervals that have been fetched for the series."""
+
+    @abstractmethod
+    def params(self, cache_name: str) -> Dict[str, Any]:
+        """The ENTSO-E request parameters of the series."""
+
+    def canonical(self, cache_name: str) -> bool:
+        """Whether every stored row of the series is canonical (utils.canonicalize),
+        so readers can use it without normalizing it again."""
+        return False
+
+    def version(self, cache_name: str) -> Optional[Hashable]:
+        """Token that changes whenever the stored rows of the series change, so
+        loaded copies can be reused while it stays the same. None if the backend
+        cannot tell (such series are not held in memory)."""
+        return None
+
+    def stored_form(self, df: pd.DataFrame) -> pd.DataFrame:
+        """df as it would be loaded back once appended, for backends that store
+        values lossily. Lets callers compare new rows with stored ones."""
+        return df
+
+    @abstractmethod
+    def load(
+        self,
+        cache_name: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """Load the hours start_date <= start_time < end_date for the given columns
+        (all of them by default). Missing bounds mean the whole stored range."""
+
+    @abstractmethod
+    def append(
+        self,
+        cache_name: str,
+        params: Dict[str, Any],
+        df: pd.DataFrame,
+        covered: List[Interval],
+        canonical: bool = False,
+    ):
+        """Merge the rows of df into the series, replacing stored rows for the same
+        hours, and mark covered as fetched. Readers see either none or all of it.
+        The series stays canonical only while all of its rows were appended with
+        canonical=True."""
+
+    @abstractmethod
+    def delete(self, cache_name: str):
+        """Remove the series and its coverage."""
+
+    def lock(self, cache_name: str) -> FileLock:
+        """Cross-process lock held by the single writer of the series."""
+        return FileLock(
+            os.path.join(self.cache_dir, self.LOCK_DIR, f"{cache_name}.lock")
+        )
+
+
+class ColumnarBackend(CacheBackend):
+    """Year-sharded columnar store (cache_store) published through manifest
+    generations (cache_manifest). Legacy <name>.pkl.gz pickles in the cache
+    directory are read as a fallback and migrated on the first write."""
+
+    def __init__(
+        self, cache_dir: str, codec: str = "npy", legacy_extension: str = "pkl.gz"
+    ):
+        super().__init__(cache_dir)
+        self.store = ColumnarCacheStore(cache_dir, codec)
+        self.manifest = CacheManifest(cache_dir)
+        self.legacy_extension = legacy_extension
+
+    def _legacy_file(self, cache_name: str) -> str:
+        return os.path.join(self.cache_dir, f"{cache_name}.{self.legacy_extension}")
+
+    def _published_shards(
+        self, cache_name: str, snapshot: Optional[ManifestSnapshot] = None
+    ) -> ShardMap:
+        snapshot = snapshot if snapshot is not None else self.manifest.snapshot
+        shard_map = snapshot.shard_map(cache_name)
+        if shard_map is None:
+            # Written before the manifest tracked shard versions
+            return self.store.shard_map(cache_name)
+        return shard_map
+
+    def series(self) -> List[str]:
+        self.manifest.refresh()
+        return self.manifest.series()
+
+    def coverage(self, cache_name: str) -> IntervalSet:
+        # Cheap; only re-reads the manifest if another writer published since
+        self.manifest.refresh()
+        return self.manifest.coverage(cache_name)
+
+    def params(self, cache_name: str) -> Dict[str, Any]:
+        return self.manifest.params(cache_name)
+
+    def canonical(self, cache_name: str) -> bool:
+        return self.manifest.canonical(cache_name)
+
+    def version(self, cache_name: str) -> Optional[Hashable]:
+        self.manifest.refresh()
+        if self.store.exists(cache_name):
+            # Every write publishes new shard versions
+            return tuple(sorted(self._published_shards(cache_name).items()))
+        legacy_file = self._legacy_file(cache_name)
+        if not os.path.exists(legacy_file):
+            return ()
+        stat = os.stat(legacy_file)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def lock(self, cache_name: str) -> FileLock:
+        return self.manifest.lock(cache_name)
+
+    def stored_form(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.store.stored_form(df)
+
+    def load(
+        self,
+        cache_name: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        if self.store.exists(cache_name):
+            # The lease keeps the generation's shards from being collected while
+            # they are read, and its snapshot names the versions to read (the
+            # manifest may move on to a newer generation meanwhile)
+            with self.manifest.lease() as snapshot:
+                return self.store.load(
+                    cache_name,
+                    start_date,
+                    end_date,
+                    columns,
+                    self._published_shards(cache_name, snapshot),
+                )
+
+        # Fallback for caches written before the columnar format. These are read
+        # whole; run `main.py --migrate-cache` to convert them.
+        legacy_file = self._legacy_file(cache_name)
+        if not os.path.exists(legacy_file):
+            return pd.DataFrame(columns=["start_time"])
+        df = pd.read_pickle(legacy_file)
+        if start_date is not None:
+            df = df[df["start_time"] >= start_date]
+        if end_date is not None:
+            df = df[df["start_time"] < end_date]
+        if columns is not None:
+            df = df[["start_time"] + [c for c in columns if c in df.columns]]
+        return df.reset_index(drop=True)
+
+    def append(
+        self,
+        cache_name: str,
+        params: Dict[str, Any],
+        df: pd.DataFrame,
+        covered: List[Interval],
+        canonical: bool = False,
+    ):
+        """The rows go to new shard versions that only become visible when the
+        manifest generation naming them (and the new coverage) is published."""
+        self.manifest.refresh()
+        shard_map = self._published_shards(cache_name)
+        legacy_file = self._legacy_file(cache_name)
+        if not shard_map and os.path.exists(legacy_file):
+            # Bring the legacy history over with the new rows, otherwise it would
+            # be shadowed by them. Legacy rows are not canonical, unless the new
+            # rows replace all of them (as migrate_cache does).
+            legacy = pd.read_pickle(legacy_file)
+            legacy = legacy[~legacy["start_time"].isin(df["start_time"])]
+            if not legacy.empty:
+                df = pd.concat([legacy, df]).sort_values("start_time")
+                canonical = False
+
+        shard_map = self.store.write(cache_name, df, shard_map)
+        with self.manifest.transaction():
+            canonical = canonical and (
+                self.manifest.canonical(cache_name)
+                or not self.manifest.coverage(cache_name)
+            )
+            for start_date, end_date in covered:
+                self.manifest.record(cache_name, params, start_date, end_date)
+            self.manifest.publish_shards(cache_name, shard_map)
+            self.manifest.set_canonical(cache_name, canonical)
+        # Only the series written here is pruned; versions of other series left by
+        # collected generations go on their next write
+        self._prune(cache_name)
+
+    def _prune(self, cache_name: str):
+        """Drop the shard versions no manifest generation needs any more. Runs
+        under the manifest's in-process lock, so no thread of this process can
+        take a lease on a generation while its shards are being pruned."""
+        with self.manifest.locked():
+            if self.manifest.shard_map(cache_name) is None:
+                # Shards are not tracked yet, so nothing is known to be superseded
+                return
+            self.store.prune(cache_name, self.manifest.live_shards(cache_name))
+
+    def delete(self, cache_name: str):
+        with self.manifest.transaction():
+            self.manifest.remove(cache_name)
+        # Generations still being read keep their shards until they are collected
+        with self.manifest.locked():
+            self.store.prune(cache_name, self.manifest.live_shards(cache_name))
+        if os.path.exists(self._legacy_file(cache_name)):
+            os.remove(self._legacy_file(cache_name))
+
+
+BACKENDS = ("columnar", "sqlite")
+
+
+def open_backend(
+    kind: str,
+    cache_dir: str,
+    codec: str = "npy",
+    legacy_extension: str = "pkl.gz",
+) -> CacheBackend:
+    if kind == "columnar":
+        return ColumnarBackend(cache_dir, codec, legacy_extension)
+    if kind == "sqlite":
+        from sqlite_backend import SQLiteBackend
+
+        return SQLiteBackend(cache_dir)
+    raise ValueError(f"Unsupported cache backend: {kind}")
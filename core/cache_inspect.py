@@ -0,0 +1,175 @@
+import gzip
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import utils
+from cache_backend import CacheBackend, ColumnarBackend
+from cache_manifest import CacheManifest
+from interval_set import IntervalSet
+
+# Per-series report of what the cache holds and what loading it costs, to find
+# the series that dominate cold loads. Timings are measured in the calling
+# process, so the OS page cache may already hold files read before.
+
+
+@dataclass
+class SeriesInspection:
+    cache_name: str
+    # "pickle" for legacy *.pkl.gz files, otherwise the backend kind
+    source: str
+    # None when the storage is shared between series (SQLite)
+    disk_bytes: Optional[int]
+    rows: int
+    coverage: IntervalSet
+    # Share of NaN values over all value columns
+    nan_ratio: float
+    # Reading and decompressing the raw data, None if there is no such step
+    decompress_seconds: Optional[float]
+    # Turning it into the DataFrame the fetcher works with
+    deserialize_seconds: float
+
+    @property
+    def load_seconds(self) -> float:
+        return (self.decompress_seconds or 0.0) + self.deserialize_seconds
+
+    def stale_by(self, now: datetime) -> Optional[timedelta]:
+        """How far the coverage ends before now, None if nothing is covered."""
+        if self.coverage.end is None:
+            return None
+        return max(timedelta(0), now - self.coverage.end)
+
+    def describe(self, now: datetime) -> str:
+        size = (
+            f"{self.disk_bytes / 1e6:.2f} MB"
+            if self.disk_bytes is not None
+            else "shared"
+        )
+        decompress = (
+            f"{self.decompress_seconds * 1000:.1f} ms"
+            if self.decompress_seconds is not None
+            else "-"
+        )
+        lines = [
+            f"{self.cache_name} [{self.source}]: {size}, {self.rows} row(s), "
+            f"{self.nan_ratio:.1%} NaN, decompress {decompress}, "
+            f"deserialize {self.deserialize_seconds * 1000:.1f} ms, "
+            f"stale by {self.stale_by(now)}"
+        ]
+        lines += [f"    covered: {start} -> {end}" for start, end in self.coverage]
+        return "\n".join(lines)
+
+
+def _nan_ratio(df: pd.DataFrame) -> float:
+    values = df.drop(columns=["start_time"], errors="ignore")
+    if values.size == 0:
+        return 0.0
+    return float(values.isna().to_numpy().sum() / values.size)
+
+
+def inspect_legacy(
+    cache_dir: str, extension: str = "pkl.gz"
+) -> List[SeriesInspection]:
+    """Inspect the legacy <name>.pkl.gz files (and <name>_metadata.json) of
+    cache_dir."""
+    if not os.path.isdir(cache_dir):
+        return []
+    metadata = CacheManifest.read_legacy_metadata(cache_dir)
+    suffix = f".{extension}"
+    inspections = []
+    for file_name in sorted(os.listdir(cache_dir)):
+        if not file_name.endswith(suffix):
+            continue
+        cache_name = file_name[: -len(suffix)]
+        path = os.path.join(cache_dir, file_name)
+
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            raw = gzip.decompress(f.read())
+        decompressed = time.perf_counter()
+        df = pickle.loads(raw)
+        deserialized = time.perf_counter()
+
+        if cache_name in metadata:
+            coverage = metadata[cache_name]["coverage"]
+        elif not df.empty:
+            coverage = IntervalSet(
+                [
+                    (
+                        df["start_time"].min().to_pydatetime(),
+                        (df["start_time"].max() + utils.HOUR).to_pydatetime(),
+                    )
+                ]
+            )
+        else:
+            coverage = IntervalSet()
+        inspections.append(
+            SeriesInspection(
+                cache_name,
+                "pickle",
+                os.path.getsize(path),
+                len(df),
+                coverage,
+                _nan_ratio(df),
+                decompressed - start,
+                deserialized - decompressed,
+            )
+        )
+    return inspections
+
+
+def _columnar_decompress(
+    backend: ColumnarBackend, cache_name: str
+) -> Tuple[int, float]:
+    """Bytes on disk of the published shards of the series, and the time it takes
+    to read and decode all of their columns."""
+    store = backend.store
+    shard_map = backend._published_shards(cache_name)
+    disk_bytes = 0
+    start = time.perf_counter()
+    for year in store.shards(cache_name, shard_map):
+        shard_dir = os.path.join(store.series_dir(cache_name), shard_map[year])
+        disk_bytes += sum(
+            os.path.getsize(os.path.join(shard_dir, entry))
+            for entry in os.listdir(shard_dir)
+        )
+        index = store._read_index(cache_name, shard_map, year)
+        for column in index["columns"]:
+            # np.array forces memory-mapped columns to be read
+            np.array(store._read_column(shard_dir, column, index))
+    return disk_bytes, time.perf_counter() - start
+
+
+def inspect_backend(backend: CacheBackend, kind: str) -> List[SeriesInspection]:
+    """Inspect every series stored by backend. Legacy pickles that a columnar
+    backend only reads as a fallback are left to inspect_legacy."""
+    inspections = []
+    for cache_name in backend.series():
+        disk_bytes, decompress_seconds = None, None
+        if isinstance(backend, ColumnarBackend):
+            if not backend.store.exists(cache_name):
+                continue
+            disk_bytes, decompress_seconds = _columnar_decompress(backend, cache_name)
+
+        start = time.perf_counter()
+        df = backend.load(cache_name)
+        deserialize_seconds = time.perf_counter() - start
+        inspections.append(
+            SeriesInspection(
+                cache_name,
+                kind,
+                disk_bytes,
+                len(df),
+                backend.coverage(cache_name),
+                _nan_ratio(df),
+                decompress_seconds,
+                deserialize_seconds,
+            )
+        )
+    return inspections
@@ -0,0 +1,409 @@
+import copy
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import pandas as pd
+
+from cache_store import ShardMap
+from file_lock import FileLock
+from interval_set import Interval, IntervalSet
+
+logger = logging.getLogger(__name__)
+
+# One manifest per cache directory replaces the per-series *_metadata.json files.
+# Manifests are immutable, numbered snapshot generations, and a pointer file names
+# the current one:
+#
+#   <cache_dir>/CURRENT -> "<N>"
+#   <cache_dir>/manifests/gen-<N>.json -> {
+#       "version": 1,
+#       "generation": N,
+#       "series": {
+#           "<cache_name>": {
+#               "params": {...},
+#               "coverage": [[start, end], ...],
+#               "shards": {"<year>": "<shard directory>", ...},
+#               "canonical": true,
+#           },
+#       },
+#   }
+#
+# coverage holds the exact set of hours that have been fetched for the series (not
+# just the first and last one), so coverage checks never open a data file and holes
+# inside the cached range are visible.
+#
+# canonical is set while every stored row of the series went through
+# utils.canonicalize, which lets analyzer.prepare_data skip its normalization.
+#
+# shards names the published version of every year shard (see cache_store). A save
+# writes generation N+1 next to N and then switches CURRENT with an atomic rename,
+# which is the commit point of a write: new shard versions and the coverage they
+# add become visible together, and readers still using generation N are not
+# affected. Readers hold a shared lease on the generation they read from (lease());
+# superseded generations are garbage-collected once no lease is held, and their
+# shard versions can be pruned once no remaining generation names them.
+#
+# Writers coordinate through lock files in <cache_dir>/.locks/: one lock per series
+# lets a single process fetch and write it at a time, and transaction() serializes
+# the read-modify-write of the manifest itself.
+#
+# Within a process, the threads sharing a CacheManifest see its state as immutable
+# snapshots (ManifestSnapshot): loading builds the next one off to the side and
+# swaps it in, and edits go to a copy that save() publishes, both under an
+# in-process lock that also covers transactions and garbage collection.
+
+
+@dataclass(frozen=True)
+class ManifestSnapshot:
+    """The series entries of one generation (None before the first save). Never
+    modified once built, so readers can keep using it while newer ones are
+    published."""
+
+    generation: Optional[int]
+    series: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def coverage(self, cache_name: str) -> IntervalSet:
+        entry = self.series.get(cache_name)
+        return IntervalSet(list(entry["coverage"])) if entry else IntervalSet()
+
+    def shard_map(self, cache_name: str) -> Optional[ShardMap]:
+        """The published shard versions of the series, None if the manifest does
+        not track them (caches written before shard versioning)."""
+        entry = self.series.get(cache_name)
+        if not entry or entry["shards"] is None:
+            return None
+        return dict(entry["shards"])
+
+
+class CacheManifest:
+    VERSION = 1
+    POINTER_FILE = "CURRENT"
+    GENERATIONS_DIR = "manifests"
+    LEGACY_FILE_NAME = "manifest.json"
+    LEGACY_METADATA_SUFFIX = "_metadata.json"
+    LOCK_DIR = ".locks"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.pointer_path = os.path.join(cache_dir, self.POINTER_FILE)
+        self.generations_dir = os.path.join(cache_dir, self.GENERATIONS_DIR)
+        self.lock_dir = os.path.join(cache_dir, self.LOCK_DIR)
+        self._snapshot = ManifestSnapshot(None)
+        # Series entries edited by record() and friends until save() publishes them
+        self._pending: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def generation(self) -> Optional[int]:
+        """The loaded generation, None before the first save."""
+        return self._snapshot.generation
+
+    @property
+    def snapshot(self) -> ManifestSnapshot:
+        return self._snapshot
+
+    def _generation_path(self, generation: int) -> str:
+        return os.path.join(self.generations_dir, f"gen-{generation:06d}.json")
+
+    def _read_pointer(self) -> Optional[int]:
+        try:
+            with open(self.pointer_path) as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.error(f"Corrupted cache pointer, ignoring it: {str(e)}")
+            return None
+
+    def _generations(self) -> List[int]:
+        """Generations with a manifest on disk, in ascending order."""
+        if not os.path.isdir(self.generations_dir):
+            return []
+        return sorted(
+            int(file_name[len("gen-") : -len(".json")])
+            for file_name in os.listdir(self.generations_dir)
+            if file_name.startswith("gen-") and file_name.endswith(".json")
+        )
+
+    def _read_series(self, path: str) -> Dict[str, Dict[str, Any]]:
+        with open(path) as f:
+            data = json.load(f)
+        series = {}
+        for cache_name, entry in data.get("series", {}).items():
+            series[cache_name] = {
+                "params": entry.get("params", {}),
+                "coverage": IntervalSet.from_json(entry.get("coverage", [])),
+                "shards": (
+                    {int(year): name for year, name in entry["shards"].items()}
+                    if "shards" in entry
+                    else None
+                ),
+                "canonical": entry.get("canonical", False),
+            }
+        return series
+
+    def _read_current(self) -> ManifestSnapshot:
+        """Read the generation CURRENT points to."""
+        while True:
+            generation = self._read_pointer()
+            if generation is not None:
+                path = self._generation_path(generation)
+            else:
+                # Single manifest written before snapshot generations
+                path = os.path.join(self.cache_dir, self.LEGACY_FILE_NAME)
+                if not os.path.exists(path):
+                    return ManifestSnapshot(
+                        None, self.read_legacy_metadata(self.cache_dir)
+                    )
+            try:
+                return ManifestSnapshot(generation, self._read_series(path))
+            except (OSError, json.JSONDecodeError) as e:
+                if isinstance(e, FileNotFoundError) and (
+                    self._read_pointer() != generation
+                ):
+                    # Superseded and collected by another writer since the
+                    # pointer was read
+                    continue
+                logger.error(f"Error reading cache manifest, ignoring it: {str(e)}")
+                return ManifestSnapshot(generation)
+
+    def _load(self):
+        with self._lock:
+            self._snapshot = self._read_current()
+
+    @classmethod
+    def read_legacy_metadata(cls, cache_dir: str) -> Dict[str, Dict[str, Any]]:
+        """Build the series entries from pre-manifest <name>_metadata.json files."""
+        series = {}
+        if not os.path.isdir(cache_dir):
+            return series
+        for file_name in sorted(os.listdir(cache_dir)):
+            if not file_name.endswith(cls.LEGACY_METADATA_SUFFIX):
+                continue
+            cache_name = file_name[: -len(cls.LEGACY_METADATA_SUFFIX)]
+            try:
+                with open(os.path.join(cache_dir, file_name)) as f:
+                    metadata = json.load(f)
+            except json.JSONDecodeError as e:
+                logger.error(f"Ignoring corrupted {file_name}: {str(e)}")
+                continue
+            start, end = (
+                pd.to_datetime(metadata.pop(key)).tz_localize(None).to_pydatetime()
+                for key in ("start_date_inclusive", "end_date_exclusive")
+            )
+            series[cache_name] = {
+                "params": metadata,
+                "coverage": IntervalSet([(start, end)]),
+                "shards": None,
+                "canonical": False,
+            }
+        return series
+
+    def refresh(self):
+        """Switch to the current generation if another writer published one since
+        it was read."""
+        with self._lock:
+            if self._read_pointer() != self._snapshot.generation:
+                self._load()
+
+    def save(self):
+        """Publish the manifest as a new generation and collect the superseded
+        ones that no reader holds."""
+        with self._lock:
+            self._save()
+            self.collect_garbage()
+
+    def _save(self):
+        series = self._pending if self._pending is not None else self._snapshot.series
+        data = {"version": self.VERSION, "series": {}}
+        for cache_name, entry in sorted(series.items()):
+            data["series"][cache_name] = {
+                "params": entry["params"],
+                "coverage": entry["coverage"].to_json(),
+            }
+            if entry["canonical"]:
+                data["series"][cache_name]["canonical"] = True
+            if entry["shards"] is not None:
+                data["series"][cache_name]["shards"] = {
+                    str(year): name for year, name in sorted(entry["shards"].items())
+                }
+        os.makedirs(self.generations_dir, exist_ok=True)
+        generation = max([self._read_pointer() or 0] + self._generations()) + 1
+        data["generation"] = generation
+
+        path = self._generation_path(generation)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, path)
+        tmp_path = f"{self.pointer_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, self.pointer_path)
+        self._snapshot = ManifestSnapshot(generation, series)
+        self._pending = None
+
+        legacy_path = os.path.join(self.cache_dir, self.LEGACY_FILE_NAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def collect_garbage(self) -> List[int]:
+        """Delete the manifests of superseded generations that no reader holds a
+        lease on. Returns the collected generations."""
+        with self._lock:
+            current = self._read_pointer()
+            collected = []
+            for generation in self._generations():
+                if generation == current:
+                    continue
+                lock = self.lock(f"gen-{generation}")
+                if not lock.acquire(blocking=False):
+                    logger.debug(f"Generation {generation} is still being read")
+                    continue
+                try:
+                    os.remove(self._generation_path(generation))
+                    os.remove(lock.path)
+                    collected.append(generation)
+                finally:
+                    lock.release()
+            return collected
+
+    def live_shards(self, cache_name: str) -> Set[str]:
+        """Shard directories of the series named by any generation still on disk,
+        which must therefore be kept."""
+        shards = set((self.shard_map(cache_name) or {}).values())
+        for generation in self._generations():
+            try:
+                series = self._read_series(self._generation_path(generation))
+            except (OSError, json.JSONDecodeError):
+                # Collected concurrently
+                continue
+            shards.update((series.get(cache_name, {}).get("shards") or {}).values())
+        return shards
+
+    @contextmanager
+    def lease(self) -> Iterator[ManifestSnapshot]:
+        """Hold the loaded generation while reading the shards it names, so they
+        are not garbage-collected underneath. Switches to the current generation
+        first if the loaded one was already collected. Yields the snapshot of the
+        held generation; read its shard maps, not the manifest's, which may move
+        on meanwhile."""
+        lock = None
+        while True:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot.generation is None:
+                    break
+                lock = self.lock(f"gen-{snapshot.generation}", shared=True)
+                try:
+                    lock.acquire()
+                except OSError:
+                    # Read-only cache directory: no writer can collect anything
+                    # either
+                    lock = None
+                    break
+                if os.path.exists(self._generation_path(snapshot.generation)):
+                    break
+                lock.release()
+                lock = None
+                self._load()
+        try:
+            yield snapshot
+        finally:
+            if lock is not None:
+                lock.release()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the in-process lock: no thread of this process loads, publishes,
+        collects or leases a generation meanwhile."""
+        with self._lock:
+            yield
+
+    def lock(self, name: str, shared: bool = False) -> FileLock:
+        return FileLock(os.path.join(self.lock_dir, f"{name}.lock"), shared)
+
+    @contextmanager
+    def transaction(self) -> Iterator["CacheManifest"]:
+        """Reload, let the caller modify and save the manifest while holding the
+        manifest lock, so concurrent writers never drop each other's updates."""
+        with self._lock, self.lock("manifest"):
+            self.refresh()
+            self._pending = None
+            try:
+                yield self
+            except BaseException:
+                self._pending = None
+                raise
+            self.save()
+
+    def _edited(self) -> Dict[str, Dict[str, Any]]:
+        """The series entries to edit: a copy of the loaded ones, published by the
+        next save()."""
+        if self._pending is None:
+            self._pending = copy.deepcopy(self._snapshot.series)
+        return self._pending
+
+    def series(self) -> List[str]:
+        return sorted(self._snapshot.series)
+
+    def params(self, cache_name: str) -> Dict[str, Any]:
+        return dict(self._snapshot.series.get(cache_name, {}).get("params", {}))
+
+    def coverage(self, cache_name: str) -> IntervalSet:
+        return self._snapshot.coverage(cache_name)
+
+    def holes(self, cache_name: str) -> List[Interval]:
+        return self.coverage(cache_name).holes()
+
+    def shard_map(self, cache_name: str) -> Optional[ShardMap]:
+        """The published shard versions of the series, None if the manifest does
+        not track them (caches written before shard versioning)."""
+        return self._snapshot.shard_map(cache_name)
+
+    def record(
+        self,
+        cache_name: str,
+        params: Dict[str, Any],
+        start_date: datetime,
+        end_date: datetime,
+    ):
+        """Mark [start_date, end_date) as fetched for the series."""
+        with self._lock:
+            entry = self._edited().setdefault(
+                cache_name,
+                {
+                    "params": {},
+                    "coverage": IntervalSet(),
+                    "shards": None,
+                    "canonical": False,
+                },
+            )
+            entry["params"] = {
+                key: value for key, value in params.items() if key != "securityToken"
+            }
+            entry["coverage"].add(start_date, end_date)
+
+    def canonical(self, cache_name: str) -> bool:
+        return self._snapshot.series.get(cache_name, {}).get("canonical", False)
+
+    def set_canonical(self, cache_name: str, canonical: bool):
+        with self._lock:
+            if cache_name in self._edited():
+                self._pending[cache_name]["canonical"] = canonical
+
+    def publish_shards(self, cache_name: str, shard_map: ShardMap):
+        with self._lock:
+            if cache_name in self._edited():
+                self._pending[cache_name]["shards"] = dict(shard_map)
+
+    def remove(self, cache_name: str):
+        with self._lock:
+            self._edited().pop(cache_name, None)
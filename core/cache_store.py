@@ -0,0 +1,351 @@
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import series_codec
+import utils
+
+logger = logging.getLogger(__name__)
+
+# Columnar on-disk layout for one cached series, split in one shard per year:
+#
+#   <cache_dir>/<cache_name>/
+#       <year>[.<version>]/
+#           columns.json  -> {"columns": [...], "first_row": a, "rows": b,
+#                             "codec": "npy" | "edz"}
+#           <column>.npy  -> dense float64 values, one file per column
+#                            (<column>.edz with the compact series_codec encoding)
+#
+# Every column is laid out on the shared hourly grid: row N of a shard holds the
+# hour shard_origin + N, where the shard origin is the later of January 1st of its
+# year and utils.RECORDS_START, and hours without data are NaN. Timestamps are
+# therefore implicit and looking up an interval is a plain slice. The files are
+# opened memory-mapped, so a load only reads the pages of the requested columns and
+# rows, and concurrent processes share those pages through the OS page cache.
+# first_row/rows delimit the stored rows of a shard (rows is exclusive).
+#
+# The "edz" codec trades memory-mapping for a much smaller footprint: a column is
+# decoded whole (at most one year of hours) when it is read.
+#
+# Loads only open the shards overlapping the requested interval, and writes only
+# rewrite the shards their rows fall into, so an hourly refresh touches just the
+# current year.
+#
+# Shards are never modified in place: a write puts the new content of a year in a
+# new version directory (2024, 2024.1, 2024.2, ...) and returns the updated shard
+# map (year -> directory). Callers that pass the map they read from the cache
+# manifest decide when the new versions become visible by publishing the returned
+# map, so data and metadata switch together; superseded versions are removed with
+# prune() once no published map names them any more. Without a shard map the newest version
+# of every year is used and superseded versions are pruned right away.
+
+ShardMap = Dict[int, str]
+
+
+def shard_origin(year: int) -> datetime:
+    return max(utils.RECORDS_START, datetime(year, 1, 1))
+
+
+class ColumnarCacheStore:
+    CODECS = ("npy", "edz")
+    TIME_COLUMN = "start_time"
+    COLUMNS_FILE = "columns.json"
+
+    def __init__(self, cache_dir: str, codec: str = "npy"):
+        if codec not in self.CODECS:
+            raise ValueError(f"Unsupported cache codec: {codec}")
+        self.cache_dir = cache_dir
+        self.codec = codec
+
+    def series_dir(self, cache_name: str) -> str:
+        return os.path.join(self.cache_dir, cache_name)
+
+    def _shard_dir(self, cache_name: str, shard_map: ShardMap, year: int) -> str:
+        return os.path.join(self.series_dir(cache_name), shard_map[year])
+
+    def _read_column(
+        self, shard_dir: str, column: str, index: Dict[str, Any]
+    ) -> np.ndarray:
+        codec = index.get("codec", "npy")
+        path = os.path.join(shard_dir, f"{column}.{codec}")
+        if codec == "npy":
+            return np.load(path, mmap_mode="r")
+        with open(path, "rb") as f:
+            return series_codec.decode_column(f.read())
+
+    def _write_column(self, shard_dir: str, column: str, values: np.ndarray):
+        path = os.path.join(shard_dir, f"{column}.{self.codec}")
+        if self.codec == "npy":
+            np.save(path, values)
+        else:
+            with open(path, "wb") as f:
+                f.write(series_codec.encode_column(values))
+
+    def stored_form(self, df: pd.DataFrame) -> pd.DataFrame:
+        """df with its values as they read back once written with the codec."""
+        if self.codec == "npy":
+            return df
+        df = df.copy()
+        for column in df.columns:
+            if column != self.TIME_COLUMN:
+                df[column] = series_codec.quantize(df[column].to_numpy())
+        return df
+
+    @staticmethod
+    def _parse_shard_name(entry: str) -> Optional[Tuple[int, int]]:
+        """(year, version) of a shard directory name, None for anything else."""
+        parts = entry.split(".")
+        if len(parts) > 2 or not all(part.isdigit() for part in parts):
+            return None
+        return int(parts[0]), int(parts[1]) if len(parts) == 2 else 0
+
+    def _versions(self, cache_name: str) -> Dict[int, List[Tuple[int, str]]]:
+        """Complete shard directories of the series as year -> [(version, name)]."""
+        series_dir = self.series_dir(cache_name)
+        if not os.path.isdir(series_dir):
+            return {}
+        versions: Dict[int, List[Tuple[int, str]]] = {}
+        for entry in os.listdir(series_dir):
+            parsed = self._parse_shard_name(entry)
+            if parsed is None or not os.path.exists(
+                os.path.join(series_dir, entry, self.COLUMNS_FILE)
+            ):
+                continue
+            versions.setdefault(parsed[0], []).append((parsed[1], entry))
+        return versions
+
+    def shard_map(self, cache_name: str) -> ShardMap:
+        """The newest stored version of every year shard."""
+        return {
+            year: max(versions)[1]
+            for year, versions in self._versions(cache_name).items()
+        }
+
+    def shards(
+        self, cache_name: str, shard_map: Optional[ShardMap] = None
+    ) -> List[int]:
+        """Years with a stored shard, in ascending order."""
+        if shard_map is None:
+            shard_map = self.shard_map(cache_name)
+        return sorted(shard_map)
+
+    def exists(self, cache_name: str) -> bool:
+        return bool(self.shards(cache_name))
+
+    def _read_index(
+        self, cache_name: str, shard_map: ShardMap, year: int
+    ) -> Dict[str, Any]:
+        with open(
+            os.path.join(
+                self._shard_dir(cache_name, shard_map, year), self.COLUMNS_FILE
+            )
+        ) as f:
+            return json.load(f)
+
+    def columns(
+        self, cache_name: str, shard_map: Optional[ShardMap] = None
+    ) -> List[str]:
+        if shard_map is None:
+            shard_map = self.shard_map(cache_name)
+        columns = []
+        for year in sorted(shard_map):
+            for column in self._read_index(cache_name, shard_map, year)["columns"]:
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def _stored_range(
+        self, cache_name: str, shard_map: ShardMap, years: List[int]
+    ) -> Tuple[int, int]:
+        """Grid offsets [first, last) spanned by the stored rows of the given shards."""
+        first_index = self._read_index(cache_name, shard_map, years[0])
+        last_index = self._read_index(cache_name, shard_map, years[-1])
+        first = utils.hour_offset(shard_origin(years[0])) + first_index["first_row"]
+        last = utils.hour_offset(shard_origin(years[-1])) + last_index["rows"]
+        return first, last
+
+    def load(
+        self,
+        cache_name: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+        shard_map: Optional[ShardMap] = None,
+    ) -> pd.DataFrame:
+        """Load the hours start_date <= start_time < end_date for the given columns.
+
+        Missing bounds mean "from the first stored row" / "up to the last stored
+        row", and columns=None loads every stored column. Hours inside the stored
+        range that have no data come back as NaN rows. shard_map selects the shard
+        versions to read (the newest ones by default).
+        """
+        if shard_map is None:
+            shard_map = self.shard_map(cache_name)
+        years = self.shards(cache_name, shard_map)
+        if start_date is not None:
+            years = [year for year in years if year >= start_date.year]
+        if end_date is not None:
+            last_year = (end_date - utils.HOUR).year
+            years = [year for year in years if year <= last_year]
+        stored_columns = self.columns(cache_name, shard_map)
+        if columns is None:
+            columns = stored_columns
+        else:
+            columns = [column for column in columns if column in stored_columns]
+
+        if not years:
+            return pd.DataFrame(columns=[self.TIME_COLUMN] + columns)
+
+        first, last = self._stored_range(cache_name, shard_map, years)
+        if start_date is not None:
+            first = max(first, utils.hour_offset(start_date))
+        if end_date is not None:
+            last = min(last, utils.hour_offset(end_date))
+        last = max(first, last)
+
+        data = {column: np.full(last - first, np.nan) for column in columns}
+        for year in years:
+            shard_dir = self._shard_dir(cache_name, shard_map, year)
+            index = self._read_index(cache_name, shard_map, year)
+            origin = utils.hour_offset(shard_origin(year))
+            shard_first = max(first, origin + index["first_row"])
+            shard_last = min(last, origin + index["rows"])
+            if shard_first >= shard_last:
+                continue
+            for column in columns:
+                if column not in index["columns"]:
+                    continue
+                values = self._read_column(shard_dir, column, index)
+                data[column][shard_first - first : shard_last - first] = values[
+                    shard_first - origin : shard_last - origin
+                ]
+
+        times = pd.date_range(
+            utils.hour_at(first), periods=last - first, freq=utils.HOUR
+        )
+        return pd.DataFrame({self.TIME_COLUMN: times, **data})
+
+    def write(
+        self,
+        cache_name: str,
+        df: pd.DataFrame,
+        shard_map: Optional[ShardMap] = None,
+    ) -> ShardMap:
+        """Merge the rows of df into the stored series and return the new shard map.
+
+        df must have a start_time column of whole hours at or after
+        utils.RECORDS_START. Rows of df replace stored rows for the same hour, and
+        only the year shards that df touches get a new version. With a shard_map,
+        df is merged into those versions and the new ones stay unpublished until
+        the returned map is; without one, the newest versions are merged into and
+        superseded ones are pruned.
+        """
+        publish = shard_map is None
+        shard_map = dict(self.shard_map(cache_name) if publish else shard_map)
+        if df.empty:
+            return shard_map
+        offsets = (
+            (df[self.TIME_COLUMN] - pd.Timestamp(utils.RECORDS_START)) // utils.HOUR
+        ).to_numpy(dtype="int64")
+        if offsets.min() < 0:
+            raise ValueError(f"Cannot store rows before {utils.RECORDS_START}")
+        years = df[self.TIME_COLUMN].dt.year.to_numpy()
+
+        for year in np.unique(years):
+            in_shard = years == year
+            shard_map[int(year)] = self._write_shard(
+                cache_name,
+                shard_map,
+                int(year),
+                offsets[in_shard] - utils.hour_offset(shard_origin(int(year))),
+                df[in_shard],
+            )
+        if publish:
+            self.prune(cache_name, shard_map.values())
+        return shard_map
+
+    def _write_shard(
+        self,
+        cache_name: str,
+        shard_map: ShardMap,
+        year: int,
+        rows: np.ndarray,
+        df: pd.DataFrame,
+    ) -> str:
+        """Write the merged shard as a new version, returning its directory name."""
+        new_columns = [column for column in df.columns if column != self.TIME_COLUMN]
+
+        if year in shard_map:
+            shard_dir = self._shard_dir(cache_name, shard_map, year)
+            index = self._read_index(cache_name, shard_map, year)
+            columns = index["columns"] + [
+                column for column in new_columns if column not in index["columns"]
+            ]
+            first_row = min(index["first_row"], int(rows.min()))
+            shard_rows = max(index["rows"], int(rows.max()) + 1)
+        else:
+            shard_dir = None
+            index = {"columns": [], "first_row": 0, "rows": 0}
+            columns = new_columns
+            first_row = int(rows.min())
+            shard_rows = int(rows.max()) + 1
+
+        versions = self._versions(cache_name).get(year, [])
+        version = max(versions)[0] + 1 if versions else 0
+        shard_name = f"{year}.{version}" if version else str(year)
+
+        # Write into a temporary directory and rename it into place, so a crash
+        # mid-write never leaves a half-written shard behind
+        tmp_dir = os.path.join(self.series_dir(cache_name), f"{shard_name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        for column in columns:
+            values = np.full(shard_rows, np.nan)
+            if column in index["columns"]:
+                values[: index["rows"]] = self._read_column(shard_dir, column, index)
+            # A new row replaces the whole stored row for that hour
+            values[rows] = (
+                df[column].to_numpy(dtype="float64")
+                if column in new_columns
+                else np.nan
+            )
+            self._write_column(tmp_dir, column, values)
+        with open(os.path.join(tmp_dir, self.COLUMNS_FILE), "w") as f:
+            json.dump(
+                {
+                    "columns": columns,
+                    "first_row": first_row,
+                    "rows": shard_rows,
+                    "codec": self.codec,
+                },
+                f,
+            )
+
+        os.rename(tmp_dir, os.path.join(self.series_dir(cache_name), shard_name))
+        return shard_name
+
+    def prune(self, cache_name: str, keep: Collection[str]):
+        """Remove every shard directory of the series that is not in keep,
+        including unpublished leftovers of interrupted writes."""
+        series_dir = self.series_dir(cache_name)
+        if not os.path.isdir(series_dir):
+            return
+        for entry in os.listdir(series_dir):
+            if entry not in keep:
+                shutil.rmtree(os.path.join(series_dir, entry), ignore_errors=True)
+
+    def save(self, cache_name: str, df: pd.DataFrame) -> ShardMap:
+        """Replace the stored series with df."""
+        self.delete(cache_name)
+        return self.write(cache_name, df)
+
+    def delete(self, cache_name: str):
+        shutil.rmtree(self.series_dir(cache_name), ignore_errors=True)
+
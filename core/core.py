@@ -1,20 +1,354 @@
 from data_fetcher import ENTSOEDataFetcher, SimpleInterval, DataRequest
 import analyzer
+import analysis_memo
+from analysis_memo import AnalysisMemo
+from blob_backend import BlobBackend, export_blob_cache
+import cache_inspect
+import deployment_snapshot
+from deployment_snapshot import DeploymentSnapshot
+from cache_backend import open_backend
+from cache_manifest import CacheManifest
+import presets
+from quality_index import QualityIndex
+import response_cache
+from response_cache import ResponseCache
+import json
+import os
+import threading
+import pandas as pd
+from dataclasses import fields
+from datetime import datetime, timedelta
+from typing import Optional
 from tqdm import tqdm  # Add this import
 import logging
 
+import utils
 from utils import RECORDS_START, maximum_date_end_exclusive
+import time_pattern
 
 logger = logging.getLogger(__name__)  # Add logger
 
+# Loaded once per process; False once it is known that there is no snapshot
+_snapshot: Optional[DeploymentSnapshot] = None
+_snapshot_checked = False
+# Shared by the requests of the process, so the series it holds in memory are reused
+_data_fetcher: Optional[ENTSOEDataFetcher] = None
+# Analyses of recently served requests
+_analysis_memo = AnalysisMemo(analysis_memo.DEFAULT_MAX_BYTES)
+_response_cache: Optional[ResponseCache] = None
+# Presets are recomputed in the background this long after a write to the shared
+# fetcher's cache; the writes meanwhile are picked up by the same run
+PRESET_REFRESH_DELAY = timedelta(
+    seconds=int(os.getenv("ENTSOE_PRESET_REFRESH_SECONDS", "60"))
+)
+_preset_refresh: Optional[threading.Timer] = None
+# Also precompute the presets in the preload thread. Off by default: a cold
+# instance has none stored, and computing them all would compete with the first
+# requests the preload is meant to speed up.
+PRELOAD_PRESETS = bool(os.getenv("ENTSOE_PRELOAD_PRESETS"))
+_preset_refresh_lock = threading.Lock()
+# Guards the creation of the per-process objects above, which the preload thread
+# and the first requests may race for
+_init_lock = threading.RLock()
+_preload_thread: Optional[threading.Thread] = None
+
 
 def reset_cache():
     data_fetcher = ENTSOEDataFetcher()
     data_fetcher.reset_cache()
 
 
+def migrate_cache(remove_legacy: bool = False):
+    """Import the legacy *.pkl.gz cache (and its *_metadata.json files) into the
+    configured cache backend."""
+    cache_dir = ENTSOEDataFetcher.CACHE_DIR
+    cache = open_backend(
+        ENTSOEDataFetcher.CACHE_BACKEND,
+        cache_dir,
+        ENTSOEDataFetcher.CACHE_CODEC,
+        ENTSOEDataFetcher.CACHE_EXTENSION,
+    )
+    quality = QualityIndex(cache_dir)
+    legacy_metadata = CacheManifest.read_legacy_metadata(cache_dir)
+    suffix = f".{ENTSOEDataFetcher.CACHE_EXTENSION}"
+
+    migrated = []
+    for file_name in sorted(os.listdir(cache_dir)):
+        if not file_name.endswith(suffix):
+            continue
+        cache_name = file_name[: -len(suffix)]
+        legacy_file = os.path.join(cache_dir, file_name)
+        logger.info(f"Migrating {legacy_file} to the {cache.__class__.__name__}")
+
+        df = pd.read_pickle(legacy_file)
+        if cache_name in legacy_metadata:
+            params = legacy_metadata[cache_name]["params"]
+            covered = list(legacy_metadata[cache_name]["coverage"])
+        else:
+            params = {}
+            covered = [
+                (
+                    df["start_time"].min().to_pydatetime(),
+                    (df["start_time"].max() + utils.HOUR).to_pydatetime(),
+                )
+            ]
+        with cache.lock(cache_name):
+            # Rows the backend already holds are newer than the legacy ones
+            stored = cache.load(cache_name)
+            value_columns = [c for c in stored.columns if c != "start_time"]
+            if value_columns:
+                stored = stored.dropna(how="all", subset=value_columns)
+                df = (
+                    pd.concat([df, stored])
+                    .drop_duplicates(subset=["start_time"], keep="last")
+                    .sort_values("start_time")
+                )
+            # Stored like fetched rows (ENTSOEDataFetcher._write_series): in
+            # canonical form, with quality flags for the hours not indexed yet
+            canonical = utils.canonicalize(df)
+            cache.append(cache_name, params, canonical, covered, canonical=True)
+            bitmaps = quality.read(cache_name)
+            if bitmaps is not None:
+                rows = (
+                    (canonical["start_time"] - pd.Timestamp(utils.RECORDS_START))
+                    // utils.HOUR
+                ).to_numpy(dtype="int64") - bitmaps["first"]
+                indexed = (rows >= 0) & (rows < len(bitmaps["known"]))
+                indexed[indexed] = bitmaps["known"][rows[indexed]]
+                canonical = canonical[~indexed]
+            quality.update(cache_name, df, canonical)
+        migrated.append(cache_name)
+
+        if remove_legacy:
+            os.remove(legacy_file)
+            metadata_file = os.path.join(
+                cache_dir, f"{cache_name}{CacheManifest.LEGACY_METADATA_SUFFIX}"
+            )
+            if os.path.exists(metadata_file):
+                os.remove(metadata_file)
+    logger.info(f"Migrated {len(migrated)} cached series: {', '.join(migrated)}")
+
+
+def inspect_cache():
+    """Print every cached series with its size, rows, coverage, NaN ratio and
+    load timings, the slowest to load first."""
+    data_fetcher = ENTSOEDataFetcher(offline=True)
+    inspections = cache_inspect.inspect_legacy(
+        ENTSOEDataFetcher.CACHE_DIR, ENTSOEDataFetcher.CACHE_EXTENSION
+    )
+    for tier in data_fetcher._tiers():
+        if isinstance(tier, BlobBackend):
+            continue
+        inspections += cache_inspect.inspect_backend(
+            tier, ENTSOEDataFetcher.CACHE_BACKEND
+        )
+
+    now = maximum_date_end_exclusive()
+    for inspection in sorted(inspections, key=lambda i: i.load_seconds, reverse=True):
+        print(inspection.describe(now))
+    print(
+        f"Total: {len(inspections)} series, "
+        f"{sum(i.disk_bytes or 0 for i in inspections) / 1e6:.2f} MB, "
+        f"{sum(i.load_seconds for i in inspections):.2f}s to load"
+    )
+
+
+def export_cache(out_dir: str):
+    """Export the local cache in the blob storage layout, ready to be uploaded."""
+    data_fetcher = ENTSOEDataFetcher(offline=True)
+    written = export_blob_cache(data_fetcher.cache, out_dir)
+    logger.info(f"Exported {len(written)} object(s) to {out_dir}")
+
+
+def rebuild_from_archive():
+    """Regenerate the parsed cache from the archived raw responses, without
+    calling the API."""
+    data_fetcher = ENTSOEDataFetcher(offline=True)
+    rebuilt = data_fetcher.rebuild_from_archive()
+    for series, responses in rebuilt.items():
+        logger.info(f"{series}: rebuilt from {responses} archived response(s)")
+
+
+def build_snapshot(out_dir: Optional[str] = None):
+    """Write the deployment snapshot: the whole cached history, prepared and
+    analyzed, for generate_visualization to slice at request time."""
+    out_dir = out_dir or deployment_snapshot.DEFAULT_DIR
+    data_fetcher = ENTSOEDataFetcher()
+    data = data_fetcher.get_data(
+        SimpleInterval(RECORDS_START, maximum_date_end_exclusive())
+    )
+    data = deployment_snapshot.align(data)
+    written = deployment_snapshot.build_snapshot(data, out_dir)
+    logger.info(f"Wrote {len(written)} snapshot file(s) to {out_dir}")
+
+
+def _get_snapshot() -> Optional[DeploymentSnapshot]:
+    global _snapshot, _snapshot_checked
+    with _init_lock:
+        if not _snapshot_checked:
+            _snapshot = DeploymentSnapshot.open()
+            _snapshot_checked = True
+    return _snapshot
+
+
+def _get_fetcher() -> ENTSOEDataFetcher:
+    global _data_fetcher
+    with _init_lock:
+        if _data_fetcher is None:
+            _data_fetcher = ENTSOEDataFetcher()
+            _data_fetcher.on_write = _schedule_preset_refresh
+    return _data_fetcher
+
+
+def _schedule_preset_refresh(cache_name: str):
+    """Recompute the presets PRESET_REFRESH_DELAY from now, unless a run is
+    already scheduled (it will see this write too)."""
+    global _preset_refresh
+    with _preset_refresh_lock:
+        if _preset_refresh is not None:
+            return
+        logger.debug(f"{cache_name} was written, refreshing the presets")
+        _preset_refresh = threading.Timer(
+            PRESET_REFRESH_DELAY.total_seconds(), _refresh_presets
+        )
+        _preset_refresh.name = "presets-refresh"
+        _preset_refresh.daemon = True
+        _preset_refresh.start()
+
+
+def _refresh_presets():
+    global _preset_refresh
+    with _preset_refresh_lock:
+        # Writes from now on (including those of this run) schedule the next one
+        _preset_refresh = None
+    try:
+        precompute_presets()
+    except Exception as e:
+        logger.exception(f"Preset refresh failed: {e}")
+
+
+def _get_response_cache() -> ResponseCache:
+    global _response_cache
+    with _init_lock:
+        if _response_cache is None:
+            cache_dir = response_cache.DEFAULT_DIR or os.path.join(
+                _get_fetcher().cache.cache_dir, "responses"
+            )
+            _response_cache = ResponseCache(
+                cache_dir, response_cache.DEFAULT_MAX_BYTES
+            )
+    return _response_cache
+
+
+def start_preload() -> threading.Thread:
+    """Warm the process up in a background thread: open the snapshot, open
+    connections to the API (ENTSOE_HTTP_PREWARM) and load the cached series into
+    the shared fetcher's memory. Requests arriving meanwhile wait for the series
+    being loaded instead of reading them again."""
+    global _preload_thread
+    with _init_lock:
+        if _preload_thread is None:
+            _preload_thread = threading.Thread(
+                target=_preload, name="cache-preload", daemon=True
+            )
+            _preload_thread.start()
+    return _preload_thread
+
+
+def _preload():
+    try:
+        _get_snapshot()
+        _get_fetcher().warm_connections()
+        preloaded = _get_fetcher().preload()
+        logger.info(
+            f"Preloaded {len(preloaded)} cached series: {', '.join(preloaded)}"
+        )
+        if PRELOAD_PRESETS:
+            # The newest hour may have advanced since the presets were last stored
+            precompute_presets()
+    except Exception as e:
+        logger.exception(f"Cache preload failed: {e}")
+
+
+def response_tag(data_request: DataRequest) -> Optional[str]:
+    """ETag of the response to data_request given the data as it is now, None if
+    it cannot be told (then responses are not cached). Take it before computing
+    the response, so it never names data newer than the response holds (a stale
+    response is refreshed in the background meanwhile)."""
+    data_fetcher, snapshot = _get_fetcher(), _get_snapshot()
+    generation = _request_generation(
+        data_fetcher, snapshot, data_request, _data_generation(data_fetcher, snapshot)
+    )
+    if generation is None:
+        return None
+    return response_cache.tag(analysis_memo.request_key(data_request), generation)
+
+
+def cached_response(tag: str) -> Optional[str]:
+    """The serialized response stored under tag, if any."""
+    return _get_response_cache().get(tag)
+
+
+def serialize_response(aggregated: pd.DataFrame, contributions: dict) -> str:
+    """The API response body for the outputs of analyzer.analyze."""
+    response_data = {
+        "aggregated": aggregated.to_json(orient="split"),
+        "contributions": {
+            country: df.to_json(orient="split") for country, df in contributions.items()
+        },
+    }
+    cached_end: Optional[datetime] = aggregated.attrs.get("cached_end")
+    if cached_end is not None:
+        # Served from the cache while the newer hours are fetched in the background
+        response_data["cached_end"] = cached_end.isoformat()
+    return json.dumps({"data": response_data})
+
+
+def store_response(tag: Optional[str], body: str) -> Optional[str]:
+    """Store the serialized response under tag, as taken by response_tag before
+    the response was computed. Returns the tag."""
+    if tag is not None:
+        _get_response_cache().put(tag, body)
+    return tag
+
+
+def precompute_presets():
+    """Serve every preset query (presets.PRESETS) for the data as it is now and
+    store the responses, so requests for them are answered from the response
+    cache. Presets already stored for the current data generation are skipped
+    before anything is computed."""
+    end = maximum_date_end_exclusive()
+    data_fetcher, snapshot = _get_fetcher(), _get_snapshot()
+    generation = _data_generation(data_fetcher, snapshot)
+    stale = []
+    for preset in presets.PRESETS:
+        data_request = preset.request(end)
+        tag = None
+        request_generation = _request_generation(
+            data_fetcher, snapshot, data_request, generation
+        )
+        if request_generation is not None:
+            tag = response_cache.tag(
+                analysis_memo.request_key(data_request), request_generation
+            )
+            if cached_response(tag) is not None:
+                logger.info(f"Preset {preset.name} is up to date")
+                continue
+        stale.append((preset, data_request, tag))
+
+    for preset, data_request, tag in stale:
+        aggregated, contributions = generate_visualization(data_request, config={})
+        if aggregated is None or contributions is None:
+            logger.warning(f"Could not precompute preset {preset.name}")
+            continue
+        store_response(tag, serialize_response(aggregated, contributions))
+        logger.info(f"Precomputed preset {preset.name}")
+
+
 def initialize_cache():
     data_fetcher = ENTSOEDataFetcher()
+    # Everything is fetched now, nothing is left to background refreshes
+    data_fetcher.stale_while_revalidate = False
     # data_fetcher.reset_cache() // just adds data now
 
     # Calculate total number of years to fetch
@@ -33,6 +367,36 @@ def initialize_cache():
 
         data_request = SimpleInterval(start, end)
         data_fetcher.get_data(data_request, progress_callback=progress_callback)
+    precompute_presets()
+
+
+def refresh_recent_data(days: Optional[int] = None):
+    data_fetcher = _get_fetcher()
+    window = timedelta(days=days) if days else None
+    changed = data_fetcher.refresh_recent(window)
+    for series, days_changed in changed.items():
+        logger.info(f"{series}: {days_changed} revised day(s) rewritten")
+    precompute_presets()
+
+
+def dry_run(data_request: DataRequest):
+    """Print what get_data would download for data_request, without fetching."""
+    data_fetcher = ENTSOEDataFetcher(offline=True)
+    plans = data_fetcher.plan(data_request).values()
+    for plan in plans:
+        print(plan.describe())
+    print(
+        f"Total: {sum(p.requests for p in plans)} request(s), "
+        f"~{sum(p.estimated_seconds for p in plans):.1f}s if fetched sequentially"
+    )
+
+
+def quality_report(data_request: DataRequest):
+    """Print coverage and data-quality statistics of every series for
+    data_request, without loading any values."""
+    data_fetcher = ENTSOEDataFetcher(offline=True)
+    for report in data_fetcher.quality_report(data_request).values():
+        print(report.describe())
 
 
 def generate_visualization(data_request: DataRequest, config: dict):
@@ -40,25 +404,111 @@ def generate_visualization(data_request: DataRequest, config: dict):
     Core visualization logic used by both CLI and API.
     Returns a Plotly figure object or None if visualization type is invalid or an error occurs.
     """
-    data_fetcher = ENTSOEDataFetcher()
-
     try:
-        data = data_fetcher.get_data(data_request)
-        if (
-            data is None
-            or data.generation_pt.empty
-            or data.generation_es.empty
-            or data.flow_pt_to_es.empty
-            or data.flow_es_to_pt.empty
-        ):
-            raise ValueError("No data found for the specified date range.")
+        snapshot = _get_snapshot()
+        data_fetcher = _get_fetcher()
+        key = analysis_memo.request_key(data_request)
+        # Taken before fetching: the result is at least as new as this generation,
+        # while a later one may come from a refresh the result does not include
+        # (stale_while_revalidate)
+        generation = _request_generation(
+            data_fetcher,
+            snapshot,
+            data_request,
+            _data_generation(data_fetcher, snapshot),
+        )
+        memoized = _analysis_memo.get(key, generation)
+        if memoized is not None:
+            return memoized
 
-        aggregated, contributions = analyzer.analyze(data)
+        if snapshot is not None:
+            aggregated, contributions = _analyze_with_snapshot(snapshot, data_request)
+            if aggregated.empty:
+                raise ValueError("No data found for the specified date range.")
+        else:
+            data = data_fetcher.get_data(data_request)
+            if (
+                data is None
+                or data.generation_pt.empty
+                or data.generation_es.empty
+                or data.flow_pt_to_es.empty
+                or data.flow_es_to_pt.empty
+            ):
+                raise ValueError("No data found for the specified date range.")
+
+            aggregated, contributions = analyzer.analyze(data)
+            _mark_stale(aggregated, data)
         print("data successfully generated")
 
+        _analysis_memo.put(key, generation, (aggregated, contributions))
         return aggregated, contributions
     except Exception as e:
         logger.exception(
             f"An error occurred during visualization generation: {e}"
         )  # Log the error with traceback
         return None, None
+
+
+def _data_generation(
+    data_fetcher: ENTSOEDataFetcher, snapshot: Optional[DeploymentSnapshot]
+):
+    generation = data_fetcher.data_generation()
+    if generation is None:
+        return None
+    return (snapshot.end if snapshot is not None else None, generation)
+
+
+def _request_generation(
+    data_fetcher: ENTSOEDataFetcher,
+    snapshot: Optional[DeploymentSnapshot],
+    data_request: DataRequest,
+    generation,
+):
+    """The generation a result for data_request is valid for. Requests that run
+    into hours the cache does not hold (such as hours ENTSO-E has not published
+    yet) may get them without anything being written, so their results are also
+    only valid until the newest available hour moves on."""
+    if generation is None:
+        return None
+    if data_fetcher.is_cached(data_request, snapshot.end if snapshot else None):
+        return generation
+    return (generation, maximum_date_end_exclusive())
+
+
+def _analyze_with_snapshot(snapshot: DeploymentSnapshot, data_request: DataRequest):
+    """Slice the precomputed analysis, and only fetch and analyze the hours newer
+    than the snapshot."""
+    start_date, end_date, rules = ENTSOEDataFetcher._request_bounds(data_request)
+    parts = []
+    data = None
+    if start_date < snapshot.end:
+        parts.append(
+            snapshot.analysis(start_date, min(end_date, snapshot.end), rules)
+        )
+    if end_date > snapshot.end:
+        data = _get_fetcher().get_data(
+            SimpleInterval(max(start_date, snapshot.end), end_date)
+        )
+        aggregated, contributions = analyzer.analyze(data)
+        if rules is not None:
+            aggregated = aggregated[time_pattern.pattern_mask(aggregated.index, rules)]
+            contributions = {
+                country: df[time_pattern.pattern_mask(df.index, rules)]
+                for country, df in contributions.items()
+            }
+        parts.append((aggregated, contributions))
+    aggregated, contributions = deployment_snapshot.combine(parts)
+    if data is not None:
+        _mark_stale(aggregated, data)
+    return aggregated, contributions
+
+
+def _mark_stale(aggregated: pd.DataFrame, data):
+    """Record in aggregated.attrs["cached_end"] where the data stops, if some
+    series were served stale from the cache (stale_while_revalidate)."""
+    cached_ends = [
+        getattr(data, field.name).attrs.get("cached_end") for field in fields(data)
+    ]
+    cached_ends = [end for end in cached_ends if end is not None]
+    if cached_ends:
+        aggregated.attrs["cached_end"] = min(cached_ends)
@@ -1,18 +1,33 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import xml.etree.ElementTree as ET
 import os
-import json
-from typing import Dict, Any, Optional, List, Union
+from typing import Callable, Dict, Any, Hashable, Optional, List, Tuple, Union
 import aiohttp
 import asyncio
 import logging
 import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, fields
-import aiofiles
 import time
 
 from data_types import Data
+from blob_backend import BlobBackend
+from cache_backend import CacheBackend, open_backend
+from interval_set import Interval, IntervalSet
+from fetch_planner import FetchPlan
+from http_pool import HTTPPool
+from request_scheduler import RequestScheduler
+import fetch_planner
+from quality_index import QualityIndex, QualityReport
+import quality_index
+from response_archive import ResponseArchive
+from series_memo import SeriesMemo
+import series_memo
 
 from time_pattern import AdvancedPattern, AdvancedPatternRule
 import time_pattern
@@ -38,17 +53,93 @@ class ENTSOEDataFetcher:
         os.path.dirname(os.path.abspath(__file__)), "..", ".data_cache"
     )
     STANDARD_GRANULARITY = timedelta(hours=1)  # Set the standard granularity to 1 hour
-    CACHE_EXTENSION = "pkl.gz"
+    CACHE_EXTENSION = "pkl.gz"  # Legacy pickle cache, read as a fallback
     COMPRESSION_METHOD = "gzip"
-
-    def __init__(self):
+    # Storage backend of the cache: "columnar" or "sqlite" (see cache_backend)
+    CACHE_BACKEND = os.getenv("ENTSOE_CACHE_BACKEND", "columnar")
+    # Shard codec for the columnar cache: "npy" (memory-mapped) or "edz" (compact)
+    CACHE_CODEC = os.getenv("ENTSOE_CACHE_CODEC", "npy")
+    # Trailing window that refresh_recent re-fetches to pick up ENTSO-E revisions
+    REVISION_WINDOW = timedelta(days=int(os.getenv("ENTSOE_REVISION_WINDOW_DAYS", "7")))
+    # Writable cache layered over CACHE_DIR, which is then only read. Used by
+    # default on Vercel, where the bundled cache is read-only.
+    OVERLAY_DIR = os.getenv("ENTSOE_CACHE_OVERLAY_DIR")
+    VERCEL_OVERLAY_DIR = os.path.join(tempfile.gettempdir(), "entsoe_data_cache")
+    # Blob storage holding an exported cache (see blob_backend), read below every
+    # local tier
+    BLOB_URL = os.getenv("ENTSOE_CACHE_BLOB_URL")
+    # Whole blob shards held in memory, and how many of the newest years of every
+    # series preload downloads ahead of time
+    BLOB_CACHE_BYTES = int(os.getenv("ENTSOE_BLOB_CACHE_MB", "64")) * 1024 * 1024
+    BLOB_PREFETCH_YEARS = int(os.getenv("ENTSOE_BLOB_PREFETCH_YEARS", "1"))
+    # Directory where the raw API responses are archived (see response_archive),
+    # so the cache can be rebuilt from them without the network. Off when unset.
+    ARCHIVE_DIR = os.getenv("ENTSOE_RESPONSE_ARCHIVE_DIR")
+    # Serve requests that only miss the newest hours from the cache at once, and
+    # fetch those hours in the background (stale-while-revalidate). Off when unset.
+    STALE_WHILE_REVALIDATE = bool(os.getenv("ENTSOE_STALE_WHILE_REVALIDATE"))
+    # Minimum time between two background refreshes of the same series
+    MIN_REFRESH_INTERVAL = timedelta(
+        seconds=int(os.getenv("ENTSOE_MIN_REFRESH_SECONDS", "900"))
+    )
+    # Connections to ENTSO-E kept open and shared by all requests (see http_pool),
+    # and how many of them warm_connections opens ahead of time
+    HTTP_POOL_SIZE = int(os.getenv("ENTSOE_HTTP_POOL_SIZE", "8"))
+    HTTP_PREWARM_CONNECTIONS = int(os.getenv("ENTSOE_HTTP_PREWARM", "0"))
+    # Pacing of the API requests (see request_scheduler); ENTSO-E allows 400
+    # requests per minute
+    REQUESTS_PER_MINUTE = float(os.getenv("ENTSOE_REQUESTS_PER_MINUTE", "300"))
+    MAX_IN_FLIGHT_REQUESTS = int(os.getenv("ENTSOE_MAX_IN_FLIGHT_REQUESTS", "8"))
+    MAX_REQUEST_RETRIES = int(os.getenv("ENTSOE_MAX_REQUEST_RETRIES", "5"))
+    # Upper bound of the loaded series held in memory (see series_memo); 0 disables
+    MEMORY_CACHE_BYTES = int(os.getenv("ENTSOE_MEMORY_CACHE_MB", "256")) * 1024 * 1024
+
+    def __init__(self, offline: bool = False):
+        """An offline fetcher only reads the cache (inspection, dry runs, quality
+        reports, exports), so it does not need an API key; any request it would
+        have to send to ENTSO-E raises instead."""
         self.security_token = os.getenv("ENTSOE_API_KEY")
-        if not self.security_token:
+        if not self.security_token and not offline:
             raise ValueError(
                 "ENTSOE_API_KEY environment variable is not set. Please set it with your ENTSO-E API key."
             )
         self.is_initialized = {}
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        overlay_dir = self.OVERLAY_DIR or (
+            self.VERCEL_OVERLAY_DIR if os.getenv("VERCEL_ENV") else None
+        )
+        # Read-only tiers below the writable one, lowest first
+        self.base_tiers: List[CacheBackend] = []
+        if self.BLOB_URL:
+            self.base_tiers.append(BlobBackend(self.BLOB_URL, self.BLOB_CACHE_BYTES))
+        if overlay_dir:
+            self.base_tiers.append(self._open_cache(self.CACHE_DIR))
+        cache_dir = overlay_dir or self.CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        # The writable tier: new rows are only ever written here
+        self.cache = self._open_cache(cache_dir)
+        self.archive = ResponseArchive(self.ARCHIVE_DIR) if self.ARCHIVE_DIR else None
+        # Data-quality bitmaps of the rows written to the writable tier
+        self.quality = QualityIndex(cache_dir)
+        # Whole series loaded from the local tiers, reused while unchanged
+        self.memory = SeriesMemo(self.MEMORY_CACHE_BYTES)
+        self.stale_while_revalidate = self.STALE_WHILE_REVALIDATE
+        self.http = HTTPPool(self.HTTP_POOL_SIZE)
+        self.scheduler = RequestScheduler(
+            self.REQUESTS_PER_MINUTE,
+            self.MAX_IN_FLIGHT_REQUESTS,
+            self.MAX_REQUEST_RETRIES,
+        )
+        # Series -> time.monotonic() of the start of its last background refresh
+        self._refreshed_at: Dict[str, float] = {}
+        self._refresh_lock = threading.Lock()
+        # Called with the series name after new rows of it are stored, from the
+        # writing thread (core uses it to refresh the precomputed presets)
+        self.on_write: Optional[Callable[[str], None]] = None
+
+    def _open_cache(self, cache_dir: str) -> CacheBackend:
+        return open_backend(
+            self.CACHE_BACKEND, cache_dir, self.CACHE_CODEC, self.CACHE_EXTENSION
+        )
 
     def get_data(self, data_request: DataRequest, progress_callback=None) -> Data:
         """Fetch data according to the request type."""
@@ -186,22 +277,10 @@ class ENTSOEDataFetcher:
         if "start_time" in df.columns:
             df = df.set_index("start_time")
 
-        # Create mask based on each component
-        mask = pd.Series(True, index=df.index)
-
-        if rules.years:
-            mask &= df.index.year.isin(rules.years)  # type: ignore
-
-        if rules.months:
-            mask &= df.index.month.isin(rules.months)  # type: ignore
-
-        if rules.days:
-            mask &= df.index.day.isin(rules.days)  # type: ignore
-
-        if rules.hours:
-            mask &= df.index.hour.isin(rules.hours)  # type: ignore
+        mask = time_pattern.pattern_mask(df.index, rules)  # type: ignore
 
         result = df[mask]
+        result.attrs = dict(df.attrs)
         index_max = result.index.max()
         index_min = result.index.min()
         index_length = len(result.index)
@@ -211,82 +290,225 @@ class ENTSOEDataFetcher:
         logger.debug("Index length:", index_length)
         return result
 
+    @asynccontextmanager
+    async def _writer_lock(self, cache_name: str):
+        """Hold the series' cross-process writer lock. Only one process at a time
+        fetches and writes a series; the others wait here and then find the rows
+        it wrote in the cache instead of downloading them again."""
+        lock = self.cache.lock(cache_name)
+        if not lock.acquire(blocking=False):
+            logger.info(f"Waiting for another process to finish writing {cache_name}")
+            await asyncio.to_thread(lock.acquire)
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _tiers(self) -> List[CacheBackend]:
+        """Every cache tier, the writable one last (it takes precedence)."""
+        return self.base_tiers + [self.cache]
+
+    def _coverage(self, cache_name: str) -> IntervalSet:
+        """What is cached for the series across all tiers."""
+        coverage = IntervalSet()
+        for tier in self._tiers():
+            for start_date, end_date in tier.coverage(cache_name):
+                coverage.add(start_date, end_date)
+        return coverage
+
+    def _canonicalize(
+        self, cache_name: str, df: pd.DataFrame, covered: List[Interval]
+    ) -> pd.DataFrame:
+        """utils.canonicalize df against the cached rows just before and after the
+        covered intervals, so that gaps across the seams are filled. Only cached
+        rows touching covered are used, and only hours in covered are returned:
+        uncached hours around them are left for a fetch to fill."""
+        if df.empty or not covered:
+            return df.iloc[0:0]
+        coverage = self._coverage(cache_name)
+        new_coverage = IntervalSet(list(covered))
+        before = after = None
+        if any(start < new_coverage.start <= end for start, end in coverage):
+            before = self._read_tiers(
+                cache_name,
+                new_coverage.start - self.STANDARD_GRANULARITY,
+                new_coverage.start,
+                None,
+            )
+        if any(start <= new_coverage.end < end for start, end in coverage):
+            after = self._read_tiers(
+                cache_name,
+                new_coverage.end,
+                new_coverage.end + self.STANDARD_GRANULARITY,
+                None,
+            )
+        canonical = utils.canonicalize(df, before, after)
+        inside = np.zeros(len(canonical), dtype=bool)
+        for start, end in new_coverage:
+            inside |= (canonical["start_time"] >= start).to_numpy() & (
+                canonical["start_time"] < end
+            ).to_numpy()
+        return canonical[inside].reset_index(drop=True)
+
+    def _write_series(
+        self,
+        cache_name: str,
+        params: Dict[str, Any],
+        data: pd.DataFrame,
+        covered: List[Interval],
+    ):
+        """Store data in canonical form, mark covered as fetched and record the
+        quality flags of the rows. Must be called while holding the series' writer
+        lock."""
+        canonical = self._canonicalize(cache_name, data, covered)
+        self.cache.append(cache_name, params, canonical, covered, canonical=True)
+        self.quality.update(cache_name, data, canonical)
+        if self.on_write is not None:
+            self.on_write(cache_name)
+
     async def _save_to_cache(
-        self, params: Dict[str, Any], data: pd.DataFrame, metadata: Dict[str, Any]
+        self,
+        params: Dict[str, Any],
+        data: pd.DataFrame,
+        covered: List[Interval],
     ):
+        """Merge data into the cached series and mark the covered intervals as
+        fetched. Must be called while holding the series' writer lock."""
         cache_name = utils.get_cache_filename(params)
-        cache_file = os.path.join(
-            self.CACHE_DIR, f"{cache_name}.{self.CACHE_EXTENSION}"
-        )
         logger.debug(f"Attempting to save cache file: {cache_name}")
+        # Use asyncio.to_thread for the disk writes since they're blocking
+        await asyncio.to_thread(self._write_series, cache_name, params, data, covered)
+        logger.debug("Successfully saved cache files")
 
-        # Use asyncio.to_thread for the pandas operation since it's CPU-bound
-        await asyncio.to_thread(
-            data.to_pickle,
-            cache_file,
-            compression={
-                "method": self.COMPRESSION_METHOD,
-                "compresslevel": 1,
-                "mtime": 0,
-            },
-        )
+    def _load_tier(
+        self,
+        tier: CacheBackend,
+        cache_name: str,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        columns: Optional[List[str]],
+    ) -> pd.DataFrame:
+        """tier.load, served from the whole series held in memory when the tier
+        has not changed it since it was loaded. The blob tier is always read
+        through its range requests, which only download the hours asked for."""
+        version = None
+        if self.memory.max_bytes and not isinstance(tier, BlobBackend):
+            version = tier.version(cache_name)
+        if version is None:
+            return tier.load(cache_name, start_date, end_date, columns)
+
+        def load_series() -> pd.DataFrame:
+            df = tier.load(cache_name)
+            if not df["start_time"].is_monotonic_increasing:
+                df = df.sort_values("start_time").reset_index(drop=True)
+            return df
 
-        metadata_file = os.path.join(self.CACHE_DIR, f"{cache_name}_metadata.json")
-        async with aiofiles.open(metadata_file, "w") as f:
-            await f.write(json.dumps(metadata))
-        logger.debug("Successfully saved cache files")
+        df = self.memory.load((tier.cache_dir, cache_name), version, load_series)
+        return series_memo.slice_series(df, start_date, end_date, columns)
+
+    def preload(self) -> List[str]:
+        """Load every cached series of the local tiers into memory ahead of the
+        requests that need them, and download the shards of the newest
+        BLOB_PREFETCH_YEARS years from the blob tier. Returns the preloaded
+        series."""
+        preloaded = []
+        for params in self._series_params().values():
+            cache_name = utils.get_cache_filename(params)
+            for tier in self._tiers():
+                coverage = tier.coverage(cache_name)
+                if not coverage:
+                    continue
+                if isinstance(tier, BlobBackend):
+                    if not self.BLOB_PREFETCH_YEARS:
+                        continue
+                    last_year = (coverage.end - self.STANDARD_GRANULARITY).year
+                    first_year = last_year - self.BLOB_PREFETCH_YEARS + 1
+                    tier.prefetch(cache_name, list(range(first_year, last_year + 1)))
+                elif self.memory.max_bytes:
+                    self._load_tier(tier, cache_name, None, None, None)
+                else:
+                    continue
+                preloaded.append(cache_name)
+        return sorted(set(preloaded))
 
-    async def _load_from_cache(self, params: Dict[str, Any]) -> Optional[tuple]:
+    def _read_tiers(
+        self,
+        cache_name: str,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        columns: Optional[List[str]],
+    ) -> pd.DataFrame:
+        # Each tier's coverage is read once, so a writer publishing meanwhile
+        # cannot make the tiers disagree between the checks below
+        tiers = [(tier, tier.coverage(cache_name)) for tier in self._tiers()]
+        tiers = [(tier, coverage) for tier, coverage in tiers if coverage]
+        if not tiers:
+            return pd.DataFrame(columns=["start_time"])
+        if len(tiers) == 1:
+            tier, _ = tiers[0]
+            return self._load_tier(tier, cache_name, start_date, end_date, columns)
+
+        frames = []
+        for tier, coverage in tiers:
+            df = self._load_tier(tier, cache_name, start_date, end_date, columns)
+            # Only keep the hours the tier has fetched, so the NaN rows padding an
+            # upper tier's grid do not hide the rows of the tier below
+            fetched = pd.Series(False, index=df.index)
+            for interval_start, interval_end in coverage:
+                fetched |= (df["start_time"] >= interval_start) & (
+                    df["start_time"] < interval_end
+                )
+            frames.append(df[fetched])
+        return (
+            pd.concat(frames)
+            .drop_duplicates(subset=["start_time"], keep="last")
+            .sort_values("start_time")
+            .reset_index(drop=True)
+        )
+
+    async def _load_from_cache(
+        self,
+        params: Dict[str, Any],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Optional[pd.DataFrame]:
+        """Load cached rows in [start_date, end_date), or None if nothing is cached.
+
+        Without bounds the whole cached history is returned. columns restricts the
+        value columns that are read from disk.
+        """
         try:
             cache_name = utils.get_cache_filename(params)
-            cache_file = os.path.join(
-                self.CACHE_DIR, f"{cache_name}.{self.CACHE_EXTENSION}"
-            )
-            metadata_file = os.path.join(self.CACHE_DIR, f"{cache_name}_metadata.json")
-
-            if os.path.exists(cache_file) and os.path.exists(metadata_file):
-                # Use asyncio.to_thread for the pandas operation since it's CPU-bound
-                try:
-                    async with aiofiles.open(metadata_file, "r") as f:
-                        metadata = json.loads(await f.read())
-
-                    data = await asyncio.to_thread(pd.read_pickle, cache_file)
-
-                    # Convert string representation back to Timedelta if necessary
-                    if "resolution" in metadata and isinstance(
-                        metadata["resolution"], str
-                    ):
-                        metadata["resolution"] = pd.Timedelta(metadata["resolution"])
-
-                    # Convert cached dates to naive datetime objects
-                    metadata["start_date_inclusive"] = pd.to_datetime(
-                        metadata["start_date_inclusive"]
-                    ).tz_localize(None)
-                    metadata["end_date_exclusive"] = pd.to_datetime(
-                        metadata["end_date_exclusive"]
-                    ).tz_localize(None)
-
-                    return data, metadata
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decoding JSON from cache: {str(e)}")
-                    # Remove the corrupted cache files
-                    os.remove(cache_file)
-                    os.remove(metadata_file)
-                    return None
-            return None
         except ValueError as e:
             logger.warning(
                 f"Cache filename generation failed: {str(e)}. Will fetch data instead."
             )
             return None
 
+        if not self._coverage(cache_name):
+            return None
+
+        # Use asyncio.to_thread for the disk reads since they're blocking
+        df = await asyncio.to_thread(
+            self._read_tiers, cache_name, start_date, end_date, columns
+        )
+        # Tells analyzer.prepare_data that it can use the rows as they are
+        df.attrs["canonical"] = all(
+            tier.canonical(cache_name)
+            for tier in self._tiers()
+            if tier.coverage(cache_name)
+        )
+        return df
+
     async def _async_parse_xml_to_dataframe(self, xml_data: str) -> pd.DataFrame:
         """Async wrapper for XML parsing"""
         df = await asyncio.to_thread(self._parse_xml_internal, xml_data)
         df = utils.resample_to_standard_granularity(df, self.STANDARD_GRANULARITY)
         return df
 
-    def _parse_xml_internal(self, xml_data: str) -> pd.DataFrame:
+    @staticmethod
+    def _parse_xml_internal(xml_data: str) -> pd.DataFrame:
         """Synchronous XML parsing function to run in thread pool"""
         root = ET.fromstring(xml_data)
         namespace = {"ns": root.tag.split("}")[0].strip("{")}
@@ -390,6 +612,11 @@ class ENTSOEDataFetcher:
     async def _make_request_async(
         self, session: aiohttp.ClientSession, params: Dict[str, Any]
     ) -> str:
+        if not self.security_token:
+            raise ValueError(
+                "ENTSOE_API_KEY environment variable is not set, cannot send "
+                "requests to ENTSO-E"
+            )
         params["securityToken"] = self.security_token
         start_dt = datetime.now()
         print(
@@ -405,94 +632,403 @@ class ENTSOEDataFetcher:
             )
             return text
 
+    async def _scheduled_request(
+        self, session: aiohttp.ClientSession, params: Dict[str, Any]
+    ) -> str:
+        """_make_request_async within the scheduler's rate and concurrency limits,
+        retried on its own on transient failures."""
+        return await self.scheduler.run(
+            lambda: self._make_request_async(session, params),
+            f"{params.get('documentType')} {params.get('periodStart')}-"
+            f"{params.get('periodEnd')}",
+        )
+
     async def _fetch_data_in_chunks(
         self, params: Dict[str, Any], start_date: datetime, end_date: datetime
     ) -> List[str]:
-        tasks = []
-        async with aiohttp.ClientSession() as session:
-            while start_date < end_date:
-                # Ranges of 360 days to avoid the limit with more tolerance
-                chunk_end_date = min(start_date + timedelta(days=360), end_date)
-                chunk_params = params.copy()
-                chunk_params["periodStart"] = start_date.strftime("%Y%m%d%H%M")
-                chunk_params["periodEnd"] = chunk_end_date.strftime("%Y%m%d%H%M")
-                tasks.append(self._make_request_async(session, chunk_params))
-                start_date = chunk_end_date
-            return await asyncio.gather(*tasks)
+        chunks = []
+        for chunk_start, chunk_end in fetch_planner.split_into_chunks(
+            start_date, end_date
+        ):
+            chunk_params = params.copy()
+            chunk_params["periodStart"] = chunk_start.strftime("%Y%m%d%H%M")
+            chunk_params["periodEnd"] = chunk_end.strftime("%Y%m%d%H%M")
+            chunks.append(chunk_params)
+
+        async def request_chunks(session: aiohttp.ClientSession) -> List[str]:
+            return await asyncio.gather(
+                *[self._scheduled_request(session, chunk) for chunk in chunks]
+            )
+
+        responses = await self.http.run(request_chunks)
+        if self.archive is not None:
+            await asyncio.to_thread(self._archive_responses, chunks, responses)
+        return responses
+
+    def warm_connections(self, connections: Optional[int] = None):
+        """Open keep-alive connections to the API ahead of the first fetch
+        (HTTP_PREWARM_CONNECTIONS by default)."""
+        if connections is None:
+            connections = self.HTTP_PREWARM_CONNECTIONS
+        if connections > 0:
+            self.http.warm(self.BASE_URL, connections)
+
+    def _archive_responses(self, chunks: List[Dict[str, Any]], responses: List[str]):
+        for chunk_params, response in zip(chunks, responses):
+            try:
+                self.archive.put(chunk_params, response)  # type: ignore
+            except (OSError, ValueError) as e:
+                # The archive is a convenience; never fail a fetch because of it
+                logger.warning(
+                    f"Could not archive the response for {chunk_params['periodStart']}"
+                    f"-{chunk_params['periodEnd']}: {e}"
+                )
+
+    async def _fetch_gap(
+        self, params: Dict[str, Any], start_date: datetime, end_date: datetime
+    ) -> pd.DataFrame:
+        """Download and parse the rows in [start_date, end_date)."""
+        xml_chunks = await self._fetch_data_in_chunks(params, start_date, end_date)
+        df_chunks = await asyncio.gather(
+            *[self._async_parse_xml_to_dataframe(xml) for xml in xml_chunks]
+        )
+        df = pd.concat(df_chunks, ignore_index=True)
+        if df.empty:
+            return df
+        return df[
+            (df["start_time"] >= start_date) & (df["start_time"] < end_date)
+        ].reset_index(drop=True)
+
+    def _plan_series(
+        self, params: Dict[str, Any], start_date: datetime, end_date: datetime
+    ) -> FetchPlan:
+        try:
+            cache_name = utils.get_cache_filename(params)
+            coverage = self._coverage(cache_name)
+        except ValueError as e:
+            logger.warning(
+                f"Cache filename generation failed: {str(e)}. Will fetch data instead."
+            )
+            cache_name = str(params)
+            coverage = IntervalSet()
+        return fetch_planner.plan_fetch(cache_name, coverage, start_date, end_date)
 
     async def _fetch_and_cache_data(
         self,
         params: Dict[str, Any],
         start_date: datetime,
         end_date: datetime,
+        stale: bool = True,
     ) -> pd.DataFrame:
+        """The rows of the series in [start_date, end_date), fetching the hours
+        missing from the cache. With stale_while_revalidate (and stale), hours
+        missing only past the end of the cache are left to a background refresh
+        and the frame's attrs["cached_end"] says where the answer stops."""
         if start_date >= end_date:
             raise ValueError("end_date must be greater than start_date")
 
-        cached_data = await self._load_from_cache(params)
-
         logger.debug(f"Requested date range: {start_date} to {end_date}")
+        plan = self._plan_series(params, start_date, end_date)
 
-        fetch_start = start_date
-        # fetch_end = end_date
-        fetch_end = utils.maximum_date_end_exclusive()
+        # FULL HIT
+        if not plan.gaps:
+            logger.debug(
+                f"[_fetch_and_cache_data]: FULL CACHE HIT\n{params}\nstart: {start_date}\nend: {end_date}"
+            )
+            # Only the requested rows are read from disk
+            return await self._load_from_cache(params, start_date, end_date)
 
-        if cached_data is not None:  # FULL OR PARTIAL HIT
-            df, metadata = cached_data
-            cached_start = pd.to_datetime(metadata["start_date_inclusive"])
-            cached_end = pd.to_datetime(metadata["end_date_exclusive"])
+        if stale and self.stale_while_revalidate:
+            coverage = self._coverage(plan.cache_name)
+            if (
+                coverage
+                and coverage.end > start_date
+                and all(gap_start >= coverage.end for gap_start, _ in plan.gaps)
+            ):
+                # STALE HIT: only the newest hours are missing
+                self._revalidate(params, start_date, end_date)
+                df = await self._load_from_cache(params, start_date, end_date)
+                if df is not None:
+                    # How far the answer reaches, for the staleness metadata
+                    df.attrs["cached_end"] = coverage.end
+                    return df
+
+        # New rows always go to the writable tier (the overlay on read-only
+        # deployments), and reads merge it with the tiers below
+        async with self._writer_lock(plan.cache_name):
+            # Another process may have fetched the gaps while this one waited
+            plan = self._plan_series(params, start_date, end_date)
+            coverage = self._coverage(plan.cache_name)
+            if not plan.gaps:
+                logger.debug("[_fetch_and_cache_data]: FILLED BY ANOTHER WRITER")
+                return await self._load_from_cache(params, start_date, end_date)
+
+            new_df, covered, errors = await self._fetch_plan(params, plan, coverage)
+            if covered:
+                # Only the shards the new rows fall into are rewritten
+                await self._save_to_cache(params, new_df, covered)
+                logger.debug(f"Saved to cache: {covered}")
+            if errors:
+                # The chunks that succeeded are kept for the next attempt
+                raise errors[0]
+            if not covered and not coverage:
+                return new_df
+            return await self._load_from_cache(params, start_date, end_date)
+
+    def _revalidate(
+        self, params: Dict[str, Any], start_date: datetime, end_date: datetime
+    ):
+        """Fetch the missing hours of the series in a background thread, unless a
+        refresh of it started less than MIN_REFRESH_INTERVAL ago."""
+        cache_name = utils.get_cache_filename(params)
+        with self._refresh_lock:
+            last = self._refreshed_at.get(cache_name)
+            now = time.monotonic()
+            if (
+                last is not None
+                and now - last < self.MIN_REFRESH_INTERVAL.total_seconds()
+            ):
+                return
+            self._refreshed_at[cache_name] = now
+
+        def refresh():
+            try:
+                asyncio.run(
+                    self._fetch_and_cache_data(
+                        dict(params), start_date, end_date, stale=False
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"Background refresh of {cache_name} failed: {e}")
+
+        threading.Thread(
+            target=refresh, name=f"refresh-{cache_name}", daemon=True
+        ).start()
+
+    async def _fetch_plan(
+        self, params: Dict[str, Any], plan: FetchPlan, coverage: IntervalSet
+    ) -> Tuple[pd.DataFrame, List[Interval], List[BaseException]]:
+        """Fetch the gaps of plan. Returns the new rows, the intervals they cover
+        and the errors of the chunks that could not be fetched."""
+        # PARTIAL HIT OR FULL MISS: only the missing sub-intervals are fetched
+        logger.debug(f"[_fetch_and_cache_data]: FETCH NEEDED\n{plan.describe()}")
+        # One fetch per chunk, so a chunk that still fails after its retries does
+        # not discard the ones that succeeded
+        chunks = plan.chunks
+        chunk_dfs = await asyncio.gather(
+            *[
+                self._fetch_gap(params, chunk_start, chunk_end)
+                for chunk_start, chunk_end in chunks
+            ],
+            return_exceptions=True,
+        )
 
-            # Note: end_date is exclusive, so cached_end should be >= end_date
-            # FULL HIT
-            if cached_start <= start_date and cached_end >= end_date:
-                logger.debug(
-                    f"[_fetch_and_cache_data]: FULL CACHE HIT\n{params}\nstart: {start_date}\nend: {end_date}"
+        covered = []
+        errors = []
+        for (chunk_start, chunk_end), chunk_df in zip(chunks, chunk_dfs):
+            if isinstance(chunk_df, BaseException):
+                logger.error(
+                    f"Fetching {plan.cache_name} {chunk_start} - {chunk_end} failed: "
+                    f"{chunk_df}"
                 )
-                # Note: end_time < end_date because end_date is exclusive
-                return df[
-                    (df["start_time"] >= start_date) & (df["start_time"] < end_date)
-                ]
+                errors.append(chunk_df)
+            elif coverage.end is not None and chunk_end <= coverage.end:
+                # A hole before cached data: whatever ENTSO-E returned is all there is
+                covered.append((chunk_start, chunk_end))
+            elif not chunk_df.empty:
+                # Hours past the last returned row are not marked as covered, since
+                # ENTSO-E may simply not have published them yet
+                last_row_end = chunk_df["start_time"].max() + self.STANDARD_GRANULARITY
+                covered.append(
+                    (chunk_start, min(chunk_end, last_row_end.to_pydatetime()))
+                )
+        non_empty = [
+            df
+            for df in chunk_dfs
+            if not isinstance(df, BaseException) and not df.empty
+        ]
+        new_df = (
+            pd.concat(non_empty, ignore_index=True)
+            if non_empty
+            else pd.DataFrame(columns=["start_time"])
+        )
+        return new_df, covered, errors
 
-            # CACHE EXISTS, BUT IT'S A PARTIAL HIT OR FULL MISS
-            fetch_start = cached_end
-            logger.debug(
-                f"[_fetch_and_cache_data]: FETCH NEEDED: \n{params}\ncache_end: {cached_end}\nstart: {start_date}\nend: {end_date}"
-            )
-            logger.debug(f"Adjusted fetch_start to {fetch_start}")
+    @staticmethod
+    def _generation_params(country_code: str) -> Dict[str, Any]:
+        return {
+            "documentType": "A75",
+            "processType": "A16",
+            "in_Domain": country_code,
+            "outBiddingZone_Domain": country_code,
+        }
+
+    @staticmethod
+    def _flow_params(out_domain: str, in_domain: str) -> Dict[str, Any]:
+        return {
+            "documentType": "A11",
+            "in_Domain": in_domain,
+            "out_Domain": out_domain,
+        }
+
+    def _series_params(self) -> Dict[str, Dict[str, Any]]:
+        """Request parameters of every series, keyed by its Data field name."""
+        return {
+            "generation_pt": self._generation_params("10YPT-REN------W"),
+            "generation_es": self._generation_params("10YES-REE------0"),
+            "generation_fr": self._generation_params("10YFR-RTE------C"),
+            "flow_pt_to_es": self._flow_params("10YPT-REN------W", "10YES-REE------0"),
+            "flow_es_to_pt": self._flow_params("10YES-REE------0", "10YPT-REN------W"),
+            "flow_fr_to_es": self._flow_params("10YFR-RTE------C", "10YES-REE------0"),
+            "flow_es_to_fr": self._flow_params("10YES-REE------0", "10YFR-RTE------C"),
+        }
+
+    @staticmethod
+    def _request_bounds(
+        data_request: DataRequest,
+    ) -> Tuple[datetime, datetime, Optional[AdvancedPatternRule]]:
+        """The interval a request spans, and its pattern rules if it has any."""
+        if isinstance(data_request, SimpleInterval):
+            start_date, end_date = data_request.start_date, data_request.end_date
+            utils.validate_inputs(start_date, end_date)
+            return start_date, end_date, None
+        elif isinstance(data_request, AdvancedPattern):
+            rules = time_pattern.get_rules_from_pattern(data_request)
+            return utils.RECORDS_START, time_pattern.get_latest_time(rules), rules
         else:
-            logger.debug(
-                f"[_fetch_and_cache_data]: CACHE MISS\n{params}\nstart: {start_date}\nend: {end_date}"
-            )
+            raise ValueError(f"Invalid data request type: {type(data_request)}")
 
-        # Fetch new data
-        xml_chunks = await self._fetch_data_in_chunks(params, fetch_start, fetch_end)
-        new_df_chunks = await asyncio.gather(
-            *[self._async_parse_xml_to_dataframe(xml) for xml in xml_chunks]
+    def data_generation(self) -> Optional[Hashable]:
+        """Token of the cached data of every series in every tier, which changes
+        whenever any of it does. None if a tier cannot tell (CacheBackend.version)."""
+        versions = []
+        for params in self._series_params().values():
+            cache_name = utils.get_cache_filename(params)
+            for tier in self._tiers():
+                version = tier.version(cache_name)
+                if version is None:
+                    return None
+                versions.append((tier.cache_dir, cache_name, version))
+        return tuple(versions)
+
+    def is_cached(
+        self, data_request: DataRequest, start_date: Optional[datetime] = None
+    ) -> bool:
+        """Whether every series is cached over the whole request (from start_date
+        on, if given), so get_data would not fetch anything for it."""
+        request_start, end_date, _ = self._request_bounds(data_request)
+        if start_date is None or start_date < request_start:
+            start_date = request_start
+        if start_date >= end_date:
+            return True
+        return all(
+            not self._plan_series(params, start_date, end_date).gaps
+            for params in self._series_params().values()
         )
-        new_df = pd.concat(new_df_chunks, ignore_index=True)
 
-        if cached_data is not None:
-            df = (
-                pd.concat([cached_data[0], new_df])
-                .drop_duplicates(subset=["start_time"], keep="last")
-                .reset_index(drop=True)
-            )
-        else:
-            df = new_df
+    def plan(self, data_request: DataRequest) -> Dict[str, FetchPlan]:
+        """Dry run of get_data: the chunks each series would download, without
+        touching the network."""
+        start_date, end_date, _ = self._request_bounds(data_request)
+        return {
+            field_name: self._plan_series(params, start_date, end_date)
+            for field_name, params in self._series_params().items()
+        }
 
-        if not df.empty:
-            metadata = {
-                "start_date_inclusive": df["start_time"].min().isoformat(),
-                "end_date_exclusive": (
-                    df["start_time"].max() + self.STANDARD_GRANULARITY
-                ).isoformat(),
-            }
-            metadata.update(params)
-            if not os.getenv("VERCEL_ENV"):
-                await self._save_to_cache(params, df, metadata)  ## TODO fix later
-            logger.debug(f"Saved to cache: {metadata}")
+    def quality_report(self, data_request: DataRequest) -> Dict[str, QualityReport]:
+        """Coverage and data-quality statistics of every series over the hours of
+        the request, computed from the coverage and the quality bitmaps alone
+        (no values are loaded). Hours only held by the blob tier are not
+        indexed."""
+        start_date, end_date, rules = self._request_bounds(data_request)
+        hours = pd.date_range(
+            start_date, end_date, freq=self.STANDARD_GRANULARITY, inclusive="left"
+        )
+        selected = (
+            time_pattern.pattern_mask(hours, rules)
+            if rules is not None
+            else np.ones(len(hours), dtype=bool)
+        )
+        return {
+            field_name: self._series_quality(
+                utils.get_cache_filename(params), start_date, end_date, selected
+            )
+            for field_name, params in self._series_params().items()
+        }
 
-        return df[(df["start_time"] >= start_date) & (df["start_time"] < end_date)]
+    def _series_quality(
+        self,
+        cache_name: str,
+        start_date: datetime,
+        end_date: datetime,
+        selected: np.ndarray,
+    ) -> QualityReport:
+        first = utils.hour_offset(start_date)
+        coverage = self._coverage(cache_name)
+        covered = np.zeros(len(selected), dtype=bool)
+        for interval_start, interval_end in coverage:
+            lo = max(utils.hour_offset(interval_start), first) - first
+            hi = min(utils.hour_offset(interval_end) - first, len(selected))
+            covered[max(lo, 0) : max(hi, 0)] = True
+
+        # Lowest tier first: upper tiers replace the flags of the hours they hold
+        known = np.zeros(len(selected), dtype=bool)
+        flags: Dict[str, Dict[str, np.ndarray]] = {}
+        for tier in self._tiers():
+            if isinstance(tier, BlobBackend):
+                continue
+            bitmaps = QualityIndex(tier.cache_dir).read(cache_name)
+            if bitmaps is None:
+                continue
+            window = quality_index.window(bitmaps, start_date, end_date)
+            tier_known = window["known"]
+            for column in set(flags) | set(window["columns"]):
+                if column not in flags:
+                    # Hours recorded without the column: it was not published
+                    flags[column] = {
+                        flag: np.zeros(len(selected), dtype=bool)
+                        for flag in quality_index.FLAGS
+                    }
+                    flags[column][quality_index.MISSING][known] = True
+                for flag in quality_index.FLAGS:
+                    if column in window["columns"]:
+                        row = window["columns"].index(column)
+                        values = window[flag][row]
+                    else:
+                        values = np.full(
+                            len(selected), flag == quality_index.MISSING
+                        )
+                    flags[column][flag][tier_known] = values[tier_known]
+            known |= tier_known
+
+        indexed = known & selected
+        empty = indexed.copy()
+        for column_flags in flags.values():
+            empty &= (
+                column_flags[quality_index.MISSING]
+                | column_flags[quality_index.INTERPOLATED]
+            )
+        gaps = []
+        for gap_start, gap_end in coverage.missing(start_date, end_date):
+            lo = utils.hour_offset(gap_start) - first
+            hi = utils.hour_offset(gap_end) - first
+            if selected[lo:hi].any():
+                gaps.append((gap_start, gap_end))
+        return QualityReport(
+            cache_name,
+            hours=int(selected.sum()),
+            covered_hours=int((covered & selected).sum()),
+            indexed_hours=int(indexed.sum()),
+            empty_hours=int(empty.sum()) if flags else 0,
+            counts={
+                column: {
+                    flag: int((values & indexed).sum())
+                    for flag, values in column_flags.items()
+                }
+                for column, column_flags in flags.items()
+            },
+            gaps=gaps,
+        )
 
     async def _async_get_generation_data(
         self,
@@ -501,12 +1037,7 @@ class ENTSOEDataFetcher:
         end_date: datetime,
         progress_callback=None,
     ) -> pd.DataFrame:
-        params = {
-            "documentType": "A75",
-            "processType": "A16",
-            "in_Domain": country_code,
-            "outBiddingZone_Domain": country_code,
-        }
+        params = self._generation_params(country_code)
         start_dt = datetime.now()
         df = await self._fetch_and_cache_data(params, start_date, end_date)
         end_dt = datetime.now()
@@ -526,11 +1057,7 @@ class ENTSOEDataFetcher:
         end_date: datetime,
         progress_callback=None,
     ) -> pd.DataFrame:
-        params = {
-            "documentType": "A11",
-            "in_Domain": in_domain,
-            "out_Domain": out_domain,
-        }
+        params = self._flow_params(out_domain, in_domain)
         start_dt = datetime.now()
         df = await self._fetch_and_cache_data(params, start_date, end_date)
         end_dt = datetime.now()
@@ -542,19 +1069,176 @@ class ENTSOEDataFetcher:
             progress_callback()
         return df
 
+    def refresh_recent(self, window: Optional[timedelta] = None) -> Dict[str, int]:
+        """Re-fetch the trailing window of every series and rewrite only the days
+        whose content changed (ENTSO-E revises recent values). Returns the number of
+        rewritten days per series."""
+        window = window or self.REVISION_WINDOW
+        end_date = utils.maximum_date_end_exclusive()
+        start_date = max(
+            utils.RECORDS_START,
+            (end_date - window).replace(hour=0),
+        )
+
+        async def _async_refresh():
+            return await asyncio.gather(
+                *[
+                    self._async_refresh_series(params, start_date, end_date)
+                    for params in self._series_params().values()
+                ]
+            )
+
+        changed = asyncio.run(_async_refresh())
+        return dict(zip(self._series_params(), changed))
+
+    async def _async_refresh_series(
+        self, params: Dict[str, Any], start_date: datetime, end_date: datetime
+    ) -> int:
+        fetched_df = await self._fetch_gap(params, start_date, end_date)
+        if fetched_df.empty:
+            return 0
+        last_row_end = fetched_df["start_time"].max() + self.STANDARD_GRANULARITY
+        covered = [(start_date, min(end_date, last_row_end.to_pydatetime()))]
+        # Compared in the form it is stored in, so filled gaps (and the rounding of
+        # a lossy codec) are no revision
+        fetched_df = await asyncio.to_thread(
+            self._canonicalize, utils.get_cache_filename(params), fetched_df, covered
+        )
+        fetched_df = self.cache.stored_form(fetched_df)
+        cached_df = await self._load_from_cache(params, start_date, end_date)
+
+        # Compare one day at a time, so a revision rewrites only the days it touched
+        fetched_days = fetched_df.groupby(fetched_df["start_time"].dt.floor("D"))
+        cached_days = (
+            dict(list(cached_df.groupby(cached_df["start_time"].dt.floor("D"))))
+            if cached_df is not None and not cached_df.empty
+            else {}
+        )
+        changed = [
+            day_df
+            for day, day_df in fetched_days
+            if day not in cached_days
+            or utils.hash_frame(day_df) != utils.hash_frame(cached_days[day])
+        ]
+        if not changed:
+            logger.debug(f"[refresh_recent] no revisions: {params}")
+            return 0
+
+        logger.info(f"[refresh_recent] {len(changed)} day(s) revised: {params}")
+        # Only the revised days are rewritten; the days between them keep their rows
+        revised = []
+        for day_df in changed:
+            day_end = day_df["start_time"].max() + self.STANDARD_GRANULARITY
+            revised.append(
+                (day_df["start_time"].min().to_pydatetime(), day_end.to_pydatetime())
+            )
+        async with self._writer_lock(utils.get_cache_filename(params)):
+            await self._save_to_cache(
+                params, pd.concat(changed, ignore_index=True), revised
+            )
+        return len(changed)
+
+    @classmethod
+    def _parse_archived(cls, archive_dir: str, digest: str) -> pd.DataFrame:
+        """Parse one archived response. Runs in a worker process."""
+        xml_data = ResponseArchive(archive_dir).get(digest)
+        df = cls._parse_xml_internal(xml_data)
+        return utils.resample_to_standard_granularity(df, cls.STANDARD_GRANULARITY)
+
+    def rebuild_from_archive(self, max_workers: Optional[int] = None) -> Dict[str, int]:
+        """Re-parse the archived responses of every series into the writable cache
+        tier, without any API call. The latest response to each request wins, and
+        its rows replace the cached ones. Responses are parsed in parallel worker
+        processes. Returns the number of responses parsed per series."""
+        if self.archive is None:
+            raise ValueError(
+                "No response archive configured. Set ENTSOE_RESPONSE_ARCHIVE_DIR."
+            )
+
+        series = {
+            cache_name: self.archive.latest(cache_name)
+            for cache_name in self.archive.series()
+        }
+        rebuilt = {}
+        with ProcessPoolExecutor(max_workers) as executor:
+            # Submit every series first so the workers stay busy across series
+            futures = {
+                cache_name: [
+                    executor.submit(
+                        self._parse_archived, self.archive.archive_dir, entry["sha256"]
+                    )
+                    for entry in entries
+                ]
+                for cache_name, entries in series.items()
+            }
+            for cache_name, entries in series.items():
+                frames, periods = [], []
+                for entry, future in zip(entries, futures[cache_name]):
+                    period_start = datetime.strptime(
+                        entry["params"]["periodStart"], "%Y%m%d%H%M"
+                    )
+                    period_end = datetime.strptime(
+                        entry["params"]["periodEnd"], "%Y%m%d%H%M"
+                    )
+                    periods.append((period_start, period_end))
+                    df = future.result()
+                    if not df.empty:
+                        frames.append(
+                            df[
+                                (df["start_time"] >= period_start)
+                                & (df["start_time"] < period_end)
+                            ]
+                        )
+                rebuilt[cache_name] = len(entries)
+                if not frames:
+                    continue
+
+                # Later responses (revisions) replace earlier rows for the same hour
+                df = (
+                    pd.concat(frames, ignore_index=True)
+                    .drop_duplicates(subset=["start_time"], keep="last")
+                    .sort_values("start_time")
+                    .reset_index(drop=True)
+                )
+                # As when fetching, hours past the last returned row are not marked
+                # as covered
+                last_row_end = (
+                    df["start_time"].max() + self.STANDARD_GRANULARITY
+                ).to_pydatetime()
+                covered = [
+                    (period_start, min(period_end, last_row_end))
+                    for period_start, period_end in periods
+                    if period_start < last_row_end
+                ]
+                params = {
+                    key: value
+                    for key, value in entries[-1]["params"].items()
+                    if key not in ("periodStart", "periodEnd")
+                }
+                with self.cache.lock(cache_name):
+                    self._write_series(cache_name, params, df, covered)
+                logger.info(
+                    f"Rebuilt {cache_name} from {len(entries)} archived response(s)"
+                )
+        return rebuilt
+
     def reset_cache(self):
-        """Delete all cached data."""
-        if os.path.exists(self.CACHE_DIR):
-            print(f"Deleting cache directory: {self.CACHE_DIR}")
-            shutil.rmtree(self.CACHE_DIR)
-            os.makedirs(self.CACHE_DIR)  # Recreate empty cache dir
+        """Delete all cached data of the writable tier."""
+        cache_dir = self.cache.cache_dir
+        if os.path.exists(cache_dir):
+            print(f"Deleting cache directory: {cache_dir}")
+            shutil.rmtree(cache_dir)
+            os.makedirs(cache_dir)  # Recreate empty cache dir
+        self.cache = self._open_cache(cache_dir)
+        self.memory = SeriesMemo(self.MEMORY_CACHE_BYTES)
 
     ########## For testing ###########
 
     def _make_request(self, params: Dict[str, Any]) -> str:
         async def run_async():
-            async with aiohttp.ClientSession() as session:
-                return await self._make_request_async(session, params)
+            return await self.http.run(
+                lambda session: self._scheduled_request(session, params)
+            )
 
         # Get or create an event loop
         try:
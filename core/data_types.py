@@ -19,6 +19,20 @@ class Data:
         ref_df = getattr(self, first_field.name)
         ref_index = ref_df.index
 
+        frames = [getattr(self, field.name) for field in fields(self)]
+        if all(df.attrs.get("canonical") for df in frames):
+            # Canonical indexes are sorted, unique and hourly, and every frame went
+            # through the same filters, so the bounds and length identify them
+            def _bounds(index: pd.Index):
+                return (len(index), index[0], index[-1]) if len(index) else (0,)
+
+            for field, df in zip(fields(self)[1:], frames[1:]):
+                if _bounds(df.index) != _bounds(ref_index):
+                    raise ValueError(
+                        f"Index mismatch in {field.name} compared to {first_field.name}"
+                    )
+            return
+
         # Compare all other dataframes to the reference
         for field in fields(self)[1:]:
             df = getattr(self, field.name)
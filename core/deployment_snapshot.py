@@ -0,0 +1,185 @@
+import json
+import os
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import analyzer
+import utils
+from data_types import Data
+from time_pattern import AdvancedPatternRule
+import time_pattern
+
+# Build-time snapshot of the prepared data and of its hourly analysis, so a cold
+# serverless instance can answer requests without loading and analyzing the cache:
+#
+#   <snapshot_dir>/snapshot.json -> {
+#       "version": 1,
+#       "start": "<first hour>", "end": "<hour after the last one>",
+#       "arrays": {"<name>": {"file": "<name>.npy", "columns": [...]}, ...},
+#   }
+#   <snapshot_dir>/<name>.npy -> (hours x columns) float64, row N is start + N hours
+#
+# There is one array per Data field (the canonical series, aligned on the same
+# hours) and one per analyzer.analyze output: "aggregated" and
+# "contributions_<country>". Rows are contiguous, so opening the arrays
+# memory-mapped makes slicing an interval read only its pages. analyze works hour
+# by hour, so the analysis of any interval or pattern is a slice of the
+# precomputed one.
+
+DEFAULT_DIR = os.getenv(
+    "ENTSOE_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".data_snapshot"),
+)
+MANIFEST_FILE = "snapshot.json"
+VERSION = 1
+AGGREGATED = "aggregated"
+CONTRIBUTIONS_PREFIX = "contributions_"
+
+Analysis = Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]
+
+
+def align(data: Data) -> Data:
+    """Cut every series of data to the hours all of them have (series are
+    published with different delays)."""
+    frames = [getattr(data, field.name) for field in fields(data)]
+    start = max(df["start_time"].min() for df in frames)
+    end = min(df["start_time"].max() for df in frames)
+    for field in fields(data):
+        df = getattr(data, field.name)
+        aligned = df[(df["start_time"] >= start) & (df["start_time"] <= end)]
+        aligned = aligned.reset_index(drop=True)
+        aligned.attrs = dict(df.attrs)
+        setattr(data, field.name, aligned)
+    return data
+
+
+def build_snapshot(data: Data, out_dir: str) -> List[str]:
+    """Write the prepared data and its hourly analysis to out_dir. data must hold
+    aligned series on the hourly grid (see align). Returns the written files,
+    manifest last."""
+    aggregated, contributions = analyzer.analyze(data)
+    arrays = {field.name: getattr(data, field.name) for field in fields(data)}
+    arrays[AGGREGATED] = aggregated
+    for country, df in contributions.items():
+        arrays[f"{CONTRIBUTIONS_PREFIX}{country}"] = df
+
+    index = data.generation_pt.index
+    hours = pd.date_range(index[0], index[-1], freq=utils.HOUR)
+    manifest: Dict[str, Any] = {
+        "version": VERSION,
+        "start": hours[0].isoformat(),
+        "end": (hours[-1] + utils.HOUR).isoformat(),
+        "arrays": {},
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, df in arrays.items():
+        values = df.reindex(hours).to_numpy(dtype="float64")
+        file_name = f"{name}.npy"
+        np.save(os.path.join(out_dir, file_name), np.ascontiguousarray(values))
+        manifest["arrays"][name] = {
+            "file": file_name,
+            "columns": [str(column) for column in df.columns],
+        }
+        written.append(file_name)
+
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    written.append(MANIFEST_FILE)
+    return written
+
+
+class DeploymentSnapshot:
+    def __init__(self, snapshot_dir: str, manifest: Dict[str, Any]):
+        self.snapshot_dir = snapshot_dir
+        self.start = datetime.fromisoformat(manifest["start"])
+        self.end = datetime.fromisoformat(manifest["end"])
+        self._manifest = manifest
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def open(cls, snapshot_dir: str = DEFAULT_DIR) -> Optional["DeploymentSnapshot"]:
+        """The snapshot in snapshot_dir, None if there is none (or an
+        incompatible one)."""
+        try:
+            with open(os.path.join(snapshot_dir, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get("version") != VERSION:
+            return None
+        return cls(snapshot_dir, manifest)
+
+    def frame(
+        self,
+        name: str,
+        start_date: datetime,
+        end_date: datetime,
+        rules: Optional[AdvancedPatternRule] = None,
+    ) -> pd.DataFrame:
+        """Rows start_date <= start_time < end_date of an array (clipped to the
+        snapshot), indexed by start_time, optionally filtered by pattern rules."""
+        if name not in self._arrays:
+            entry = self._manifest["arrays"][name]
+            self._arrays[name] = np.load(
+                os.path.join(self.snapshot_dir, entry["file"]), mmap_mode="r"
+            )
+        first = max(utils.hour_offset(start_date), utils.hour_offset(self.start))
+        last = min(utils.hour_offset(end_date), utils.hour_offset(self.end))
+        last = max(first, last)
+        origin = utils.hour_offset(self.start)
+        hours = pd.date_range(
+            utils.hour_at(first), periods=last - first, freq=utils.HOUR
+        )
+        values = np.array(self._arrays[name][first - origin : last - origin])
+        if rules is not None:
+            mask = time_pattern.pattern_mask(hours, rules)
+            hours, values = hours[mask], values[mask]
+        df = pd.DataFrame(
+            values, index=hours, columns=self._manifest["arrays"][name]["columns"]
+        )
+        df.index.name = "start_time"
+        return df
+
+    def analysis(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        rules: Optional[AdvancedPatternRule] = None,
+    ) -> Analysis:
+        """The analyze outputs for the hours of [start_date, end_date) held by the
+        snapshot (and matching rules)."""
+        aggregated = self.frame(AGGREGATED, start_date, end_date, rules)
+        contributions = {
+            name[len(CONTRIBUTIONS_PREFIX) :]: self.frame(
+                name, start_date, end_date, rules
+            )
+            for name in self._manifest["arrays"]
+            if name.startswith(CONTRIBUTIONS_PREFIX)
+        }
+        return aggregated, contributions
+
+
+def combine(parts: List[Analysis]) -> Analysis:
+    """Concatenate analyses of consecutive hours. Sources absent from a part
+    contributed nothing during its hours."""
+
+    def _concat(frames: List[pd.DataFrame]) -> pd.DataFrame:
+        columns = frames[0].columns
+        for df in frames[1:]:
+            columns = columns.union(df.columns, sort=False)
+        df = pd.concat([df.reindex(columns=columns, fill_value=0) for df in frames])
+        return analyzer.remove_empty_columns(df)
+
+    aggregated = _concat([aggregated for aggregated, _ in parts])
+    contributions = {
+        country: _concat([contributions[country] for _, contributions in parts])
+        for country in parts[0][1]
+    }
+    return aggregated, contributions
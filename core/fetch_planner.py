@@ -0,0 +1,91 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List
+
+from interval_set import Interval, IntervalSet
+
+# ENTSO-E rejects requests spanning more than a year; 360 days leaves some tolerance
+MAX_CHUNK = timedelta(days=360)
+
+# Rough costs used to estimate dry runs
+ESTIMATED_SECONDS_PER_REQUEST = 1.5
+ESTIMATED_SECONDS_PER_DAY = 0.02
+
+
+@dataclass
+class FetchPlan:
+    """The chunks that have to be downloaded to serve a request for one series."""
+
+    cache_name: str
+    start_date: datetime
+    end_date: datetime
+    # Missing sub-intervals of [start_date, end_date), before, inside and after the
+    # cached coverage
+    gaps: List[Interval] = field(default_factory=list)
+    max_chunk: timedelta = MAX_CHUNK
+
+    @property
+    def chunks(self) -> List[Interval]:
+        """The gaps split into requests ENTSO-E accepts."""
+        return [
+            chunk
+            for gap_start, gap_end in self.gaps
+            for chunk in split_into_chunks(gap_start, gap_end, self.max_chunk)
+        ]
+
+    @property
+    def requests(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def hours(self) -> int:
+        return sum((end - start) // timedelta(hours=1) for start, end in self.chunks)
+
+    @property
+    def estimated_seconds(self) -> float:
+        """Estimated download time if the chunks were fetched one after another."""
+        days = self.hours / 24
+        return (
+            self.requests * ESTIMATED_SECONDS_PER_REQUEST
+            + days * ESTIMATED_SECONDS_PER_DAY
+        )
+
+    def describe(self) -> str:
+        if not self.chunks:
+            return f"{self.cache_name}: fully cached"
+        lines = [
+            f"{self.cache_name}: {self.requests} request(s), {self.hours} hour(s), "
+            f"~{self.estimated_seconds:.1f}s"
+        ]
+        lines += [f"    {start} -> {end}" for start, end in self.chunks]
+        return "\n".join(lines)
+
+
+def split_into_chunks(
+    start_date: datetime, end_date: datetime, max_chunk: timedelta = MAX_CHUNK
+) -> List[Interval]:
+    chunks = []
+    while start_date < end_date:
+        chunk_end_date = min(start_date + max_chunk, end_date)
+        chunks.append((start_date, chunk_end_date))
+        start_date = chunk_end_date
+    return chunks
+
+
+def plan_fetch(
+    cache_name: str,
+    coverage: IntervalSet,
+    start_date: datetime,
+    end_date: datetime,
+    max_chunk: timedelta = MAX_CHUNK,
+) -> FetchPlan:
+    """Work out the minimal set of chunks to fetch so that [start_date, end_date) is
+    covered: gaps before, inside and after the cached coverage are all planned, and
+    nothing that is already cached is downloaded again."""
+    return FetchPlan(
+        cache_name,
+        start_date,
+        end_date,
+        gaps=coverage.missing(start_date, end_date),
+        max_chunk=max_chunk,
+    )
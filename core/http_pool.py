@@ -0,0 +1,103 @@
+import asyncio
+import atexit
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# One pooled aiohttp session for all ENTSO-E calls of a fetcher. Every get_data
+# runs in its own asyncio.run, and a session cannot outlive its event loop, so
+# the session lives on an event loop of its own in a daemon thread; callers hand
+# it coroutines through run(). Connections (and their DNS lookups and TLS
+# handshakes) are kept alive and reused across series, chunks and requests, and
+# responses are asked for gzip-compressed (aiohttp decompresses them).
+
+
+class HTTPPool:
+    def __init__(
+        self,
+        pool_size: int = 8,
+        keepalive_timeout: float = 60.0,
+        dns_cache_ttl: int = 300,
+    ):
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="http-pool", daemon=True
+                ).start()
+                self._loop = loop
+                atexit.register(self.close)
+            return self._loop
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Only ever called on the pool's loop, so no lock is needed
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Accept-Encoding": "gzip, deflate"},
+                auto_decompress=True,
+            )
+        return self._session
+
+    async def run(
+        self, request: Callable[[aiohttp.ClientSession], Awaitable[Any]]
+    ) -> Any:
+        """Await request(session) on the pool's loop, from any other loop."""
+
+        async def call():
+            return await request(await self._get_session())
+
+        future = asyncio.run_coroutine_threadsafe(call(), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def warm(self, url: str, connections: int):
+        """Open up to connections keep-alive connections to url ahead of the first
+        requests (blocking)."""
+        connections = min(connections, self.pool_size)
+
+        async def open_connections(session: aiohttp.ClientSession):
+            async def head():
+                try:
+                    async with session.head(url) as response:
+                        await response.read()
+                except aiohttp.ClientError as e:
+                    logger.debug(f"Warming a connection to {url} failed: {e}")
+
+            await asyncio.gather(*[head() for _ in range(connections)])
+
+        async def wait():
+            await self.run(open_connections)
+
+        asyncio.run(wait())
+
+    def close(self):
+        """Close the session and stop the pool's loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._session is not None:
+            session, self._session = self._session, None
+            try:
+                asyncio.run_coroutine_threadsafe(session.close(), loop).result(5)
+            except Exception as e:
+                logger.debug(f"Closing the HTTP session failed: {e}")
+        loop.call_soon_threadsafe(loop.stop)
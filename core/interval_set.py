@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+class IntervalSet:
+    """Set of disjoint half-open [start, end) datetime intervals, kept sorted and
+    merged (touching intervals are joined)."""
+
+    def __init__(self, intervals: Optional[List[Interval]] = None):
+        self._intervals: List[Interval] = []
+        for start, end in intervals or []:
+            self.add(start, end)
+
+    def __iter__(self) -> Iterator[Interval]:
+        return iter(self._intervals)
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def __bool__(self) -> bool:
+        return bool(self._intervals)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IntervalSet) and self._intervals == other._intervals
+
+    def __repr__(self) -> str:
+        return f"IntervalSet({self._intervals!r})"
+
+    @property
+    def start(self) -> Optional[datetime]:
+        return self._intervals[0][0] if self._intervals else None
+
+    @property
+    def end(self) -> Optional[datetime]:
+        return self._intervals[-1][1] if self._intervals else None
+
+    def add(self, start: datetime, end: datetime):
+        if start >= end:
+            return
+        merged = []
+        for current_start, current_end in self._intervals:
+            if current_end < start or end < current_start:
+                merged.append((current_start, current_end))
+            else:
+                start = min(start, current_start)
+                end = max(end, current_end)
+        merged.append((start, end))
+        self._intervals = sorted(merged)
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) lies entirely inside the set."""
+        return any(
+            current_start <= start and end <= current_end
+            for current_start, current_end in self._intervals
+        )
+
+    def missing(self, start: datetime, end: datetime) -> List[Interval]:
+        """Sub-intervals of [start, end) that are not in the set."""
+        gaps = []
+        cursor = start
+        for current_start, current_end in self._intervals:
+            if current_end <= cursor:
+                continue
+            if current_start >= end:
+                break
+            if current_start > cursor:
+                gaps.append((cursor, current_start))
+            cursor = max(cursor, current_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def holes(self) -> List[Interval]:
+        """Gaps between the first start and the last end of the set."""
+        if not self._intervals:
+            return []
+        return self.missing(self.start, self.end)  # type: ignore
+
+    def to_json(self) -> List[List[str]]:
+        return [[start.isoformat(), end.isoformat()] for start, end in self._intervals]
+
+    @classmethod
+    def from_json(cls, data: List[List[str]]) -> "IntervalSet":
+        return cls(
+            [
+                (datetime.fromisoformat(start), datetime.fromisoformat(end))
+                for start, end in data
+            ]
+        )
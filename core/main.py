@@ -8,7 +8,20 @@ from time_pattern import AdvancedPattern
 sys.path.append(str(Path(__file__).parent))
 
 from data_fetcher import SimpleInterval
-from core import reset_cache, initialize_cache, generate_visualization
+from core import (
+    reset_cache,
+    initialize_cache,
+    migrate_cache,
+    export_cache,
+    inspect_cache,
+    build_snapshot,
+    precompute_presets,
+    rebuild_from_archive,
+    refresh_recent_data,
+    dry_run,
+    quality_report,
+    generate_visualization,
+)
 
 logging.getLogger("matplotlib").setLevel(logging.WARNING)
 
@@ -22,9 +35,30 @@ def main():
     if args.reset_cache:
         reset_cache()
 
+    if args.migrate_cache:
+        migrate_cache(remove_legacy=args.remove_legacy_cache)
+
+    if args.rebuild_from_archive:
+        rebuild_from_archive()
+
+    if args.inspect_cache:
+        inspect_cache()
+
     if args.initialize_cache:
         initialize_cache()
 
+    if args.export_blob_cache:
+        export_cache(args.export_blob_cache)
+
+    if args.build_snapshot:
+        build_snapshot(args.build_snapshot_dir)
+
+    if args.refresh_recent:
+        refresh_recent_data(args.refresh_recent_days)
+
+    if args.precompute_presets:
+        precompute_presets()
+
     if args.start_date and args.end_date:
         data_request = SimpleInterval(args.start_date, args.end_date)
     elif args.pattern:
@@ -33,6 +67,14 @@ def main():
         print("No date parameters provided. Shutting down.")
         return
 
+    if args.dry_run:
+        dry_run(data_request)
+        return
+
+    if args.quality_report:
+        quality_report(data_request)
+        return
+
     config = dict(plot_mode=args.plot_mode if args.plot_mode else "aggregated")
 
     fig = generate_visualization(data_request, config=config)
@@ -105,6 +147,66 @@ def parse_arguments():
     parser.add_argument(
         "--initialize-cache", action="store_true", help="Initialize the data cache"
     )
+    parser.add_argument(
+        "--refresh-recent",
+        action="store_true",
+        help="Re-fetch the recent revision window and rewrite the days ENTSO-E revised",
+    )
+    parser.add_argument(
+        "--refresh-recent-days",
+        type=int,
+        help="Length of the --refresh-recent window in days (default: ENTSOE_REVISION_WINDOW_DAYS or 7)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report the chunks that would be downloaded for the request",
+    )
+    parser.add_argument(
+        "--quality-report",
+        action="store_true",
+        help="Only report cached hours, gaps and missing/interpolated/zero values per series for the request",
+    )
+    parser.add_argument(
+        "--migrate-cache",
+        action="store_true",
+        help="Convert legacy pickle cache files to the columnar cache format",
+    )
+    parser.add_argument(
+        "--remove-legacy-cache",
+        action="store_true",
+        help="Delete the legacy pickle files after --migrate-cache",
+    )
+    parser.add_argument(
+        "--inspect-cache",
+        action="store_true",
+        help="List every cached series with its size, rows, coverage, NaN ratio and load timings",
+    )
+    parser.add_argument(
+        "--export-blob-cache",
+        metavar="DIR",
+        help="Write the cache to DIR in the blob storage layout (ENTSOE_CACHE_BLOB_URL)",
+    )
+    parser.add_argument(
+        "--build-snapshot",
+        action="store_true",
+        help="Write the deployment snapshot of the prepared data and its hourly analysis",
+    )
+    parser.add_argument(
+        "--build-snapshot-dir",
+        metavar="DIR",
+        help="Where --build-snapshot writes (default: ENTSOE_SNAPSHOT_DIR or .data_snapshot)",
+    )
+    parser.add_argument(
+        "--precompute-presets",
+        action="store_true",
+        help="Serve and store the responses of the preset ranges (last 24 hours ... full history)",
+    )
+    parser.add_argument(
+        "--rebuild-from-archive",
+        action="store_true",
+        help="Re-parse the archived raw responses (ENTSOE_RESPONSE_ARCHIVE_DIR) into the cache, without API calls",
+    )
     return parser.parse_args()
 
 
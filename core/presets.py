@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from data_fetcher import SimpleInterval
+from utils import RECORDS_START
+
+# The simple ranges most requests ask for, ending at the newest available hour.
+# precompute_presets (core) serves them once per data generation and stores the
+# serialized responses, so a request for one of them is answered from the
+# response cache without fetching or analyzing anything.
+
+
+@dataclass(frozen=True)
+class Preset:
+    name: str
+    # None spans the whole history
+    window: Optional[timedelta]
+
+    def request(self, end: datetime) -> SimpleInterval:
+        """The interval of the preset when the newest available hour ends at end."""
+        if self.window is None:
+            return SimpleInterval(RECORDS_START, end)
+        return SimpleInterval(max(RECORDS_START, end - self.window), end)
+
+
+PRESETS: List[Preset] = [
+    Preset("last_24_hours", timedelta(days=1)),
+    Preset("last_7_days", timedelta(days=7)),
+    Preset("last_30_days", timedelta(days=30)),
+    Preset("last_year", timedelta(days=365)),
+    Preset("full_history", None),
+]
+
@@ -0,0 +1,192 @@
+import os
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import utils
+from interval_set import Interval
+
+# Per-series data-quality bitmaps, built when rows are stored:
+#
+#   <cache_dir>/quality/<cache_name>.npz
+#       first   -> grid offset (utils.hour_offset) of bit 0
+#       columns -> the indexed columns (PSR types, or Power for flows)
+#       known   -> packed bits: hours whose flags have been recorded
+#       <flag>  -> packed bits, one row per column, for each of FLAGS
+#
+# missing marks values that ENTSO-E did not publish and that could not be filled
+# (leading NaNs, columns that are NaN throughout), interpolated marks values that
+# utils.canonicalize filled, and zero marks published zeros. One bit per hour, so
+# a series' full history takes a few kilobytes per column and flag, and reports
+# over any interval or pattern are answered from the bitmaps alone.
+
+MISSING = "missing"
+INTERPOLATED = "interpolated"
+ZERO = "zero"
+FLAGS = (MISSING, INTERPOLATED, ZERO)
+
+
+@dataclass
+class QualityReport:
+    """Data-quality statistics of one series over the hours of a request."""
+
+    cache_name: str
+    # Hours of the request (after pattern filtering)
+    hours: int
+    # Hours that have been fetched, and those of them with recorded flags
+    covered_hours: int
+    indexed_hours: int
+    # Hours where every column is missing or was interpolated
+    empty_hours: int = 0
+    # Column -> flag -> number of flagged hours
+    counts: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    # Stretches of the request with no cached data
+    gaps: List[Interval] = field(default_factory=list)
+
+    def describe(self) -> str:
+        lines = [
+            f"{self.cache_name}: {self.covered_hours}/{self.hours} hour(s) cached, "
+            f"{self.indexed_hours} indexed, {self.empty_hours} without any data"
+        ]
+        for column, counts in sorted(self.counts.items()):
+            flagged = ", ".join(f"{counts[flag]} {flag}" for flag in FLAGS)
+            lines.append(f"    {column}: {flagged}")
+        lines += [f"    not cached: {start} -> {end}" for start, end in self.gaps]
+        return "\n".join(lines)
+
+
+class QualityIndex:
+    DIR = "quality"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _path(self, cache_name: str) -> str:
+        return os.path.join(self.cache_dir, self.DIR, f"{cache_name}.npz")
+
+    def read(self, cache_name: str) -> Optional[Dict[str, Any]]:
+        """The unpacked bitmaps of the series: first (grid offset), columns, known
+        (1-D) and one (columns x hours) boolean array per flag. None if the series
+        is not indexed."""
+        try:
+            with np.load(self._path(cache_name)) as stored:
+                first = int(stored["first"])
+                rows = int(stored["rows"])
+                bitmaps: Dict[str, Any] = {
+                    "first": first,
+                    "columns": [str(column) for column in stored["columns"]],
+                    "known": np.unpackbits(stored["known"], count=rows).astype(bool),
+                }
+                for flag in FLAGS:
+                    bitmaps[flag] = np.unpackbits(
+                        stored[flag], axis=1, count=rows
+                    ).astype(bool)
+                return bitmaps
+        except FileNotFoundError:
+            return None
+
+    def update(self, cache_name: str, raw: pd.DataFrame, canonical: pd.DataFrame):
+        """Record the flags of the rows of canonical, as produced from raw by
+        utils.canonicalize. The rows replace whatever was recorded for their hours.
+        Must be called while holding the series' writer lock."""
+        if canonical.empty:
+            return
+        columns = [column for column in canonical.columns if column != "start_time"]
+        offsets = (
+            (canonical["start_time"] - pd.Timestamp(utils.RECORDS_START)) // utils.HOUR
+        ).to_numpy(dtype="int64")
+        raw = (
+            raw.drop_duplicates(subset=["start_time"], keep="last")
+            .set_index("start_time")
+            .reindex(index=canonical["start_time"], columns=columns)
+        )
+        values = canonical.set_index("start_time")[columns]
+
+        stored = self.read(cache_name)
+        if stored is None:
+            stored = {
+                "first": int(offsets.min()),
+                "columns": [],
+                "known": np.zeros(0, dtype=bool),
+                **{flag: np.zeros((0, 0), dtype=bool) for flag in FLAGS},
+            }
+        all_columns = stored["columns"] + [
+            column for column in columns if column not in stored["columns"]
+        ]
+        first = min(stored["first"], int(offsets.min()))
+        end = max(stored["first"] + len(stored["known"]), int(offsets.max()) + 1)
+
+        # Lay the stored bitmaps on the new, possibly larger, extent
+        shift = stored["first"] - first
+        known = np.zeros(end - first, dtype=bool)
+        known[shift : shift + len(stored["known"])] = stored["known"]
+        bitmaps = {}
+        for flag in FLAGS:
+            bitmaps[flag] = np.zeros((len(all_columns), end - first), dtype=bool)
+            bitmaps[flag][
+                : len(stored["columns"]), shift : shift + len(stored["known"])
+            ] = stored[flag]
+        # Hours recorded before a column appeared did not have it
+        bitmaps[MISSING][len(stored["columns"]) :, known] = True
+
+        rows = offsets - first
+        known[rows] = True
+        for i, column in enumerate(all_columns):
+            if column not in columns:
+                # The new rows replace the whole stored row, without this column
+                bitmaps[MISSING][i, rows] = True
+                bitmaps[INTERPOLATED][i, rows] = False
+                bitmaps[ZERO][i, rows] = False
+                continue
+            published = raw[column].notna().to_numpy()
+            filled = values[column].notna().to_numpy()
+            bitmaps[MISSING][i, rows] = ~filled
+            bitmaps[INTERPOLATED][i, rows] = filled & ~published
+            bitmaps[ZERO][i, rows] = (raw[column] == 0).to_numpy()
+
+        path = self._path(cache_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    first=np.int64(first),
+                    rows=np.int64(end - first),
+                    columns=np.array(all_columns, dtype=str),
+                    known=np.packbits(known),
+                    **{flag: np.packbits(bitmaps[flag], axis=1) for flag in FLAGS},
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def window(
+    bitmaps: Dict[str, Any], start_date: datetime, end_date: datetime
+) -> Dict[str, Any]:
+    """The bitmaps of the hours [start_date, end_date), on that exact extent
+    (hours outside the stored bitmaps are not known)."""
+    first, last = utils.hour_offset(start_date), utils.hour_offset(end_date)
+    stored_first = bitmaps["first"]
+    stored_last = stored_first + len(bitmaps["known"])
+    lo, hi = max(first, stored_first), min(last, stored_last)
+
+    result: Dict[str, Any] = {"columns": bitmaps["columns"]}
+    result["known"] = np.zeros(last - first, dtype=bool)
+    for flag in FLAGS:
+        result[flag] = np.zeros((len(bitmaps["columns"]), last - first), dtype=bool)
+    if lo < hi:
+        result["known"][lo - first : hi - first] = bitmaps["known"][
+            lo - stored_first : hi - stored_first
+        ]
+        for flag in FLAGS:
+            result[flag][:, lo - first : hi - first] = bitmaps[flag][
+                :, lo - stored_first : hi - stored_first
+            ]
+    return result
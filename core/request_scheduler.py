@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Central pacing of the ENTSO-E requests of a fetcher. Every request goes through
+# run(), which
+#
+#   - takes a token from a bucket refilled at requests_per_minute (ENTSO-E allows
+#     400 requests per minute and user, and answers with HTTP 429 past it),
+#   - waits for one of max_in_flight slots, so a large initialize_cache does not
+#     burst dozens of requests at once,
+#   - retries the request alone on rate limiting, server errors and connection
+#     failures, after a jittered exponential backoff (or the server's
+#     Retry-After, if longer).
+#
+# Requests are retried one by one, so the other chunks of a fetch keep their
+# results while one of them waits to be retried.
+
+T = TypeVar("T")
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available and take it. Callers share one event
+        loop, so no lock is needed between the check and the take."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked to wait before retrying, if it said so."""
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        # An HTTP date; fall back to the backoff
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        requests_per_minute: float = 300,
+        max_in_flight: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        burst: Optional[float] = None,
+    ):
+        self.bucket = TokenBucket(
+            requests_per_minute / 60, burst if burst is not None else max_in_flight
+        )
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _slots(self) -> asyncio.Semaphore:
+        # A semaphore belongs to the loop it is first used on
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._loop = loop
+        return self._semaphore
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff before retry number attempt + 1."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    async def run(
+        self, request: Callable[[], Awaitable[T]], description: str = ""
+    ) -> T:
+        """Await request() within the rate and concurrency limits, retrying it
+        on transient failures. Raises the last error once retries run out."""
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            async with self._slots():
+                try:
+                    return await request()
+                except Exception as e:
+                    if not is_retryable(e) or attempt >= self.max_retries:
+                        raise
+                    error = e
+                    delay = self.backoff(attempt, _retry_after(e))
+            attempt += 1
+            logger.warning(
+                f"Request {description} failed ({error}), retry {attempt}/"
+                f"{self.max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import utils
+from file_lock import FileLock
+
+# Archive of the raw ENTSO-E responses, so the parsed cache can be rebuilt (after a
+# parser fix, say) without calling the API again:
+#
+#   <archive_dir>/objects/<hash[:2]>/<hash>.xml.gz
+#       -> the response body, gzip-compressed, named by its sha256
+#   <archive_dir>/index/<cache_name>.jsonl
+#       -> one line per archived response, in the order they were fetched:
+#          {"params": {...}, "sha256": "<hash>", "fetched_at": "<iso datetime>"}
+#
+# params are the request parameters of the chunk (periodStart/periodEnd included,
+# securityToken never). Identical responses share one object, and a response that
+# is the same as the last one archived for its request adds no index line, so
+# re-fetching unchanged data costs nothing. When ENTSO-E revises a period, the
+# later response supersedes the earlier one in latest() but both are kept.
+
+
+class ResponseArchive:
+    OBJECTS_DIR = "objects"
+    INDEX_DIR = "index"
+    LOCK_DIR = ".locks"
+    EXCLUDED_PARAMS = ("securityToken",)
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(
+            self.archive_dir, self.OBJECTS_DIR, digest[:2], f"{digest}.xml.gz"
+        )
+
+    def _index_path(self, cache_name: str) -> str:
+        return os.path.join(self.archive_dir, self.INDEX_DIR, f"{cache_name}.jsonl")
+
+    @staticmethod
+    def _request_key(params: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((key, str(value)) for key, value in params.items()))
+
+    def series(self) -> List[str]:
+        """Names of the series with archived responses."""
+        index_dir = os.path.join(self.archive_dir, self.INDEX_DIR)
+        if not os.path.isdir(index_dir):
+            return []
+        return sorted(
+            entry[: -len(".jsonl")]
+            for entry in os.listdir(index_dir)
+            if entry.endswith(".jsonl")
+        )
+
+    def entries(self, cache_name: str) -> List[Dict[str, Any]]:
+        """Every index line of the series, oldest first."""
+        try:
+            with open(self._index_path(cache_name)) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def latest(self, cache_name: str) -> List[Dict[str, Any]]:
+        """The last archived response of every distinct request of the series,
+        ordered by when it was fetched."""
+        latest: Dict[Tuple[Tuple[str, str], ...], Dict[str, Any]] = {}
+        for entry in self.entries(cache_name):
+            key = self._request_key(entry["params"])
+            latest.pop(key, None)
+            latest[key] = entry
+        return list(latest.values())
+
+    def put(self, params: Dict[str, Any], response: str) -> str:
+        """Archive the response to the request params. Returns its hash."""
+        params = {
+            key: value
+            for key, value in params.items()
+            if key not in self.EXCLUDED_PARAMS
+        }
+        cache_name = utils.get_cache_filename(params)
+        body = response.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # Written aside and renamed, so an object that exists is complete
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(object_path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(gzip.compress(body))
+                os.replace(tmp_path, object_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        lock = FileLock(
+            os.path.join(self.archive_dir, self.LOCK_DIR, f"{cache_name}.lock")
+        )
+        with lock:
+            key = self._request_key(params)
+            previous = [
+                entry
+                for entry in self.entries(cache_name)
+                if self._request_key(entry["params"]) == key
+            ]
+            if previous and previous[-1]["sha256"] == digest:
+                return digest
+            index_path = self._index_path(cache_name)
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            line = {
+                "params": params,
+                "sha256": digest,
+                "fetched_at": datetime.utcnow().isoformat(timespec="seconds"),
+            }
+            with open(index_path, "a") as f:
+                f.write(json.dumps(line, sort_keys=True) + "\n")
+        return digest
+
+    def get(self, digest: str) -> str:
+        """The archived response with the given hash."""
+        with open(self._object_path(digest), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import tempfile
+from typing import Hashable, List, Optional
+
+# Serialized API responses on disk, so repeating a request costs one file read:
+#
+#   <cache_dir>/<tag>.json -> the response body, as sent
+#
+# tag is the hash of the canonical request (analysis_memo.request_key) and of the
+# data generation the body was computed from, so it also serves as the response's
+# ETag: while the data is unchanged, a client holding the tag already has the
+# body. Bodies are written to a temporary file and renamed into place, so readers
+# never see a partial one. When the total size exceeds max_bytes, the least
+# recently read bodies are removed.
+
+# Under the writable cache directory unless set
+DEFAULT_DIR = os.getenv("ENTSOE_RESPONSE_CACHE_DIR")
+DEFAULT_MAX_BYTES = int(os.getenv("ENTSOE_RESPONSE_CACHE_MB", "256")) * 1024 * 1024
+
+
+def tag(key: Hashable, generation: Hashable) -> str:
+    # repr of the tuples of strings, numbers and datetimes making up keys and
+    # generations is stable across processes
+    return hashlib.sha256(repr((key, generation)).encode("utf-8")).hexdigest()[:32]
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, response_tag: str) -> str:
+        return os.path.join(self.cache_dir, f"{response_tag}.json")
+
+    def get(self, response_tag: str) -> Optional[str]:
+        path = self._path(response_tag)
+        try:
+            with open(path, encoding="utf-8") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # Marks it as recently used for prune()
+            os.utime(path)
+        except OSError:
+            pass
+        return body
+
+    def put(self, response_tag: str, body: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(tmp_path, self._path(response_tag))
+        self.prune()
+
+    def prune(self) -> List[str]:
+        """Remove the least recently used bodies until the rest fits in max_bytes.
+        Returns the removed tags."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, file_name))
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, file_name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed.append(file_name[: -len(".json")])
+        return removed
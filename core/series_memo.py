@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# In-memory LRU of whole cached series, so a long-lived process serves repeated
+# requests without reading and decoding the cache again. Entries are keyed by
+# (cache directory, series) and remember the backend's version token of the series
+# (CacheBackend.version); a lookup whose token differs from the stored one is a
+# miss, so rows written since (by this or any other process) are picked up. The
+# total size of the held frames is bounded by max_bytes, the least recently used
+# series are evicted first. A series is loaded by one thread at a time: others
+# asking for it meanwhile wait for that load instead of reading it again.
+
+
+class SeriesMemo:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # (cache_dir, cache_name) -> (version, df, bytes), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        # (key, version) -> (event set when done, [loaded df]) of the loads in flight
+        self._loading: Dict[Tuple, Tuple[threading.Event, List[pd.DataFrame]]] = {}
+        # Loads run in the worker threads of asyncio.to_thread
+        self._lock = threading.Lock()
+
+    def get(
+        self, key: Tuple[str, str], version: Hashable
+    ) -> Optional[pd.DataFrame]:
+        """The held series, None if it is not held or has changed since."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Tuple[str, str], version: Hashable, df: pd.DataFrame):
+        """Hold df, evicting the least recently used series to stay within
+        max_bytes. Series larger than max_bytes on their own are not held."""
+        nbytes = int(df.memory_usage(index=True, deep=False).sum())
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if nbytes > self.max_bytes:
+                return
+            while self.size + nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (version, df, nbytes)
+            self.size += nbytes
+
+    def load(
+        self,
+        key: Tuple[str, str],
+        version: Hashable,
+        loader: Callable[[], pd.DataFrame],
+    ) -> pd.DataFrame:
+        """The held series, or the one loader returns (which is then held). If
+        another thread is already loading the same version, wait for its result."""
+        df = self.get(key, version)
+        if df is not None:
+            return df
+        with self._lock:
+            in_flight = self._loading.get((key, version))
+            if in_flight is None:
+                in_flight = self._loading[(key, version)] = (threading.Event(), [])
+                owner = True
+            else:
+                owner = False
+        done, result = in_flight
+        if not owner:
+            done.wait()
+            if result:
+                return result[0]
+            # The load failed; try again in this thread
+            return self.load(key, version, loader)
+        try:
+            df = loader()
+            self.put(key, version, df)
+            result.append(df)
+            return df
+        finally:
+            with self._lock:
+                del self._loading[(key, version)]
+            done.set()
+
+    def discard(self, key: Tuple[str, str]):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: Tuple[str, str]):
+        _, _, nbytes = self._entries.pop(key)
+        self.size -= nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def slice_series(
+    df: pd.DataFrame,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """The rows start_date <= start_time < end_date of a held series (sorted by
+    start_time) for the given columns, as CacheBackend.load returns them. Always a
+    copy, so callers cannot alter the held frame."""
+    times = df["start_time"].to_numpy()
+    first, last = 0, len(df)
+    if start_date is not None:
+        first = int(np.searchsorted(times, np.datetime64(start_date)))
+    if end_date is not None:
+        last = int(np.searchsorted(times, np.datetime64(end_date)))
+    value_columns = [c for c in df.columns if c != "start_time"]
+    if columns is not None:
+        value_columns = [c for c in columns if c in value_columns]
+    return df.iloc[first:last][["start_time"] + value_columns].reset_index(drop=True)
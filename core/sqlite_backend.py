@@ -0,0 +1,254 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import utils
+from cache_backend import CacheBackend
+from interval_set import Interval, IntervalSet
+
+# The whole cache in one SQLite database, <cache_dir>/cache.sqlite3:
+#
+#   series  (name PRIMARY KEY, params, columns, coverage)  -- JSON encoded
+#   canonical_series (name PRIMARY KEY)  -- series whose rows are all canonical
+#   samples (series, start_time, column, value)
+#           PRIMARY KEY (series, start_time, column), WITHOUT ROWID
+#
+# start_time is the hour offset from utils.RECORDS_START. The primary key keeps
+# samples clustered by (series, start_time), so loading an interval is one index
+# range scan. Only non-NaN values are stored. Rows and coverage of an append are
+# written in one transaction, and the database runs in WAL mode so readers are
+# never blocked by a writer.
+
+
+class SQLiteBackend(CacheBackend):
+    FILE_NAME = "cache.sqlite3"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS series (
+            name TEXT PRIMARY KEY,
+            params TEXT NOT NULL,
+            columns TEXT NOT NULL,
+            coverage TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS samples (
+            series TEXT NOT NULL,
+            start_time INTEGER NOT NULL,
+            column TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (series, start_time, column)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS canonical_series (
+            name TEXT PRIMARY KEY
+        );
+    """
+
+    def __init__(self, cache_dir: str):
+        super().__init__(cache_dir)
+        self.path = os.path.join(cache_dir, self.FILE_NAME)
+        if os.path.isdir(cache_dir) and not os.access(cache_dir, os.W_OK):
+            # Read-only tier: use the database as bundled, if there is one
+            return
+        os.makedirs(cache_dir, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per operation, so the backend can be used from the worker
+        # threads of asyncio.to_thread
+        return sqlite3.connect(self.path, timeout=60)
+
+    def _series_row(self, connection: sqlite3.Connection, cache_name: str):
+        return connection.execute(
+            "SELECT params, columns, coverage FROM series WHERE name = ?",
+            (cache_name,),
+        ).fetchone()
+
+    def series(self) -> List[str]:
+        if not os.path.exists(self.path):
+            return []
+        with closing(self._connect()) as connection:
+            return [
+                name
+                for (name,) in connection.execute(
+                    "SELECT name FROM series ORDER BY name"
+                )
+            ]
+
+    def coverage(self, cache_name: str) -> IntervalSet:
+        if not os.path.exists(self.path):
+            return IntervalSet()
+        with closing(self._connect()) as connection:
+            row = self._series_row(connection, cache_name)
+        return IntervalSet.from_json(json.loads(row[2])) if row else IntervalSet()
+
+    def params(self, cache_name: str) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        with closing(self._connect()) as connection:
+            row = self._series_row(connection, cache_name)
+        return json.loads(row[0]) if row else {}
+
+    def canonical(self, cache_name: str) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with closing(self._connect()) as connection:
+            try:
+                row = connection.execute(
+                    "SELECT 1 FROM canonical_series WHERE name = ?", (cache_name,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # Read-only database created before the table existed
+                return False
+        return row is not None
+
+    def version(self, cache_name: str) -> Optional[Hashable]:
+        # Commits land in the write-ahead log first, and in the database file once
+        # it is checkpointed. This covers every series at once.
+        stats = []
+        for path in (self.path, f"{self.path}-wal"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stats.append(None)
+                continue
+            stats.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stats)
+
+    def load(
+        self,
+        cache_name: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=["start_time"] + (columns or []))
+        first = utils.hour_offset(start_date) if start_date is not None else None
+        last = utils.hour_offset(end_date) if end_date is not None else None
+        with closing(self._connect()) as connection:
+            row = self._series_row(connection, cache_name)
+            stored_columns = json.loads(row[1]) if row else []
+            if columns is None:
+                columns = stored_columns
+            else:
+                columns = [column for column in columns if column in stored_columns]
+
+            query = "SELECT start_time, column, value FROM samples WHERE series = ?"
+            args: List[Any] = [cache_name]
+            if first is not None:
+                query += " AND start_time >= ?"
+                args.append(first)
+            if last is not None:
+                query += " AND start_time < ?"
+                args.append(last)
+            samples = connection.execute(query, args).fetchall()
+
+        if not samples:
+            return pd.DataFrame(columns=["start_time"] + columns)
+
+        # Pivot onto the hourly grid spanned by the stored rows, like the columnar
+        # store does: hours without data come back as NaN rows
+        samples = np.array(
+            samples, dtype=[("hour", "int64"), ("column", "O"), ("value", "float64")]
+        )
+        first = int(samples["hour"].min())
+        last = int(samples["hour"].max()) + 1
+        codes, stored = pd.factorize(samples["column"])
+        # One row per stored column, plus an all-NaN one for the columns without
+        # samples in the range
+        grid = np.full((len(stored) + 1, last - first), np.nan)
+        grid[codes, samples["hour"] - first] = samples["value"]
+        rows = {column: i for i, column in enumerate(stored)}
+        data = {column: grid[rows.get(column, len(stored))] for column in columns}
+        times = pd.date_range(
+            utils.hour_at(first), periods=last - first, freq=utils.HOUR
+        )
+        return pd.DataFrame({"start_time": times, **data})
+
+    def append(
+        self,
+        cache_name: str,
+        params: Dict[str, Any],
+        df: pd.DataFrame,
+        covered: List[Interval],
+        canonical: bool = False,
+    ):
+        hours = (
+            ((df["start_time"] - pd.Timestamp(utils.RECORDS_START)) // utils.HOUR)
+            .to_numpy(dtype="int64")
+            .tolist()
+        )
+        if hours and min(hours) < 0:
+            raise ValueError(f"Cannot store rows before {utils.RECORDS_START}")
+        new_columns = [column for column in df.columns if column != "start_time"]
+        samples = [
+            (cache_name, hour, column, float(value))
+            for column in new_columns
+            for hour, value in zip(hours, df[column].to_numpy(dtype="float64"))
+            if not np.isnan(value)
+        ]
+
+        with closing(self._connect()) as connection, connection:
+            row = self._series_row(connection, cache_name)
+            columns = json.loads(row[1]) if row else []
+            columns += [column for column in new_columns if column not in columns]
+            coverage = (
+                IntervalSet.from_json(json.loads(row[2])) if row else IntervalSet()
+            )
+            for start_date, end_date in covered:
+                coverage.add(start_date, end_date)
+
+            # A new row replaces the whole stored row for that hour
+            connection.executemany(
+                "DELETE FROM samples WHERE series = ? AND start_time = ?",
+                [(cache_name, hour) for hour in hours],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO samples (series, start_time, column, value) "
+                "VALUES (?, ?, ?, ?)",
+                samples,
+            )
+            if canonical and (
+                row is None
+                or connection.execute(
+                    "SELECT 1 FROM canonical_series WHERE name = ?", (cache_name,)
+                ).fetchone()
+            ):
+                connection.execute(
+                    "INSERT OR IGNORE INTO canonical_series (name) VALUES (?)",
+                    (cache_name,),
+                )
+            else:
+                connection.execute(
+                    "DELETE FROM canonical_series WHERE name = ?", (cache_name,)
+                )
+            connection.execute(
+                "INSERT OR REPLACE INTO series (name, params, columns, coverage) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    cache_name,
+                    json.dumps(
+                        {
+                            key: value
+                            for key, value in params.items()
+                            if key != "securityToken"
+                        }
+                    ),
+                    json.dumps(columns),
+                    json.dumps(coverage.to_json()),
+                ),
+            )
+
+    def delete(self, cache_name: str):
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM samples WHERE series = ?", (cache_name,))
+            connection.execute("DELETE FROM series WHERE name = ?", (cache_name,))
+            connection.execute(
+                "DELETE FROM canonical_series WHERE name = ?", (cache_name,)
+            )
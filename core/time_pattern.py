@@ -1,8 +1,12 @@
+import calendar
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import re
 from typing import List
 
+import numpy as np
+import pandas as pd
+
 from utils import RECORDS_START, maximum_date_end_exclusive
 
 
@@ -150,6 +154,8 @@ def get_latest_time(pattern_rules: AdvancedPatternRule) -> datetime:  # TODO fix
         if pattern_rules.days
         else VALIDATION_PARAMETERS["days"].bounds[1]
     )
+    # Day 31 of a shorter month stands for its last day
+    day = min(day, calendar.monthrange(year, month)[1])
     hour = max(pattern_rules.hours) if pattern_rules.hours else max_date.hour
 
     max_encoded_end_date = datetime(year, month, day, hour) + timedelta(hours=1)
@@ -157,3 +163,17 @@ def get_latest_time(pattern_rules: AdvancedPatternRule) -> datetime:  # TODO fix
     return max(
         RECORDS_START, min(max_date, max_encoded_end_date)
     )  # Clamps date between minimum and maximum allowed dates
+
+
+def pattern_mask(index: pd.DatetimeIndex, rules: AdvancedPatternRule) -> np.ndarray:
+    """Which timestamps of index match the pattern rules."""
+    mask = np.ones(len(index), dtype=bool)
+    if rules.years:
+        mask &= index.year.isin(rules.years)
+    if rules.months:
+        mask &= index.month.isin(rules.months)
+    if rules.days:
+        mask &= index.day.isin(rules.days)
+    if rules.hours:
+        mask &= index.hour.isin(rules.hours)
+    return mask
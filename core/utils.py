@@ -1,5 +1,6 @@
+import hashlib
 from datetime import datetime, timedelta, timezone
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, Optional
 import pandas as pd
 from config import PSR_TYPE_MAPPING
 from dataclasses import fields
@@ -7,6 +8,7 @@ from dataclasses import fields
 from data_types import Data
 
 RECORDS_START = datetime.fromisoformat("2015-01-10 00:00:00")
+HOUR = timedelta(hours=1)
 
 
 def current_day_start():
@@ -23,6 +25,17 @@ def maximum_date_end_exclusive():
     return now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
 
 
+def hour_offset(date: datetime) -> int:
+    """Number of whole hours between RECORDS_START and date (the row of date on the
+    shared hourly grid)."""
+    return (pd.Timestamp(date) - pd.Timestamp(RECORDS_START)) // HOUR
+
+
+def hour_at(offset: int) -> datetime:
+    """Inverse of hour_offset."""
+    return RECORDS_START + offset * HOUR
+
+
 def validate_inputs(start_date, end_date):
     def _assert_whole_hour(date):
         assert date.minute == 0 and date.second == 0 and date.microsecond == 0
@@ -105,9 +118,68 @@ def resample_to_standard_granularity(
     return resampled
 
 
+def canonicalize(
+    df: pd.DataFrame,
+    before: Optional[pd.DataFrame] = None,
+    after: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Put a series frame in the canonical form the cache stores: sorted, one row
+    per hour of the hourly grid and gap-filled the way analyzer.prepare_data does
+    (linearly between known values, with the last known value at the end).
+
+    before and after are the stored rows just around df, if any: gaps next to them
+    are interpolated across and the hours between them and df are filled too, but
+    they are not part of the result themselves. Pass only rows that border the
+    hours df covers, or uncached hours in between get filled as well.
+    """
+    if df.empty:
+        return df
+    columns = [column for column in df.columns if column != "start_time"]
+    df = df.sort_values("start_time").drop_duplicates(
+        subset=["start_time"], keep="last"
+    )
+    start, end = df["start_time"].iloc[0], df["start_time"].iloc[-1]
+    frames = [df]
+    if before is not None and not before.empty:
+        start = before["start_time"].max() + HOUR
+        frames.insert(0, before)
+    if after is not None and not after.empty:
+        end = after["start_time"].min() - HOUR
+        frames.append(after)
+    # Context columns that df does not have are not carried into it
+    merged = pd.concat(
+        [frame.reindex(columns=["start_time"] + columns) for frame in frames],
+        ignore_index=True,
+    ).set_index("start_time")
+    grid = pd.date_range(merged.index.min(), merged.index.max(), freq=HOUR)
+    merged = merged.astype("float64").reindex(grid).interpolate("linear")
+    merged.index.name = "start_time"
+    return merged.loc[start:end].reset_index()
+
+
 def apply_to_fields(data: Data, func: Callable[[pd.DataFrame], pd.DataFrame]):
     for field in fields(data):
         attr_name = field.name
         attr_value = getattr(data, attr_name)
         # Apply the transformation if it's necessary
         setattr(data, attr_name, func(attr_value))
+
+
+def hash_frame(df: pd.DataFrame) -> str:
+    """Content hash of a series frame, independent of row/column order and of rows
+    or columns that hold no data at all."""
+    columns = sorted(
+        column
+        for column in df.columns
+        if column != "start_time" and df[column].notna().any()
+    )
+    df = df.dropna(how="all", subset=columns).sort_values("start_time")
+    digest = hashlib.sha256()
+    digest.update(df["start_time"].to_numpy(dtype="datetime64[ns]").tobytes())
+    for column in columns:
+        digest.update(column.encode())
+        # NaN has many bit patterns; normalize them so equal frames hash equally
+        digest.update(
+            df[column].fillna(float("-inf")).to_numpy(dtype="float64").tobytes()
+        )
+    return digest.hexdigest()
@@ -0,0 +1,161 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import core
+from analysis_memo import AnalysisMemo, request_key
+from data_fetcher import SimpleInterval
+from time_pattern import AdvancedPattern
+
+NOW = datetime(2024, 6, 1)
+
+
+def analysis(hours=24):
+    index = pd.date_range("2024-01-01", periods=hours, freq="h")
+    aggregated = pd.DataFrame({"B04": [1.0] * hours}, index=index)
+    return aggregated, {"PT": aggregated.copy(), "ES": aggregated.copy()}
+
+
+def nbytes(result):
+    aggregated, contributions = result
+    return int(
+        sum(
+            df.memory_usage(index=True, deep=False).sum()
+            for df in [aggregated, *contributions.values()]
+        )
+    )
+
+
+class TestRequestKey(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("time_pattern.maximum_date_end_exclusive", return_value=NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_equivalent_patterns_share_a_key(self):
+        self.assertEqual(
+            request_key(AdvancedPattern("2023", "1-3", "", "10-12")),
+            request_key(AdvancedPattern(" 2023 ", "3, 2,1", "", "10,11-12")),
+        )
+        self.assertNotEqual(
+            request_key(AdvancedPattern("2023", "1-3", "", "")),
+            request_key(AdvancedPattern("2023", "1-4", "", "")),
+        )
+
+    def test_interval_and_pattern_keys_differ(self):
+        with patch("utils.maximum_date_end_exclusive", return_value=NOW):
+            interval = request_key(
+                SimpleInterval(datetime(2024, 1, 1), datetime(2024, 2, 1))
+            )
+        self.assertEqual(
+            interval, ("interval", datetime(2024, 1, 1), datetime(2024, 2, 1))
+        )
+        self.assertNotEqual(
+            interval, request_key(AdvancedPattern("2024", "1", "", ""))
+        )
+
+
+class TestAnalysisMemo(unittest.TestCase):
+    def test_hits_return_copies_and_are_counted(self):
+        memo = AnalysisMemo(1 << 20)
+        memo.put("key", 1, analysis())
+
+        first = memo.get("key", 1)
+        first[0].iloc[0, 0] = -1.0
+        second = memo.get("key", 1)
+
+        self.assertEqual(second[0].iloc[0, 0], 1.0)
+        self.assertIsNone(memo.get("key", 2))
+        self.assertEqual((memo.hits, memo.misses), (2, 1))
+
+    def test_evicts_least_recently_used_beyond_max_bytes(self):
+        memo = AnalysisMemo(2 * nbytes(analysis()))
+        memo.put("a", 1, analysis())
+        memo.put("b", 1, analysis())
+        memo.get("a", 1)
+
+        memo.put("c", 1, analysis())
+
+        self.assertIsNone(memo.get("b", 1))
+        self.assertIsNotNone(memo.get("a", 1))
+        self.assertEqual(memo.size, 2 * nbytes(analysis()))
+
+    def test_unknown_generation_is_never_held(self):
+        memo = AnalysisMemo(1 << 20)
+
+        memo.put("key", None, analysis())
+
+        self.assertEqual(len(memo), 0)
+        self.assertIsNone(memo.get("key", None))
+
+
+class RefreshingFetcher:
+    """Serves the cached data, while a background refresh lands meanwhile."""
+
+    def __init__(self):
+        self.generation = 1
+        self.cached = True
+
+    def data_generation(self):
+        return self.generation
+
+    def is_cached(self, data_request, start_date=None):
+        return self.cached
+
+    def get_data(self, data_request):
+        self.generation += 1
+        frame = analysis()[0].reset_index(names="start_time")
+        return SimpleNamespace(
+            generation_pt=frame,
+            generation_es=frame,
+            flow_pt_to_es=frame,
+            flow_es_to_pt=frame,
+        )
+
+
+class TestGenerateVisualization(unittest.TestCase):
+    def setUp(self):
+        self.fetcher = RefreshingFetcher()
+        self.memo = AnalysisMemo(1 << 20)
+        for patcher in (
+            patch.object(core, "_get_fetcher", return_value=self.fetcher),
+            patch.object(core, "_get_snapshot", return_value=None),
+            patch.object(core, "_analysis_memo", self.memo),
+            patch.object(core.analyzer, "analyze", return_value=analysis()),
+            patch.object(core, "_mark_stale"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_result_is_memoized_under_the_generation_it_was_read_from(self):
+        data_request = SimpleInterval(datetime(2024, 1, 1), datetime(2024, 1, 2))
+        tag = core.response_tag(data_request)
+
+        core.generate_visualization(data_request, config={})
+
+        key = request_key(data_request)
+        self.assertIsNotNone(self.memo.get(key, (None, 1)))
+        self.assertIsNone(self.memo.get(key, (None, 2)))
+        # The refreshed data gets a new tag, so clients do not keep the stale body
+        self.assertNotEqual(core.response_tag(data_request), tag)
+
+    def test_results_missing_hours_expire_with_the_newest_hour(self):
+        self.fetcher.cached = False
+        data_request = SimpleInterval(datetime(2024, 1, 1), datetime(2024, 1, 2))
+        with patch.object(core, "maximum_date_end_exclusive", return_value=NOW):
+            core.generate_visualization(data_request, config={})
+
+        key = request_key(data_request)
+        self.assertIsNone(self.memo.get(key, (None, 1)))
+        self.assertIsNotNone(self.memo.get(key, ((None, 1), NOW)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import re
+import sys
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from blob_backend import BlobBackend, export_blob_cache
+from cache_backend import ReadOnlyCacheError, open_backend
+from data_fetcher import ENTSOEDataFetcher
+from interval_set import IntervalSet
+
+PARAMS = {"documentType": "A75", "in_Domain": "PT"}
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler that honours single "bytes=a-b" Range headers, the way
+    blob storage does, and records what it served."""
+
+    served = []
+    # Set to answer every request with this error status instead
+    failing = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.failing is not None:
+            self.served.append((self.path, self.failing))
+            self.send_error(self.failing)
+            return
+        path = self.translate_path(self.path)
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if not os.path.isfile(path) or match is None:
+            self.served.append((self.path, None))
+            return super().do_GET()
+        start, end = int(match.group(1)), int(match.group(2)) + 1
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        self.served.append((self.path, len(data)))
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header(
+            "Content-Range", f"bytes {start}-{end - 1}/{os.path.getsize(path)}"
+        )
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestBlobBackend(unittest.TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.blob_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        self.addCleanup(shutil.rmtree, self.blob_dir)
+
+        self.df = pd.DataFrame(
+            {
+                "start_time": pd.date_range("2023-12-31", periods=72, freq="h"),
+                "B16": np.arange(72, dtype="float64"),
+                "B19": np.arange(72, dtype="float64") * 2,
+            }
+        )
+        source = open_backend("columnar", self.source_dir)
+        source.append(
+            "generation_pt",
+            PARAMS,
+            self.df,
+            [(datetime(2023, 12, 31), datetime(2024, 1, 3))],
+        )
+        export_blob_cache(source, self.blob_dir)
+
+        RangeRequestHandler.served = []
+        RangeRequestHandler.failing = None
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            partial(RangeRequestHandler, directory=self.blob_dir),
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.blob = BlobBackend(f"http://127.0.0.1:{self.server.server_port}")
+
+    def test_index(self):
+        self.assertEqual(self.blob.series(), ["generation_pt"])
+        self.assertEqual(self.blob.params("generation_pt"), PARAMS)
+        self.assertTrue(
+            self.blob.coverage("generation_pt").covers(
+                datetime(2023, 12, 31), datetime(2024, 1, 3)
+            )
+        )
+
+    def test_index_errors_keep_the_last_index(self):
+        coverage = self.blob.coverage("generation_pt")
+        RangeRequestHandler.served = []
+        RangeRequestHandler.failing = 500
+        self.blob._index_time = 0.0
+
+        with self.assertLogs("blob_backend", "WARNING"):
+            self.assertEqual(self.blob.coverage("generation_pt"), coverage)
+        self.assertEqual(self.blob.series(), ["generation_pt"])
+        # Not retried before INDEX_TTL
+        self.assertEqual(RangeRequestHandler.served, [("/index.json", 500)])
+
+    def test_unreachable_index_reads_as_empty(self):
+        RangeRequestHandler.failing = 503
+
+        with self.assertLogs("blob_backend", "WARNING"):
+            self.assertEqual(self.blob.coverage("generation_pt"), IntervalSet())
+        self.assertEqual(self.blob.version("generation_pt"), ())
+
+    def test_index_timeouts_read_as_empty(self):
+        blob = BlobBackend(f"http://127.0.0.1:{self.server.server_port}")
+        with patch.object(
+            blob, "_get", side_effect=socket.timeout("timed out")
+        ), self.assertLogs("blob_backend", "WARNING"):
+            self.assertEqual(blob.series(), [])
+
+    def test_full_load_matches_source(self):
+        pd.testing.assert_frame_equal(self.blob.load("generation_pt"), self.df)
+
+    def test_load_reads_only_the_needed_byte_ranges(self):
+        result = self.blob.load(
+            "generation_pt",
+            datetime(2023, 12, 31, 22),
+            datetime(2024, 1, 1, 2),
+            columns=["B19"],
+        )
+
+        self.assertEqual(result["B19"].tolist(), [44.0, 46.0, 48.0, 50.0])
+        shard_reads = [size for path, size in RangeRequestHandler.served if size]
+        # Two hours of one column from each of the two year shards
+        self.assertEqual(sorted(shard_reads), [16, 16])
+
+    def test_prefetch_downloads_whole_shards_once(self):
+        self.blob.prefetch("generation_pt")
+        RangeRequestHandler.served = []
+        RangeRequestHandler.failing = None
+
+        result = self.blob.load("generation_pt", datetime(2024, 1, 1))
+
+        self.assertEqual(RangeRequestHandler.served, [])
+        self.assertEqual(result["B16"].tolist(), list(range(24, 72)))
+
+    def test_held_shards_are_bounded_by_bytes(self):
+        # Room for the 2024 shard (48 rows of 2 columns) only
+        blob = BlobBackend(self.blob.base_url, max_object_bytes=48 * 2 * 8)
+
+        blob.prefetch("generation_pt")
+
+        self.assertEqual(blob.object_bytes, 48 * 2 * 8)
+        self.assertEqual([name.split("/")[1][:4] for name in blob._objects], ["2024"])
+
+    def test_fetcher_preload_prefetches_the_newest_year(self):
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir)
+        with patch.dict(os.environ, {"ENTSOE_API_KEY": "test"}), patch.multiple(
+            ENTSOEDataFetcher,
+            CACHE_DIR=local_dir,
+            OVERLAY_DIR=None,
+            BLOB_URL=self.blob.base_url,
+        ):
+            fetcher = ENTSOEDataFetcher()
+        blob = fetcher.base_tiers[0]
+
+        self.assertEqual(fetcher.preload(), ["generation_pt"])
+        RangeRequestHandler.served = []
+        RangeRequestHandler.failing = None
+        blob.load("generation_pt", datetime(2024, 1, 1))
+        self.assertEqual(RangeRequestHandler.served, [])
+        blob.load("generation_pt", datetime(2023, 12, 31), datetime(2024, 1, 1))
+        self.assertTrue(RangeRequestHandler.served)
+
+    def test_fetcher_reads_blob_below_local_cache(self):
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir)
+        with patch.dict(os.environ, {"ENTSOE_API_KEY": "test"}), patch.multiple(
+            ENTSOEDataFetcher,
+            CACHE_DIR=local_dir,
+            OVERLAY_DIR=None,
+            BLOB_URL=self.blob.base_url,
+        ):
+            fetcher = ENTSOEDataFetcher()
+            params = fetcher._generation_params("10YPT-REN------W")
+            with patch.object(fetcher, "_fetch_data_in_chunks") as mock_fetch:
+                df = asyncio.run(
+                    fetcher._fetch_and_cache_data(
+                        params, datetime(2024, 1, 1), datetime(2024, 1, 2)
+                    )
+                )
+
+        mock_fetch.assert_not_called()
+        self.assertEqual(df["B16"].tolist(), list(range(24, 48)))
+
+    def test_is_read_only(self):
+        with self.assertRaises(ReadOnlyCacheError):
+            self.blob.delete("generation_pt")
+        with self.assertRaises(ReadOnlyCacheError):
+            self.blob.append("generation_pt", PARAMS, self.df, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
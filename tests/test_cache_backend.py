@@ -0,0 +1,185 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import core
+from cache_backend import open_backend
+from data_fetcher import ENTSOEDataFetcher
+from interval_set import IntervalSet
+from quality_index import INTERPOLATED, QualityIndex
+
+PARAMS = {"documentType": "A75", "in_Domain": "PT"}
+
+
+def _make_generation_df(start="2024-01-01", hours=48):
+    return pd.DataFrame(
+        {
+            "start_time": pd.date_range(start, periods=hours, freq="h"),
+            "B16": np.arange(hours, dtype="float64"),
+            "B19": np.arange(hours, dtype="float64") * 2,
+        }
+    )
+
+
+class CacheBackendContract:
+    """Behaviour every cache backend must share."""
+
+    BACKEND = ""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = open_backend(self.BACKEND, self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def append(self, df):
+        start = df["start_time"].min().to_pydatetime()
+        end = (df["start_time"].max() + pd.Timedelta(hours=1)).to_pydatetime()
+        self.cache.append("generation_pt", PARAMS, df, [(start, end)])
+
+    def test_round_trip(self):
+        df = _make_generation_df()
+        self.append(df)
+
+        self.assertEqual(self.cache.series(), ["generation_pt"])
+        self.assertEqual(
+            self.cache.coverage("generation_pt"),
+            IntervalSet([(datetime(2024, 1, 1), datetime(2024, 1, 3))]),
+        )
+        pd.testing.assert_frame_equal(self.cache.load("generation_pt"), df)
+
+    def test_load_range_and_columns(self):
+        self.append(_make_generation_df())
+
+        result = self.cache.load(
+            "generation_pt",
+            datetime(2024, 1, 1, 10),
+            datetime(2024, 1, 1, 13),
+            columns=["B19", "B99"],
+        )
+
+        self.assertEqual(list(result.columns), ["start_time", "B19"])
+        self.assertEqual(result["B19"].tolist(), [20.0, 22.0, 24.0])
+
+    def test_append_replaces_rows_and_merges_coverage(self):
+        self.append(_make_generation_df())
+        update = pd.DataFrame(
+            {
+                "start_time": pd.date_range("2024-01-02 23:00", periods=2, freq="h"),
+                "B16": [100.0, 101.0],
+            }
+        )
+        self.append(update)
+
+        result = self.cache.load("generation_pt", datetime(2024, 1, 2, 22))
+
+        self.assertEqual(result["B16"].tolist(), [46.0, 100.0, 101.0])
+        # The replaced row had no B19 value any more
+        self.assertTrue(np.isnan(result["B19"].iloc[1]))
+        self.assertEqual(
+            list(self.cache.coverage("generation_pt")),
+            [(datetime(2024, 1, 1), datetime(2024, 1, 3, 1))],
+        )
+
+    def test_missing_hours_are_nan_rows(self):
+        df = _make_generation_df().drop(index=[5, 6]).reset_index(drop=True)
+        self.append(df)
+
+        result = self.cache.load("generation_pt")
+
+        self.assertEqual(len(result), 48)
+        self.assertTrue(result["B16"].iloc[5:7].isna().all())
+
+    def test_delete(self):
+        self.append(_make_generation_df())
+
+        self.cache.delete("generation_pt")
+
+        self.assertEqual(self.cache.series(), [])
+        self.assertFalse(self.cache.coverage("generation_pt"))
+        self.assertTrue(self.cache.load("generation_pt").empty)
+
+    def test_migrate_legacy_cache(self):
+        df = _make_generation_df()
+        legacy_file = os.path.join(self.cache_dir, "generation_pt.pkl.gz")
+        df.to_pickle(legacy_file, compression="gzip")
+
+        with patch.object(ENTSOEDataFetcher, "CACHE_DIR", self.cache_dir), patch.object(
+            ENTSOEDataFetcher, "CACHE_BACKEND", self.BACKEND
+        ):
+            core.migrate_cache(remove_legacy=True)
+
+        self.assertFalse(os.path.exists(legacy_file))
+        cache = open_backend(self.BACKEND, self.cache_dir)
+        pd.testing.assert_frame_equal(cache.load("generation_pt"), df)
+        self.assertTrue(
+            cache.coverage("generation_pt").covers(
+                datetime(2024, 1, 1), datetime(2024, 1, 3)
+            )
+        )
+
+    def test_migrated_series_is_canonical_and_quality_indexed(self):
+        df = _make_generation_df()
+        df = df.drop(index=[5, 6])
+        df.to_pickle(
+            os.path.join(self.cache_dir, "generation_pt.pkl.gz"), compression="gzip"
+        )
+
+        with patch.object(ENTSOEDataFetcher, "CACHE_DIR", self.cache_dir), patch.object(
+            ENTSOEDataFetcher, "CACHE_BACKEND", self.BACKEND
+        ):
+            core.migrate_cache()
+
+        cache = open_backend(self.BACKEND, self.cache_dir)
+        self.assertTrue(cache.canonical("generation_pt"))
+        self.assertEqual(
+            cache.load("generation_pt")["B16"].tolist(), list(np.arange(48.0))
+        )
+        bitmaps = QualityIndex(self.cache_dir).read("generation_pt")
+        interpolated = bitmaps[INTERPOLATED][bitmaps["columns"].index("B16")]
+        self.assertEqual(np.flatnonzero(interpolated).tolist(), [5, 6])
+
+
+class TestColumnarBackend(CacheBackendContract, unittest.TestCase):
+    BACKEND = "columnar"
+
+
+class TestSQLiteBackend(CacheBackendContract, unittest.TestCase):
+    BACKEND = "sqlite"
+
+    def test_samples_are_indexed_by_series_and_time(self):
+        self.append(_make_generation_df())
+        with self.cache._connect() as connection:
+            plan = connection.execute(
+                "EXPLAIN QUERY PLAN SELECT value FROM samples "
+                "WHERE series = ? AND start_time >= ? AND start_time < ?",
+                ("generation_pt", 10, 20),
+            ).fetchall()
+        self.assertIn(
+            "PRIMARY KEY (series=? AND start_time>? AND start_time<?)", str(plan)
+        )
+
+    def test_column_without_samples_in_range_loads_as_nan(self):
+        df = _make_generation_df()
+        df.loc[df.index >= 24, "B19"] = np.nan
+        self.append(df)
+
+        loaded = self.cache.load("generation_pt", datetime(2024, 1, 2))
+
+        self.assertEqual(list(loaded.columns), ["start_time", "B16", "B19"])
+        self.assertEqual(loaded["B16"].tolist(), list(range(24, 48)))
+        self.assertTrue(loaded["B19"].isna().all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import cache_inspect
+from cache_backend import open_backend
+
+PARAMS = {"documentType": "A11", "in_Domain": "PT", "out_Domain": "ES"}
+
+
+def _make_flow_df(start="2024-01-01", hours=48):
+    power = np.arange(hours, dtype="float64")
+    power[:12] = np.nan
+    return pd.DataFrame(
+        {"start_time": pd.date_range(start, periods=hours, freq="h"), "Power": power}
+    )
+
+
+class TestCacheInspect(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_legacy_pickle_with_metadata(self):
+        _make_flow_df().to_pickle(
+            os.path.join(self.cache_dir, "flow_es_to_pt.pkl.gz"), compression="gzip"
+        )
+        with open(
+            os.path.join(self.cache_dir, "flow_es_to_pt_metadata.json"), "w"
+        ) as f:
+            json.dump(
+                {
+                    **PARAMS,
+                    "start_date_inclusive": "2024-01-01T00:00:00+00:00",
+                    "end_date_exclusive": "2024-01-03T00:00:00+00:00",
+                },
+                f,
+            )
+
+        (inspection,) = cache_inspect.inspect_legacy(self.cache_dir)
+
+        self.assertEqual(inspection.source, "pickle")
+        self.assertEqual(inspection.rows, 48)
+        self.assertAlmostEqual(inspection.nan_ratio, 0.25)
+        self.assertGreater(inspection.disk_bytes, 0)
+        self.assertIsNotNone(inspection.decompress_seconds)
+        self.assertEqual(
+            inspection.stale_by(datetime(2024, 1, 4)), timedelta(days=1)
+        )
+
+    def test_columnar_series_are_inspected_once(self):
+        cache = open_backend("columnar", self.cache_dir)
+        cache.append(
+            "flow_es_to_pt",
+            PARAMS,
+            _make_flow_df(),
+            [(datetime(2024, 1, 1), datetime(2024, 1, 3))],
+        )
+        # A legacy pickle the backend would only fall back to
+        _make_flow_df().to_pickle(
+            os.path.join(self.cache_dir, "flow_pt_to_es.pkl.gz"), compression="gzip"
+        )
+
+        inspections = cache_inspect.inspect_backend(cache, "columnar")
+
+        self.assertEqual([i.cache_name for i in inspections], ["flow_es_to_pt"])
+        self.assertEqual(inspections[0].rows, 48)
+        self.assertGreater(inspections[0].disk_bytes, 48 * 8)
+        self.assertIn("flow_es_to_pt [columnar]", inspections[0].describe(datetime(2024, 1, 3)))
+
+    def test_sqlite_size_is_shared(self):
+        cache = open_backend("sqlite", self.cache_dir)
+        cache.append(
+            "flow_es_to_pt",
+            PARAMS,
+            _make_flow_df(),
+            [(datetime(2024, 1, 1), datetime(2024, 1, 3))],
+        )
+
+        (inspection,) = cache_inspect.inspect_backend(cache, "sqlite")
+
+        self.assertIsNone(inspection.disk_bytes)
+        self.assertIsNone(inspection.decompress_seconds)
+        self.assertEqual(inspection.rows, 36)
+
+
+if __name__ == "__main__":
+    unittest.main()
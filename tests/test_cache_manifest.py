@@ -0,0 +1,185 @@
+import json
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from cache_manifest import CacheManifest
+
+PARAMS = {"documentType": "A11", "in_Domain": "PT", "out_Domain": "ES"}
+
+
+class TestCacheManifest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_imports_legacy_metadata(self):
+        with open(
+            os.path.join(self.cache_dir, "flow_es_to_pt_metadata.json"), "w"
+        ) as f:
+            json.dump(
+                {
+                    "start_date_inclusive": "2015-01-10T00:00:00",
+                    "end_date_exclusive": "2025-06-29T10:00:00",
+                    **PARAMS,
+                },
+                f,
+            )
+
+        manifest = CacheManifest(self.cache_dir)
+
+        self.assertEqual(manifest.series(), ["flow_es_to_pt"])
+        self.assertEqual(manifest.params("flow_es_to_pt"), PARAMS)
+        self.assertEqual(
+            list(manifest.coverage("flow_es_to_pt")),
+            [(datetime(2015, 1, 10), datetime(2025, 6, 29, 10))],
+        )
+
+    def test_save_and_reload_keeps_holes(self):
+        manifest = CacheManifest(self.cache_dir)
+        manifest.record(
+            "flow_es_to_pt", PARAMS, datetime(2024, 1, 1), datetime(2024, 1, 2)
+        )
+        manifest.record(
+            "flow_es_to_pt", PARAMS, datetime(2024, 1, 3), datetime(2024, 1, 4)
+        )
+        manifest.save()
+
+        reloaded = CacheManifest(self.cache_dir)
+
+        self.assertEqual(
+            reloaded.holes("flow_es_to_pt"),
+            [(datetime(2024, 1, 2), datetime(2024, 1, 3))],
+        )
+
+    def test_refresh_picks_up_other_writers(self):
+        reader = CacheManifest(self.cache_dir)
+        writer = CacheManifest(self.cache_dir)
+        writer.record(
+            "flow_es_to_pt", PARAMS, datetime(2024, 1, 1), datetime(2024, 1, 2)
+        )
+        writer.save()
+
+        self.assertFalse(reader.coverage("flow_es_to_pt"))
+        reader.refresh()
+        self.assertTrue(
+            reader.coverage("flow_es_to_pt").covers(
+                datetime(2024, 1, 1), datetime(2024, 1, 2)
+            )
+        )
+
+
+class TestManifestGenerations(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _generation_files(self):
+        return sorted(os.listdir(os.path.join(self.cache_dir, "manifests")))
+
+    def _publish(self, manifest, day):
+        manifest.record(
+            "flow_es_to_pt", PARAMS, datetime(2024, 1, day), datetime(2024, 1, day + 1)
+        )
+        manifest.save()
+
+    def test_save_switches_pointer_and_collects_old_generation(self):
+        manifest = CacheManifest(self.cache_dir)
+        self._publish(manifest, 1)
+        self._publish(manifest, 2)
+
+        self.assertEqual(manifest.generation, 2)
+        with open(os.path.join(self.cache_dir, "CURRENT")) as f:
+            self.assertEqual(f.read(), "2")
+        self.assertEqual(self._generation_files(), ["gen-000002.json"])
+
+    def test_leased_generation_is_kept_until_released(self):
+        writer = CacheManifest(self.cache_dir)
+        self._publish(writer, 1)
+        reader = CacheManifest(self.cache_dir)
+
+        with reader.lease() as snapshot:
+            self._publish(writer, 2)
+            self.assertEqual(snapshot.generation, 1)
+            self.assertEqual(
+                self._generation_files(), ["gen-000001.json", "gen-000002.json"]
+            )
+
+        self._publish(writer, 3)
+        self.assertEqual(self._generation_files(), ["gen-000003.json"])
+
+    def test_lease_on_collected_generation_moves_to_current(self):
+        writer = CacheManifest(self.cache_dir)
+        self._publish(writer, 1)
+        reader = CacheManifest(self.cache_dir)
+        self._publish(writer, 2)
+
+        with reader.lease() as snapshot:
+            self.assertEqual(snapshot.generation, 2)
+            self.assertTrue(
+                reader.coverage("flow_es_to_pt").covers(
+                    datetime(2024, 1, 2), datetime(2024, 1, 3)
+                )
+            )
+
+    def test_threads_sharing_a_manifest_keep_every_update(self):
+        manifest = CacheManifest(self.cache_dir)
+        errors = []
+        done = threading.Event()
+
+        def write(series):
+            try:
+                for day in range(1, 29):
+                    with manifest.transaction():
+                        manifest.record(
+                            series,
+                            PARAMS,
+                            datetime(2024, 1, day),
+                            datetime(2024, 1, day + 1),
+                        )
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                while not done.is_set():
+                    manifest.refresh()
+                    with manifest.lease():
+                        manifest.coverage("series_0")
+            except Exception as e:
+                errors.append(e)
+
+        writers = [
+            threading.Thread(target=write, args=(f"series_{i}",)) for i in range(7)
+        ]
+        reader = threading.Thread(target=read)
+        with self.assertNoLogs("cache_manifest", level="ERROR"):
+            reader.start()
+            for thread in writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            done.set()
+            reader.join()
+
+        self.assertEqual(errors, [])
+        reloaded = CacheManifest(self.cache_dir)
+        for i in range(7):
+            self.assertEqual(
+                list(reloaded.coverage(f"series_{i}")),
+                [(datetime(2024, 1, 1), datetime(2024, 1, 29))],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
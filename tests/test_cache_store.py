@@ -0,0 +1,160 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from cache_store import ColumnarCacheStore
+
+
+def _make_generation_df(hours=48):
+    return pd.DataFrame(
+        {
+            "start_time": pd.date_range("2024-01-01", periods=hours, freq="h"),
+            "B16": np.arange(hours, dtype="float64"),
+            "B19": np.arange(hours, dtype="float64") * 2,
+        }
+    )
+
+
+class TestColumnarCacheStore(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.store = ColumnarCacheStore(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_round_trip(self):
+        df = _make_generation_df()
+        self.store.save("generation_pt", df)
+
+        self.assertTrue(self.store.exists("generation_pt"))
+        self.assertEqual(self.store.columns("generation_pt"), ["B16", "B19"])
+        pd.testing.assert_frame_equal(self.store.load("generation_pt"), df)
+
+    def test_load_row_range(self):
+        self.store.save("generation_pt", _make_generation_df())
+
+        result = self.store.load(
+            "generation_pt", datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 13)
+        )
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result["start_time"].iloc[0], pd.Timestamp("2024-01-01 10:00"))
+        self.assertEqual(result["B16"].tolist(), [10.0, 11.0, 12.0])
+
+    def test_missing_hours_are_nan_rows(self):
+        df = _make_generation_df().drop(index=[5, 6]).reset_index(drop=True)
+        self.store.save("generation_pt", df)
+
+        result = self.store.load("generation_pt")
+
+        self.assertEqual(len(result), 48)
+        self.assertTrue(result["B16"].iloc[5:7].isna().all())
+        self.assertEqual(result["B16"].iloc[7], 7.0)
+
+    def test_rows_before_records_start_are_rejected(self):
+        df = pd.DataFrame({"start_time": [pd.Timestamp("2014-12-31")], "Power": [1.0]})
+        with self.assertRaises(ValueError):
+            self.store.save("flow_pt_to_es", df)
+
+    def test_write_touches_only_affected_shards(self):
+        df = pd.DataFrame(
+            {
+                "start_time": pd.date_range("2023-12-31 22:00", periods=4, freq="h"),
+                "Power": [1.0, 2.0, 3.0, 4.0],
+            }
+        )
+        self.store.save("flow_pt_to_es", df)
+        self.assertEqual(self.store.shards("flow_pt_to_es"), [2023, 2024])
+        shard_2023 = os.path.join(self.cache_dir, "flow_pt_to_es", "2023", "Power.npy")
+        mtime_2023 = os.stat(shard_2023).st_mtime_ns
+
+        self.store.write(
+            "flow_pt_to_es",
+            pd.DataFrame(
+                {
+                    "start_time": pd.date_range(
+                        "2024-01-01 01:00", periods=2, freq="h"
+                    ),
+                    "Power": [20.0, 30.0],
+                }
+            ),
+        )
+
+        self.assertEqual(os.stat(shard_2023).st_mtime_ns, mtime_2023)
+        self.assertEqual(
+            self.store.load("flow_pt_to_es")["Power"].tolist(),
+            [1.0, 2.0, 3.0, 20.0, 30.0],
+        )
+
+    def test_load_reads_only_overlapping_shards(self):
+        df = pd.DataFrame(
+            {
+                "start_time": pd.date_range("2023-12-31 22:00", periods=4, freq="h"),
+                "Power": [1.0, 2.0, 3.0, 4.0],
+            }
+        )
+        self.store.save("flow_pt_to_es", df)
+        # Loading 2023 must not need the 2024 shard at all
+        os.remove(os.path.join(self.cache_dir, "flow_pt_to_es", "2024", "Power.npy"))
+
+        result = self.store.load(
+            "flow_pt_to_es", datetime(2023, 12, 31), datetime(2024, 1, 1)
+        )
+
+        self.assertEqual(result["Power"].tolist(), [1.0, 2.0])
+
+    def test_load_column_projection(self):
+        self.store.save("generation_pt", _make_generation_df())
+
+        result = self.store.load("generation_pt", columns=["B19", "B99"])
+
+        self.assertEqual(list(result.columns), ["start_time", "B19"])
+
+    def test_write_against_shard_map_is_invisible_until_published(self):
+        df = _make_generation_df()
+        published = self.store.save("generation_pt", df)
+        update = df.iloc[[0]].assign(B16=100.0)
+
+        new_map = self.store.write("generation_pt", update, published)
+
+        self.assertNotEqual(new_map[2024], published[2024])
+        self.assertEqual(
+            self.store.load("generation_pt", shard_map=published)["B16"].iloc[0], 0.0
+        )
+        self.assertEqual(
+            self.store.load("generation_pt", shard_map=new_map)["B16"].iloc[0], 100.0
+        )
+
+        self.store.prune("generation_pt", new_map.values())
+
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.cache_dir, "generation_pt"))),
+            [new_map[2024]],
+        )
+
+    def test_edz_codec_round_trip(self):
+        store = ColumnarCacheStore(self.cache_dir, codec="edz")
+        df = _make_generation_df()
+        store.save("generation_pt", df)
+
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.cache_dir, "generation_pt", "2024", "B16.edz")
+            )
+        )
+        pd.testing.assert_frame_equal(store.load("generation_pt"), df)
+        # Shards keep their codec, so a store with another codec can still read them
+        pd.testing.assert_frame_equal(self.store.load("generation_pt"), df)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from dataclasses import fields
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import analyzer
+import deployment_snapshot
+import time_pattern
+from data_types import Data
+from deployment_snapshot import DeploymentSnapshot
+from time_pattern import AdvancedPattern
+
+START = datetime(2024, 1, 1)
+HOURS = 72
+
+
+def make_data(extra_hours: int = 0) -> Data:
+    """Seven canonical series with varying values, as the fetcher returns them."""
+    rng = np.random.default_rng(0)
+    frames = {}
+    for field in fields(Data):
+        length = HOURS + (extra_hours if field.name == "flow_es_to_pt" else 0)
+        times = pd.date_range(START, periods=length, freq="h")
+        if field.name.startswith("generation"):
+            df = pd.DataFrame(
+                {
+                    "start_time": times,
+                    "B04": rng.uniform(100, 200, length),
+                    "B16": np.where(times.hour < 12, 0.0, rng.uniform(0, 50, length)),
+                }
+            )
+        else:
+            df = pd.DataFrame(
+                {"start_time": times, "Power": rng.uniform(0, 50, length)}
+            )
+        df.attrs["canonical"] = True
+        frames[field.name] = df
+    return Data(**frames)
+
+
+class TestDeploymentSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_dir)
+
+    def build(self, data: Data) -> DeploymentSnapshot:
+        deployment_snapshot.build_snapshot(
+            deployment_snapshot.align(data), self.snapshot_dir
+        )
+        return DeploymentSnapshot.open(self.snapshot_dir)  # type: ignore
+
+    def test_align_cuts_series_to_common_hours(self):
+        data = deployment_snapshot.align(make_data(extra_hours=5))
+
+        self.assertEqual(len(data.flow_es_to_pt), HOURS)
+        self.assertTrue(data.flow_es_to_pt.attrs["canonical"])
+
+    def test_interval_is_a_slice_of_the_precomputed_analysis(self):
+        snapshot = self.build(make_data())
+        start, end = datetime(2024, 1, 1, 10), datetime(2024, 1, 2, 6)
+
+        aggregated, contributions = deployment_snapshot.combine(
+            [snapshot.analysis(start, end)]
+        )
+
+        sliced = make_data()
+        for field in fields(sliced):
+            df = getattr(sliced, field.name)
+            df = df[(df["start_time"] >= start) & (df["start_time"] < end)]
+            df.attrs["canonical"] = True
+            setattr(sliced, field.name, df)
+        expected, expected_contributions = analyzer.analyze(sliced)
+        pd.testing.assert_frame_equal(aggregated, expected, check_freq=False)
+        pd.testing.assert_frame_equal(
+            contributions["ES"], expected_contributions["ES"], check_freq=False
+        )
+
+    def test_pattern_only_returns_matching_hours(self):
+        snapshot = self.build(make_data())
+        rules = time_pattern.get_rules_from_pattern(
+            AdvancedPattern("2024", "1", "", "3,15")
+        )
+
+        aggregated, _ = snapshot.analysis(START, snapshot.end, rules)
+
+        self.assertEqual(len(aggregated), 6)
+        self.assertEqual(sorted(set(aggregated.index.hour)), [3, 15])
+
+    def test_combine_fills_sources_missing_from_a_part(self):
+        index = pd.date_range(START, periods=2, freq="h")
+        first = pd.DataFrame({"B04": [1.0, 2.0]}, index=index)
+        second = pd.DataFrame(
+            {"B04": [3.0], "B16": [4.0]}, index=index[-1:] + pd.Timedelta(hours=1)
+        )
+
+        aggregated, _ = deployment_snapshot.combine(
+            [(first, {"PT": first}), (second, {"PT": second})]
+        )
+
+        self.assertEqual(aggregated["B16"].tolist(), [0.0, 0.0, 4.0])
+
+    def test_missing_snapshot(self):
+        self.assertIsNone(DeploymentSnapshot.open(self.snapshot_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
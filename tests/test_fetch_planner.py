@@ -0,0 +1,44 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from fetch_planner import plan_fetch, split_into_chunks
+from interval_set import IntervalSet
+
+
+def test_split_into_chunks_respects_max_chunk():
+    chunks = split_into_chunks(datetime(2020, 1, 1), datetime(2021, 1, 1))
+    assert chunks == [
+        (datetime(2020, 1, 1), datetime(2020, 12, 26)),
+        (datetime(2020, 12, 26), datetime(2021, 1, 1)),
+    ]
+
+
+def test_plan_fully_cached_has_no_chunks():
+    coverage = IntervalSet([(datetime(2020, 1, 1), datetime(2021, 1, 1))])
+    plan = plan_fetch(
+        "flow_es_to_pt", coverage, datetime(2020, 3, 1), datetime(2020, 4, 1)
+    )
+    assert plan.chunks == []
+    assert plan.requests == 0
+    assert plan.estimated_seconds == 0
+    assert "fully cached" in plan.describe()
+
+
+def test_plan_splits_each_gap():
+    coverage = IntervalSet([(datetime(2020, 1, 1), datetime(2020, 1, 2))])
+    plan = plan_fetch(
+        "flow_es_to_pt",
+        coverage,
+        datetime(2019, 12, 31),
+        datetime(2020, 1, 3),
+        max_chunk=timedelta(hours=12),
+    )
+    assert plan.gaps == [
+        (datetime(2019, 12, 31), datetime(2020, 1, 1)),
+        (datetime(2020, 1, 2), datetime(2020, 1, 3)),
+    ]
+    assert plan.requests == 4
+    assert plan.hours == 48
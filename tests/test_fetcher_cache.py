@@ -0,0 +1,614 @@
+import asyncio
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import analyzer
+from data_fetcher import ENTSOEDataFetcher, SimpleInterval
+from data_types import Data
+
+FLOW_PARAMS = {
+    "documentType": "A11",
+    "in_Domain": "10YPT-REN------W",
+    "out_Domain": "10YES-REE------0",
+}
+
+
+def make_flow_xml(start: datetime, end: datetime, value=None) -> str:
+    """Build an A11 document with one hourly point per hour in [start, end)."""
+    hours = int((end - start) / timedelta(hours=1))
+    points = "".join(
+        f"<Point><position>{i + 1}</position>"
+        f"<quantity>{value if value is not None else i}</quantity></Point>"
+        for i in range(hours)
+    )
+    return (
+        '<Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:0">'
+        "<type>A11</type><TimeSeries><Period>"
+        f"<start>{start.strftime('%Y-%m-%dT%H:%MZ')}</start>"
+        "<resolution>PT60M</resolution>"
+        f"{points}</Period></TimeSeries></Publication_MarketDocument>"
+    )
+
+
+def fake_chunks(params, start_date, end_date):
+    return [make_flow_xml(start_date, end_date)]
+
+
+class FetcherCacheTestCase(unittest.TestCase):
+    """Runs an ENTSOEDataFetcher against a temporary cache directory with the
+    network replaced by fake_chunks."""
+
+    BACKEND = "columnar"
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        patchers = [
+            patch.dict(os.environ, {"ENTSOE_API_KEY": "test"}),
+            patch.object(ENTSOEDataFetcher, "CACHE_DIR", self.cache_dir),
+            patch.object(ENTSOEDataFetcher, "OVERLAY_DIR", None),
+            patch.object(ENTSOEDataFetcher, "CACHE_BACKEND", self.BACKEND),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        os.environ.pop("VERCEL_ENV", None)
+        self.fetcher = ENTSOEDataFetcher()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def fetch(self, start_date, end_date, now, chunks=fake_chunks, params=None):
+        with patch("utils.maximum_date_end_exclusive", return_value=now), patch.object(
+            self.fetcher, "_fetch_data_in_chunks", side_effect=self._async(chunks)
+        ) as mock_fetch:
+            df = asyncio.run(
+                self.fetcher._fetch_and_cache_data(
+                    dict(params or FLOW_PARAMS), start_date, end_date
+                )
+            )
+        return df, mock_fetch
+
+    @staticmethod
+    def _async(function):
+        async def wrapper(*args):
+            return function(*args)
+
+        return wrapper
+
+
+class TestShardedCache(FetcherCacheTestCase):
+    def test_partial_hit_rewrites_only_tail_shard(self):
+        now = datetime(2024, 1, 3)
+        self.fetch(datetime(2023, 12, 31), datetime(2024, 1, 1), now)
+        shard_2023 = os.path.join(self.cache_dir, "flow_es_to_pt", "2023")
+        mtime_2023 = os.stat(os.path.join(shard_2023, "columns.json")).st_mtime_ns
+
+        df, mock_fetch = self.fetch(datetime(2023, 12, 31), datetime(2024, 1, 3), now)
+
+        _, fetch_start, fetch_end = mock_fetch.call_args.args
+        self.assertEqual(fetch_start, datetime(2024, 1, 1))
+        self.assertEqual(fetch_end, datetime(2024, 1, 3))
+        self.assertEqual(
+            os.stat(os.path.join(shard_2023, "columns.json")).st_mtime_ns, mtime_2023
+        )
+        self.assertEqual(len(df), 72)
+        self.assertEqual(df["start_time"].iloc[0], datetime(2023, 12, 31))
+
+    def test_full_hit_does_not_fetch(self):
+        now = datetime(2024, 1, 2)
+        self.fetch(datetime(2023, 12, 31), datetime(2024, 1, 2), now)
+
+        df, mock_fetch = self.fetch(
+            datetime(2023, 12, 31, 5), datetime(2023, 12, 31, 8), now
+        )
+
+        mock_fetch.assert_not_called()
+        self.assertEqual(df["Power"].tolist(), [5.0, 6.0, 7.0])
+
+    def test_writes_are_reported_to_on_write(self):
+        written = []
+        self.fetcher.on_write = written.append
+        now = datetime(2024, 1, 2)
+        self.fetch(datetime(2023, 12, 31), datetime(2024, 1, 2), now)
+        self.fetch(datetime(2023, 12, 31, 5), datetime(2023, 12, 31, 8), now)
+
+        self.assertEqual(written, ["flow_es_to_pt"])
+
+
+class TestGapAwareFetching(FetcherCacheTestCase):
+    def test_fetches_only_missing_intervals_on_both_sides_and_inside(self):
+        now = datetime(2024, 2, 1)
+        self.fetch(datetime(2024, 1, 10), datetime(2024, 1, 11), now)
+        self.fetch(datetime(2024, 1, 12), datetime(2024, 1, 13), now)
+
+        df, mock_fetch = self.fetch(datetime(2024, 1, 9), datetime(2024, 1, 14), now)
+
+        fetched = sorted(call.args[1:] for call in mock_fetch.call_args_list)
+        self.assertEqual(
+            fetched,
+            [
+                (datetime(2024, 1, 9), datetime(2024, 1, 10)),
+                (datetime(2024, 1, 11), datetime(2024, 1, 12)),
+                (datetime(2024, 1, 13), datetime(2024, 1, 14)),
+            ],
+        )
+        self.assertEqual(len(df), 5 * 24)
+        self.assertFalse(self.fetcher.cache.coverage("flow_es_to_pt").holes())
+
+    def test_does_not_fetch_past_requested_end(self):
+        _, mock_fetch = self.fetch(
+            datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 6, 1)
+        )
+
+        _, _, fetch_end = mock_fetch.call_args.args
+        self.assertEqual(fetch_end, datetime(2024, 1, 2))
+
+    def test_unpublished_tail_is_not_marked_covered(self):
+        def partial_chunks(params, start_date, end_date):
+            return [make_flow_xml(start_date, end_date - timedelta(hours=3))]
+
+        self.fetch(
+            datetime(2024, 1, 1),
+            datetime(2024, 1, 2),
+            datetime(2024, 1, 2),
+            partial_chunks,
+        )
+
+        self.assertEqual(
+            self.fetcher.cache.coverage("flow_es_to_pt").end,
+            datetime(2024, 1, 1, 21),
+        )
+        with patch.object(
+            self.fetcher, "_series_params", return_value={"flow": FLOW_PARAMS}
+        ):
+            self.assertTrue(
+                self.fetcher.is_cached(
+                    SimpleInterval(datetime(2024, 1, 1), datetime(2024, 1, 1, 21))
+                )
+            )
+            self.assertFalse(
+                self.fetcher.is_cached(
+                    SimpleInterval(datetime(2024, 1, 1), datetime(2024, 1, 2))
+                )
+            )
+
+    def test_chunks_fetched_before_a_failure_are_kept(self):
+        def failing_chunks(params, start_date, end_date):
+            # The second of the two chunks of the year
+            if start_date >= datetime(2023, 12, 27):
+                raise ConnectionError("retries exhausted")
+            return [make_flow_xml(start_date, end_date)]
+
+        with self.assertRaises(ConnectionError):
+            self.fetch(
+                datetime(2023, 1, 1),
+                datetime(2024, 1, 10),
+                datetime(2024, 2, 1),
+                failing_chunks,
+            )
+
+        coverage = self.fetcher.cache.coverage("flow_es_to_pt")
+        self.assertEqual(coverage.start, datetime(2023, 1, 1))
+        self.assertEqual(coverage.end, datetime(2023, 12, 27))
+
+    def test_offline_fetcher_reads_the_cache_without_an_api_key(self):
+        now = datetime(2024, 1, 2)
+        self.fetch(datetime(2024, 1, 1), now, now)
+
+        with patch.dict(os.environ):
+            del os.environ["ENTSOE_API_KEY"]
+            with self.assertRaises(ValueError):
+                ENTSOEDataFetcher()
+            self.fetcher = ENTSOEDataFetcher(offline=True)
+
+        df, _ = self.fetch(datetime(2024, 1, 1), now, now)
+        self.assertEqual(len(df), 24)
+        with self.assertRaisesRegex(ValueError, "ENTSOE_API_KEY"):
+            asyncio.run(self.fetcher._make_request_async(None, dict(FLOW_PARAMS)))
+
+    def test_plan_is_a_dry_run(self):
+        self.fetch(datetime(2024, 1, 10), datetime(2024, 1, 11), datetime(2024, 2, 1))
+
+        with patch(
+            "utils.maximum_date_end_exclusive", return_value=datetime(2024, 2, 1)
+        ):
+            plans = self.fetcher.plan(
+                SimpleInterval(datetime(2024, 1, 9), datetime(2024, 1, 12))
+            )
+
+        self.assertEqual(len(plans), 7)
+        self.assertEqual(
+            plans["flow_es_to_pt"].gaps,
+            [
+                (datetime(2024, 1, 9), datetime(2024, 1, 10)),
+                (datetime(2024, 1, 11), datetime(2024, 1, 12)),
+            ],
+        )
+        self.assertEqual(plans["generation_pt"].requests, 1)
+        self.assertGreater(plans["generation_pt"].estimated_seconds, 0)
+
+
+class TestGapAwareFetchingSQLite(TestGapAwareFetching):
+    BACKEND = "sqlite"
+
+
+class TestWriterCoordination(FetcherCacheTestCase):
+    def test_waiting_writer_reuses_the_winners_rows(self):
+        now = datetime(2024, 1, 2)
+        winner = ENTSOEDataFetcher()
+        lock = winner.cache.lock("flow_es_to_pt")
+        lock.acquire()
+        result = {}
+        waiter = threading.Thread(
+            target=lambda: result.update(
+                zip(("df", "mock_fetch"), self.fetch(datetime(2024, 1, 1), now, now))
+            )
+        )
+        waiter.start()
+        time.sleep(0.2)
+
+        # The winner writes the series while the waiter is blocked on the lock
+        rows = winner._parse_xml_internal(make_flow_xml(datetime(2024, 1, 1), now))
+        asyncio.run(
+            winner._save_to_cache(
+                dict(FLOW_PARAMS), rows, [(datetime(2024, 1, 1), now)]
+            )
+        )
+        lock.release()
+        waiter.join()
+
+        result["mock_fetch"].assert_not_called()
+        self.assertEqual(len(result["df"]), 24)
+
+    def test_manifest_publishes_new_shard_versions(self):
+        now = datetime(2024, 1, 3)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now)
+        first_map = self.fetcher.cache.manifest.shard_map("flow_es_to_pt")
+
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 3), now)
+
+        shard_map = self.fetcher.cache.manifest.shard_map("flow_es_to_pt")
+        self.assertNotEqual(shard_map[2024], first_map[2024])
+        # The superseded version is gone once the new one is published
+        self.assertEqual(
+            os.listdir(os.path.join(self.cache_dir, "flow_es_to_pt")),
+            [shard_map[2024]],
+        )
+
+    def test_refresh_keeps_shards_of_generation_being_read(self):
+        now = datetime(2024, 1, 4)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now)
+        reader = ENTSOEDataFetcher()
+        series_dir = os.path.join(self.cache_dir, "flow_es_to_pt")
+
+        with reader.cache.manifest.lease():
+            old_shards = os.listdir(series_dir)
+            self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 3), now)
+            # The reader's generation still names the old shards, so they stay
+            self.assertTrue(set(old_shards) < set(os.listdir(series_dir)))
+            df = reader.cache.store.load(
+                "flow_es_to_pt",
+                shard_map=reader.cache.manifest.shard_map("flow_es_to_pt"),
+            )
+            self.assertEqual(len(df), 24)
+
+        # The next write collects the released generation and its shards
+        self.fetch(datetime(2024, 1, 3), datetime(2024, 1, 4), now)
+        self.assertEqual(
+            os.listdir(series_dir),
+            list(self.fetcher.cache.manifest.shard_map("flow_es_to_pt").values()),
+        )
+
+    def test_writes_only_prune_their_own_series(self):
+        now = datetime(2024, 1, 4)
+        other_params = {
+            **FLOW_PARAMS,
+            "in_Domain": FLOW_PARAMS["out_Domain"],
+            "out_Domain": FLOW_PARAMS["in_Domain"],
+        }
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now)
+        reader = ENTSOEDataFetcher()
+        series_dir = os.path.join(self.cache_dir, "flow_es_to_pt")
+
+        with reader.cache.manifest.lease():
+            self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 3), now)
+        superseded = set(os.listdir(series_dir)) - set(
+            self.fetcher.cache.manifest.shard_map("flow_es_to_pt").values()
+        )
+        self.assertTrue(superseded)
+
+        # Writing another series leaves these to the next write of their own
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now, params=other_params)
+        self.assertTrue(superseded <= set(os.listdir(series_dir)))
+
+        self.fetch(datetime(2024, 1, 3), datetime(2024, 1, 4), now)
+        self.assertFalse(superseded & set(os.listdir(series_dir)))
+
+
+class TestLayeredCache(FetcherCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.overlay_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.overlay_dir)
+        # The bundled cache holds the first day
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 3))
+        self.base_files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(self.cache_dir)
+            for name in names
+            if ".locks" not in root
+        )
+
+    def overlay_fetcher(self):
+        with patch.dict(os.environ, {"VERCEL_ENV": "production"}), patch.object(
+            ENTSOEDataFetcher, "VERCEL_OVERLAY_DIR", self.overlay_dir
+        ):
+            self.fetcher = ENTSOEDataFetcher()
+        return self.fetcher
+
+    def test_tail_is_written_to_overlay_and_merged_with_base(self):
+        now = datetime(2024, 1, 3)
+        fetcher = self.overlay_fetcher()
+        self.assertEqual(fetcher.cache.cache_dir, self.overlay_dir)
+
+        df, mock_fetch = self.fetch(datetime(2024, 1, 1), now, now)
+
+        _, fetch_start, fetch_end = mock_fetch.call_args.args
+        self.assertEqual((fetch_start, fetch_end), (datetime(2024, 1, 2), now))
+        self.assertEqual(len(df), 48)
+        self.assertEqual(df["Power"].iloc[0], 0.0)
+        self.assertEqual(df["Power"].iloc[24], 0.0)  # first hour of the overlay
+        base_files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(self.cache_dir)
+            for name in names
+            if ".locks" not in root
+        )
+        self.assertEqual(base_files, self.base_files)
+
+    def test_warm_instance_reuses_overlay(self):
+        now = datetime(2024, 1, 3)
+        self.overlay_fetcher()
+        self.fetch(datetime(2024, 1, 1), now, now)
+
+        self.overlay_fetcher()
+        df, mock_fetch = self.fetch(datetime(2024, 1, 1, 20), now, now)
+
+        mock_fetch.assert_not_called()
+        self.assertEqual(df["Power"].tolist()[:4], [20.0, 21.0, 22.0, 23.0])
+        self.assertEqual(len(df), 28)
+
+
+class TestConcurrentReaders(FetcherCacheTestCase):
+    def test_reads_while_sibling_threads_publish(self):
+        # Read from disk every time, not from the in-memory copies
+        self.fetcher.memory.max_bytes = 0
+        series = {
+            "flow_es_to_pt": FLOW_PARAMS,
+            "flow_pt_to_es": {
+                **FLOW_PARAMS,
+                "in_Domain": FLOW_PARAMS["out_Domain"],
+                "out_Domain": FLOW_PARAMS["in_Domain"],
+            },
+        }
+        errors = []
+
+        def write(cache_name, params):
+            try:
+                for day in range(1, 21):
+                    start = datetime(2024, 1, day)
+                    end = start + timedelta(days=1)
+                    rows = self.fetcher._parse_xml_internal(make_flow_xml(start, end))
+                    with self.fetcher.cache.lock(cache_name):
+                        self.fetcher._write_series(
+                            cache_name, params, rows, [(start, end)]
+                        )
+            except Exception as e:
+                errors.append(e)
+
+        writers = [
+            threading.Thread(target=write, args=item) for item in series.items()
+        ]
+        for thread in writers:
+            thread.start()
+        while any(thread.is_alive() for thread in writers):
+            for cache_name in series:
+                try:
+                    self.fetcher._read_tiers(cache_name, None, None, None)
+                except Exception as e:
+                    errors.append(e)
+        for thread in writers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for cache_name in series:
+            df = self.fetcher._read_tiers(cache_name, None, None, None)
+            self.assertEqual(len(df), 20 * 24)
+
+    def test_series_without_coverage_reads_empty(self):
+        df = self.fetcher._read_tiers("flow_es_to_pt", None, None, None)
+
+        self.assertTrue(df.empty)
+        self.assertIn("start_time", df.columns)
+
+
+class TestCanonicalIngest(FetcherCacheTestCase):
+    def test_gaps_are_filled_when_stored(self):
+        def chunks_with_gap(params, start_date, end_date):
+            # No data published for 02:00-04:00
+            return [
+                make_flow_xml(start_date, datetime(2024, 1, 1, 2), value=10),
+                make_flow_xml(datetime(2024, 1, 1, 5), end_date, value=50),
+            ]
+
+        df, _ = self.fetch(
+            datetime(2024, 1, 1),
+            datetime(2024, 1, 1, 8),
+            datetime(2024, 1, 2),
+            chunks_with_gap,
+        )
+
+        self.assertTrue(df.attrs["canonical"])
+        self.assertEqual(
+            df["Power"].tolist(), [10.0, 10.0, 20.0, 30.0, 40.0, 50.0, 50.0, 50.0]
+        )
+        self.assertTrue(self.fetcher.cache.canonical("flow_es_to_pt"))
+
+    def test_hours_between_fetches_stay_empty(self):
+        def constant_chunks(params, start_date, end_date):
+            value = 0 if start_date.day == 1 else 50
+            return [make_flow_xml(start_date, end_date, value=value)]
+
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now, constant_chunks)
+        self.fetch(datetime(2024, 1, 3), datetime(2024, 1, 4), now, constant_chunks)
+
+        df = self.fetcher.cache.load("flow_es_to_pt")
+        df = df.dropna(subset=["Power"])
+        self.assertEqual(len(df), 48)
+        gap = (df["start_time"] >= datetime(2024, 1, 2)) & (
+            df["start_time"] < datetime(2024, 1, 3)
+        )
+        self.assertFalse(gap.any())
+        report = self.fetcher.quality_report(
+            SimpleInterval(datetime(2024, 1, 1), datetime(2024, 1, 4))
+        )["flow_es_to_pt"]
+        self.assertEqual(report.counts["Power"]["interpolated"], 0)
+
+    def test_gaps_next_to_cached_rows_are_filled_across_the_seam(self):
+        def chunks(params, start_date, end_date):
+            if start_date.day == 1:
+                return [make_flow_xml(start_date, end_date, value=0)]
+            # Nothing published for the first hours after the cached rows
+            return [make_flow_xml(datetime(2024, 1, 2, 4), end_date, value=40)]
+
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now, chunks)
+        self.fetch(datetime(2024, 1, 2), datetime(2024, 1, 3), now, chunks)
+
+        df = self.fetcher.cache.load(
+            "flow_es_to_pt", datetime(2024, 1, 2), datetime(2024, 1, 2, 5)
+        )
+        self.assertEqual(df["Power"].tolist(), [8.0, 16.0, 24.0, 32.0, 40.0])
+
+    def test_prepare_data_uses_canonical_frames_as_they_are(self):
+        now = datetime(2024, 1, 2)
+        df, _ = self.fetch(datetime(2024, 1, 1), now, now)
+        data = Data(*[df.copy() for _ in range(7)])
+
+        with patch.object(pd.DataFrame, "interpolate") as mock_interpolate:
+            data = analyzer.prepare_data(data)
+
+        mock_interpolate.assert_not_called()
+        self.assertEqual(data.flow_es_to_pt.index.name, "start_time")
+        self.assertEqual(len(data.flow_es_to_pt), 24)
+
+
+class TestRefreshRecent(FetcherCacheTestCase):
+    def refresh(self, now, chunks):
+        with patch("utils.maximum_date_end_exclusive", return_value=now), patch.object(
+            self.fetcher, "_fetch_data_in_chunks", side_effect=self._async(chunks)
+        ), patch.object(
+            self.fetcher, "_series_params", return_value={"flow_es_to_pt": FLOW_PARAMS}
+        ):
+            return self.fetcher.refresh_recent(timedelta(days=2))
+
+    def test_rewrites_only_revised_days(self):
+        now = datetime(2024, 1, 10)
+
+        def published_chunks(params, start_date, end_date):
+            return [make_flow_xml(start_date, end_date, value=5)]
+
+        def revised_chunks(params, start_date, end_date):
+            # ENTSO-E revised every value of January 9th
+            return [
+                make_flow_xml(start_date, datetime(2024, 1, 9), value=5),
+                make_flow_xml(datetime(2024, 1, 9), end_date, value=7),
+            ]
+
+        self.fetch(datetime(2024, 1, 1), now, now, published_chunks)
+        shard = os.path.join(self.cache_dir, "flow_es_to_pt", "2024", "Power.npy")
+        unchanged_mtime = os.stat(shard).st_mtime_ns
+
+        self.assertEqual(self.refresh(now, published_chunks), {"flow_es_to_pt": 0})
+        self.assertEqual(os.stat(shard).st_mtime_ns, unchanged_mtime)
+
+        self.assertEqual(self.refresh(now, revised_chunks), {"flow_es_to_pt": 1})
+        df, _ = self.fetch(datetime(2024, 1, 8, 23), datetime(2024, 1, 9, 1), now)
+        self.assertEqual(df["Power"].tolist(), [5.0, 7.0])
+
+    def test_values_rounded_by_the_codec_are_no_revision(self):
+        with patch.object(ENTSOEDataFetcher, "CACHE_CODEC", "edz"):
+            self.fetcher = ENTSOEDataFetcher()
+        now = datetime(2024, 1, 10)
+
+        def published_chunks(params, start_date, end_date):
+            return [make_flow_xml(start_date, end_date, value=5.123456)]
+
+        self.fetch(datetime(2024, 1, 1), now, now, published_chunks)
+
+        self.assertEqual(self.refresh(now, published_chunks), {"flow_es_to_pt": 0})
+
+
+class TestStaleWhileRevalidate(FetcherCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fetcher.stale_while_revalidate = True
+
+    def test_tail_miss_is_served_from_cache_and_refreshed_in_background(self):
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now)
+
+        with patch.object(self.fetcher, "_revalidate") as mock_revalidate:
+            df, mock_fetch = self.fetch(
+                datetime(2024, 1, 1), datetime(2024, 1, 3), now
+            )
+
+        mock_fetch.assert_not_called()
+        mock_revalidate.assert_called_once_with(
+            FLOW_PARAMS, datetime(2024, 1, 1), datetime(2024, 1, 3)
+        )
+        self.assertEqual(len(df), 24)
+        self.assertEqual(df.attrs["cached_end"], datetime(2024, 1, 2))
+
+    def test_gaps_before_the_cached_end_are_fetched_at_once(self):
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 2), datetime(2024, 1, 3), now)
+
+        with patch.object(self.fetcher, "_revalidate") as mock_revalidate:
+            df, mock_fetch = self.fetch(
+                datetime(2024, 1, 1), datetime(2024, 1, 3), now
+            )
+
+        mock_revalidate.assert_not_called()
+        mock_fetch.assert_called_once()
+        self.assertNotIn("cached_end", df.attrs)
+
+    def test_series_is_not_refreshed_more_often_than_the_minimum_interval(self):
+        with patch("data_fetcher.threading.Thread") as mock_thread:
+            for _ in range(3):
+                self.fetcher._revalidate(
+                    FLOW_PARAMS, datetime(2024, 1, 1), datetime(2024, 1, 3)
+                )
+            self.assertEqual(mock_thread.call_count, 1)
+
+            with patch.object(ENTSOEDataFetcher, "MIN_REFRESH_INTERVAL", timedelta(0)):
+                self.fetcher._revalidate(
+                    FLOW_PARAMS, datetime(2024, 1, 1), datetime(2024, 1, 3)
+                )
+        self.assertEqual(mock_thread.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from file_lock import FileLock
+
+
+class TestFileLock(unittest.TestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.lock_dir, "locks", "series.lock")
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir)
+
+    def test_exclusive_lock_excludes_other_holders(self):
+        with FileLock(self.path):
+            self.assertFalse(FileLock(self.path).acquire(blocking=False))
+            self.assertFalse(FileLock(self.path, shared=True).acquire(blocking=False))
+
+        other = FileLock(self.path)
+        self.assertTrue(other.acquire(blocking=False))
+        other.release()
+
+    @unittest.skipIf(os.name == "nt", "Windows locks are always exclusive")
+    def test_shared_locks_coexist(self):
+        with FileLock(self.path, shared=True):
+            reader = FileLock(self.path, shared=True)
+            self.assertTrue(reader.acquire(blocking=False))
+            self.assertFalse(FileLock(self.path).acquire(blocking=False))
+            reader.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import gzip
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from http_pool import HTTPPool
+
+BODY = "<Publication_MarketDocument/>" * 100
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    """Answers with BODY, gzip-compressed when the client accepts it, and records
+    the client port and Accept-Encoding of every request."""
+
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        accept_encoding = self.headers.get("Accept-Encoding", "")
+        self.requests.append((self.client_address[1], accept_encoding))
+        data = BODY.encode("utf-8")
+        self.send_response(200)
+        if "gzip" in accept_encoding:
+            data = gzip.compress(data)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.requests.append((self.client_address[1], None))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class TestHTTPPool(unittest.TestCase):
+    def setUp(self):
+        GzipHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), GzipHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api"
+        self.pool = HTTPPool(pool_size=2)
+        self.addCleanup(self.pool.close)
+
+    def get(self) -> str:
+        async def request(session):
+            async with session.get(self.url) as response:
+                return await response.text()
+
+        async def run():
+            return await self.pool.run(request)
+
+        # Each call runs in its own event loop, like get_data does
+        return asyncio.run(run())
+
+    def test_connections_are_reused_across_event_loops(self):
+        self.assertEqual(self.get(), BODY)
+        self.assertEqual(self.get(), BODY)
+
+        ports = {port for port, _ in GzipHandler.requests}
+        self.assertEqual(len(ports), 1)
+
+    def test_responses_are_requested_compressed(self):
+        self.get()
+
+        self.assertIn("gzip", GzipHandler.requests[0][1])
+
+    def test_warm_opens_connections_that_requests_reuse(self):
+        self.pool.warm(self.url, 5)
+        warmed = {port for port, _ in GzipHandler.requests}
+
+        self.get()
+
+        self.assertEqual(len(warmed), 2)
+        self.assertIn(GzipHandler.requests[-1][0], warmed)
+
+
+if __name__ == "__main__":
+    unittest.main()
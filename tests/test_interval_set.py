@@ -0,0 +1,44 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from interval_set import IntervalSet
+
+
+def d(day, hour=0):
+    return datetime(2024, 1, day, hour)
+
+
+def test_add_merges_overlapping_and_touching_intervals():
+    intervals = IntervalSet([(d(1), d(2)), (d(3), d(4))])
+    intervals.add(d(2), d(3))
+    assert list(intervals) == [(d(1), d(4))]
+
+
+def test_add_keeps_disjoint_intervals_sorted():
+    intervals = IntervalSet([(d(5), d(6)), (d(1), d(2))])
+    assert list(intervals) == [(d(1), d(2)), (d(5), d(6))]
+    assert intervals.start == d(1)
+    assert intervals.end == d(6)
+
+
+def test_covers():
+    intervals = IntervalSet([(d(1), d(3)), (d(4), d(5))])
+    assert intervals.covers(d(1), d(3))
+    assert intervals.covers(d(1, 5), d(2))
+    assert not intervals.covers(d(2), d(4, 1))
+    assert not IntervalSet().covers(d(1), d(2))
+
+
+def test_missing_and_holes():
+    intervals = IntervalSet([(d(2), d(3)), (d(4), d(5))])
+    assert intervals.missing(d(1), d(6)) == [(d(1), d(2)), (d(3), d(4)), (d(5), d(6))]
+    assert intervals.missing(d(2), d(3)) == []
+    assert intervals.holes() == [(d(3), d(4))]
+
+
+def test_json_round_trip():
+    intervals = IntervalSet([(d(1), d(2)), (d(4), d(5, 6))])
+    assert IntervalSet.from_json(intervals.to_json()) == intervals
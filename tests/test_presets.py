@@ -0,0 +1,129 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import core
+import presets
+from data_fetcher import SimpleInterval
+from response_cache import ResponseCache
+from utils import RECORDS_START
+
+END = datetime(2024, 6, 1, 12)
+
+
+class TestPresets(unittest.TestCase):
+    def test_presets_end_at_the_newest_hour(self):
+        requests = {preset.name: preset.request(END) for preset in presets.PRESETS}
+
+        self.assertEqual(
+            requests["last_24_hours"], SimpleInterval(END - timedelta(days=1), END)
+        )
+        self.assertEqual(
+            requests["last_year"], SimpleInterval(END - timedelta(days=365), END)
+        )
+        self.assertEqual(requests["full_history"], SimpleInterval(RECORDS_START, END))
+
+    def test_windows_are_clamped_to_the_records(self):
+        end = RECORDS_START + timedelta(days=3)
+
+        last_30_days = next(p for p in presets.PRESETS if p.name == "last_30_days")
+
+        self.assertEqual(last_30_days.request(end), SimpleInterval(RECORDS_START, end))
+
+
+class TestPrecomputePresets(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.fetcher = SimpleNamespace(generation=1, cached=True)
+        self.fetcher.data_generation = lambda: self.fetcher.generation
+        self.fetcher.is_cached = lambda data_request, start_date: self.fetcher.cached
+        aggregated = pd.DataFrame(
+            {"B04": [1.0]}, index=pd.DatetimeIndex([END - timedelta(hours=1)])
+        )
+        self.generate = patch.object(
+            core,
+            "generate_visualization",
+            return_value=(aggregated, {"PT": aggregated, "ES": aggregated}),
+        ).start()
+        for patcher in (
+            patch.object(core, "_get_fetcher", return_value=self.fetcher),
+            patch.object(core, "_get_snapshot", return_value=None),
+            patch.object(
+                core,
+                "_get_response_cache",
+                return_value=ResponseCache(self.cache_dir, 1 << 20),
+            ),
+            patch.object(core, "maximum_date_end_exclusive", return_value=END),
+        ):
+            patcher.start()
+        self.addCleanup(patch.stopall)
+
+    def test_only_presets_of_an_older_generation_are_computed(self):
+        core.precompute_presets()
+        core.precompute_presets()
+
+        self.assertEqual(self.generate.call_count, len(presets.PRESETS))
+
+        self.fetcher.generation = 2
+        core.precompute_presets()
+
+        self.assertEqual(self.generate.call_count, 2 * len(presets.PRESETS))
+
+    def test_presets_missing_unpublished_hours_expire_with_the_newest_hour(self):
+        self.fetcher.cached = False
+        core.precompute_presets()
+        core.precompute_presets()
+
+        self.assertEqual(self.generate.call_count, len(presets.PRESETS))
+
+        # Nothing was written, but the missing hours may be published an hour on
+        data_request = presets.PRESETS[0].request(END)
+        tag = core.response_tag(data_request)
+        with patch.object(
+            core, "maximum_date_end_exclusive", return_value=END + timedelta(hours=1)
+        ):
+            self.assertNotEqual(core.response_tag(data_request), tag)
+
+    def test_preload_leaves_presets_to_writes_unless_asked(self):
+        self.fetcher.warm_connections = lambda: None
+        self.fetcher.preload = lambda: []
+        with patch.object(core, "precompute_presets") as precompute:
+            core._preload()
+            precompute.assert_not_called()
+
+            with patch.object(core, "PRELOAD_PRESETS", True):
+                core._preload()
+            precompute.assert_called_once()
+
+    def test_writes_schedule_a_single_refresh(self):
+        refreshed = threading.Event()
+        with patch.object(
+            core, "PRESET_REFRESH_DELAY", timedelta(milliseconds=50)
+        ), patch.object(
+            core, "precompute_presets", side_effect=refreshed.set
+        ) as precompute:
+            for cache_name in ("generation_pt", "generation_es", "generation_pt"):
+                core._schedule_preset_refresh(cache_name)
+            self.assertTrue(refreshed.wait(5))
+
+            # Writes after the run started schedule the next one
+            refreshed.clear()
+            core._schedule_preset_refresh("flow_pt_to_es")
+            self.assertTrue(refreshed.wait(5))
+
+        self.assertEqual(precompute.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import utils
+from data_fetcher import SimpleInterval
+from quality_index import INTERPOLATED, MISSING, ZERO, QualityIndex
+from time_pattern import AdvancedPattern
+from tests.test_fetcher_cache import FetcherCacheTestCase, make_flow_xml
+
+
+def frame(start, **columns):
+    length = len(next(iter(columns.values())))
+    return pd.DataFrame(
+        {
+            "start_time": pd.date_range(start, periods=length, freq="h"),
+            **columns,
+        }
+    )
+
+
+class TestQualityIndex(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.index = QualityIndex(self.cache_dir)
+
+    def test_flags_missing_interpolated_and_zero(self):
+        raw = frame(
+            datetime(2024, 1, 1),
+            B16=[np.nan, 0.0, np.nan, 4.0],
+            B18=[np.nan] * 4,
+        )
+        self.index.update("generation_pt", raw, utils.canonicalize(raw))
+
+        bitmaps = self.index.read("generation_pt")
+        self.assertEqual(bitmaps["columns"], ["B16", "B18"])
+        self.assertTrue(bitmaps["known"].all())
+        self.assertEqual(bitmaps[MISSING][0].tolist(), [True, False, False, False])
+        self.assertEqual(
+            bitmaps[INTERPOLATED][0].tolist(), [False, False, True, False]
+        )
+        self.assertEqual(bitmaps[ZERO][0].tolist(), [False, True, False, False])
+        self.assertTrue(bitmaps[MISSING][1].all())
+
+    def test_updates_extend_and_replace_recorded_hours(self):
+        first = frame(datetime(2024, 1, 1, 2), B16=[1.0, 2.0])
+        self.index.update("generation_pt", first, first)
+        later = frame(datetime(2024, 1, 1, 3), B16=[0.0], B19=[5.0])
+        self.index.update("generation_pt", later, later)
+        earlier = frame(datetime(2024, 1, 1), B16=[1.0])
+        self.index.update("generation_pt", earlier, earlier)
+
+        bitmaps = self.index.read("generation_pt")
+        self.assertEqual(bitmaps["first"], utils.hour_offset(datetime(2024, 1, 1)))
+        self.assertEqual(bitmaps["known"].tolist(), [True, False, True, True])
+        self.assertEqual(bitmaps[ZERO][0].tolist(), [False, False, False, True])
+        # B19 was not part of the rows written before it appeared
+        self.assertEqual(bitmaps[MISSING][1].tolist(), [True, False, True, False])
+
+
+class TestQualityReport(FetcherCacheTestCase):
+    def test_report_counts_flags_and_gaps_without_loading_values(self):
+        def chunks_with_gap(params, start_date, end_date):
+            return [
+                make_flow_xml(start_date, datetime(2024, 1, 1, 2), value=0),
+                make_flow_xml(datetime(2024, 1, 1, 5), end_date, value=30),
+            ]
+
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now, chunks_with_gap)
+
+        with patch("utils.maximum_date_end_exclusive", return_value=now), patch.object(
+            self.fetcher.cache, "load"
+        ) as mock_load:
+            reports = self.fetcher.quality_report(
+                SimpleInterval(datetime(2024, 1, 1), datetime(2024, 1, 3))
+            )
+
+        mock_load.assert_not_called()
+        report = reports["flow_es_to_pt"]
+        self.assertEqual((report.hours, report.covered_hours), (48, 24))
+        self.assertEqual(report.indexed_hours, 24)
+        self.assertEqual(
+            report.counts["Power"], {MISSING: 0, INTERPOLATED: 3, ZERO: 2}
+        )
+        self.assertEqual(report.gaps, [(datetime(2024, 1, 2), datetime(2024, 1, 3))])
+        self.assertEqual(reports["generation_pt"].covered_hours, 0)
+
+    def test_report_only_counts_hours_of_the_pattern(self):
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 3), now)
+
+        with patch("utils.maximum_date_end_exclusive", return_value=now):
+            report = self.fetcher.quality_report(
+                AdvancedPattern("2024", "1", "1-2", "12")
+            )["flow_es_to_pt"]
+
+        self.assertEqual(report.covered_hours, 2)
+        self.assertEqual(report.indexed_hours, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
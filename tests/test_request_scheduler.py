@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+import aiohttp
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from request_scheduler import RequestScheduler, TokenBucket
+
+
+def http_error(status, headers=None):
+    return aiohttp.ClientResponseError(
+        request_info=Mock(real_url="https://web-api.tp.entsoe.eu/api"), history=(), status=status, headers=headers
+    )
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = RequestScheduler(
+            requests_per_minute=60_000, max_retries=3, base_delay=0.001
+        )
+
+    def test_rate_limited_request_is_retried(self):
+        request = AsyncMock(side_effect=[http_error(429), http_error(503), "<xml/>"])
+
+        result = asyncio.run(self.scheduler.run(request))
+
+        self.assertEqual(result, "<xml/>")
+        self.assertEqual(request.await_count, 3)
+
+    def test_client_errors_are_not_retried(self):
+        request = AsyncMock(side_effect=http_error(400))
+
+        with self.assertRaises(aiohttp.ClientResponseError):
+            asyncio.run(self.scheduler.run(request))
+        self.assertEqual(request.await_count, 1)
+
+    def test_last_error_is_raised_once_retries_run_out(self):
+        request = AsyncMock(side_effect=http_error(503))
+
+        with self.assertRaises(aiohttp.ClientResponseError):
+            asyncio.run(self.scheduler.run(request))
+        self.assertEqual(request.await_count, 4)
+
+    def test_backoff_honors_retry_after(self):
+        self.assertEqual(self.scheduler.backoff(0, retry_after=30), 30)
+        self.assertLessEqual(self.scheduler.backoff(20), self.scheduler.max_delay)
+
+    def test_requests_in_flight_are_bounded(self):
+        scheduler = RequestScheduler(requests_per_minute=60_000, max_in_flight=2)
+        in_flight = []
+        peak = []
+
+        async def request():
+            in_flight.append(None)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+
+        async def run():
+            await asyncio.gather(*[scheduler.run(request) for _ in range(6)])
+
+        asyncio.run(run())
+
+        self.assertEqual(max(peak), 2)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_requests_past_the_burst_are_paced(self):
+        bucket = TokenBucket(rate_per_second=50, capacity=2)
+
+        async def acquire(n):
+            for _ in range(n):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        asyncio.run(acquire(2))
+        self.assertLess(time.monotonic() - started, 0.02)
+
+        started = time.monotonic()
+        asyncio.run(acquire(3))
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from data_fetcher import ENTSOEDataFetcher
+from response_archive import ResponseArchive
+from tests.test_fetcher_cache import FLOW_PARAMS, FetcherCacheTestCase, make_flow_xml
+
+CHUNK_PARAMS = dict(
+    FLOW_PARAMS,
+    periodStart="202401010000",
+    periodEnd="202401020000",
+    securityToken="secret",
+)
+
+
+class TestResponseArchive(unittest.TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.archive = ResponseArchive(self.archive_dir)
+
+    def test_round_trip_without_security_token(self):
+        xml = make_flow_xml(datetime(2024, 1, 1), datetime(2024, 1, 2))
+        digest = self.archive.put(CHUNK_PARAMS, xml)
+
+        self.assertEqual(self.archive.get(digest), xml)
+        self.assertEqual(self.archive.series(), ["flow_es_to_pt"])
+        (entry,) = self.archive.latest("flow_es_to_pt")
+        self.assertEqual(entry["sha256"], digest)
+        self.assertNotIn("securityToken", entry["params"])
+
+    def test_unchanged_response_is_stored_once(self):
+        xml = make_flow_xml(datetime(2024, 1, 1), datetime(2024, 1, 2))
+        self.archive.put(CHUNK_PARAMS, xml)
+        self.archive.put(CHUNK_PARAMS, xml)
+
+        self.assertEqual(len(self.archive.entries("flow_es_to_pt")), 1)
+
+    def test_revision_supersedes_earlier_response(self):
+        self.archive.put(
+            CHUNK_PARAMS, make_flow_xml(datetime(2024, 1, 1), datetime(2024, 1, 2), 1)
+        )
+        revised = self.archive.put(
+            CHUNK_PARAMS, make_flow_xml(datetime(2024, 1, 1), datetime(2024, 1, 2), 2)
+        )
+
+        self.assertEqual(len(self.archive.entries("flow_es_to_pt")), 2)
+        self.assertEqual(
+            [entry["sha256"] for entry in self.archive.latest("flow_es_to_pt")],
+            [revised],
+        )
+
+
+class TestRebuildFromArchive(FetcherCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        patcher = patch.object(ENTSOEDataFetcher, "ARCHIVE_DIR", self.archive_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fetcher = ENTSOEDataFetcher()
+
+    def test_rebuild_restores_cache_without_requests(self):
+        async def fake_request(session, params):
+            start = datetime.strptime(params["periodStart"], "%Y%m%d%H%M")
+            end = datetime.strptime(params["periodEnd"], "%Y%m%d%H%M")
+            return make_flow_xml(start, end)
+
+        with patch.object(
+            self.fetcher, "_make_request_async", side_effect=fake_request
+        ):
+            fetched = asyncio.run(
+                self.fetcher._fetch_gap(
+                    dict(FLOW_PARAMS), datetime(2024, 1, 1), datetime(2024, 1, 3)
+                )
+            )
+        self.fetcher.reset_cache()
+
+        with patch.object(self.fetcher, "_make_request_async") as mock_request:
+            rebuilt = self.fetcher.rebuild_from_archive(max_workers=2)
+
+        mock_request.assert_not_called()
+        self.assertEqual(rebuilt, {"flow_es_to_pt": 1})
+        self.assertEqual(
+            list(self.fetcher.cache.coverage("flow_es_to_pt")),
+            [(datetime(2024, 1, 1), datetime(2024, 1, 3))],
+        )
+        cached = self.fetcher.cache.load("flow_es_to_pt")
+        self.assertEqual(cached["Power"].tolist(), fetched["Power"].tolist())
+
+    def test_rebuild_requires_archive(self):
+        with patch.object(ENTSOEDataFetcher, "ARCHIVE_DIR", None):
+            fetcher = ENTSOEDataFetcher()
+        with self.assertRaises(ValueError):
+            fetcher.rebuild_from_archive()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+import response_cache
+from response_cache import ResponseCache
+
+KEY = ("interval", datetime(2024, 1, 1), datetime(2024, 2, 1))
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_tag_depends_on_request_and_generation(self):
+        generation = (("/cache", "flow_es_to_pt", ((2024, "v1"),)),)
+
+        self.assertEqual(
+            response_cache.tag(KEY, generation), response_cache.tag(KEY, generation)
+        )
+        self.assertNotEqual(
+            response_cache.tag(KEY, generation),
+            response_cache.tag(KEY, (("/cache", "flow_es_to_pt", ((2024, "v2"),)),)),
+        )
+
+    def test_stored_body_is_read_back(self):
+        cache = ResponseCache(os.path.join(self.cache_dir, "responses"), 1 << 20)
+        self.assertIsNone(cache.get("abc"))
+
+        cache.put("abc", '{"data": {}}')
+
+        self.assertEqual(cache.get("abc"), '{"data": {}}')
+        self.assertEqual(
+            os.listdir(os.path.join(self.cache_dir, "responses")), ["abc.json"]
+        )
+
+    def test_prune_removes_least_recently_read_bodies(self):
+        cache = ResponseCache(self.cache_dir, 250)
+        for i, name in enumerate(["a", "b"]):
+            cache.put(name, "x" * 100)
+            os.utime(os.path.join(self.cache_dir, f"{name}.json"), ns=(i, i))
+        cache.get("a")
+
+        cache.put("c", "x" * 100)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
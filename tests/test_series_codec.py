@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from series_codec import decode_column, encode_column, quantize
+
+
+def test_round_trip_with_gaps():
+    values = np.array([100.0, 101.25, np.nan, np.nan, 98.5, 0.0, 3000.75])
+    decoded = decode_column(encode_column(values))
+    np.testing.assert_array_equal(decoded, values)
+
+
+def test_all_nan_column():
+    values = np.full(10, np.nan)
+    decoded = decode_column(encode_column(values))
+    assert decoded.shape == (10,)
+    assert np.isnan(decoded).all()
+
+
+def test_empty_column():
+    assert decode_column(encode_column(np.array([]))).size == 0
+
+
+def test_quantization_error_is_bounded():
+    values = np.random.default_rng(0).uniform(-5000, 5000, 1000)
+    decoded = decode_column(encode_column(values, scale=100))
+    assert np.abs(decoded - values).max() <= 0.005 + 1e-9
+
+
+def test_quantize_matches_the_round_trip():
+    values = np.random.default_rng(0).uniform(-5000, 5000, 1000)
+    values[::7] = np.nan
+    values[1] = -0.001
+    np.testing.assert_array_equal(
+        quantize(values).view(np.int64),
+        decode_column(encode_column(values)).view(np.int64),
+    )
+
+
+def test_large_jumps_use_wider_deltas():
+    values = np.array([0.0, 60000.0, -60000.0])
+    np.testing.assert_array_equal(decode_column(encode_column(values)), values)
+
+
+def test_rejects_foreign_data():
+    with pytest.raises(ValueError):
+        decode_column(b"XXXX" + bytes(13))
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../core")))
+
+from cache_backend import open_backend
+from series_memo import SeriesMemo, slice_series
+from tests.test_fetcher_cache import FLOW_PARAMS, FetcherCacheTestCase
+
+
+def frame(hours, start="2024-01-01"):
+    return pd.DataFrame(
+        {
+            "start_time": pd.date_range(start, periods=hours, freq="h"),
+            "B04": [float(i) for i in range(hours)],
+            "B16": [0.0] * hours,
+        }
+    )
+
+
+def nbytes(df):
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class TestSeriesMemo(unittest.TestCase):
+    def test_evicts_least_recently_used_beyond_max_bytes(self):
+        df = frame(10)
+        memo = SeriesMemo(2 * nbytes(df))
+        memo.put(("cache", "a"), 1, df)
+        memo.put(("cache", "b"), 1, frame(10))
+        memo.get(("cache", "a"), 1)
+
+        memo.put(("cache", "c"), 1, frame(10))
+
+        self.assertIsNone(memo.get(("cache", "b"), 1))
+        self.assertIs(memo.get(("cache", "a"), 1), df)
+        self.assertEqual(memo.size, 2 * nbytes(df))
+
+    def test_changed_version_is_a_miss(self):
+        memo = SeriesMemo(1 << 20)
+        memo.put(("cache", "a"), (("2024", "v1"),), frame(10))
+
+        self.assertIsNone(memo.get(("cache", "a"), (("2024", "v2"),)))
+        self.assertEqual((len(memo), memo.size), (0, 0))
+
+    def test_series_larger_than_the_bound_are_not_held(self):
+        memo = SeriesMemo(nbytes(frame(10)))
+
+        memo.put(("cache", "a"), 1, frame(100))
+
+        self.assertEqual(len(memo), 0)
+
+    def test_concurrent_loads_wait_for_the_one_in_flight(self):
+        memo = SeriesMemo(1 << 20)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return frame(10)
+
+        results = []
+        first = threading.Thread(
+            target=lambda: results.append(memo.load(("cache", "a"), 1, loader))
+        )
+        first.start()
+        started.wait()
+        second = threading.Thread(
+            target=lambda: results.append(memo.load(("cache", "a"), 1, loader))
+        )
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertIs(results[0], results[1])
+
+    def test_slice_is_a_copy_of_the_requested_rows_and_columns(self):
+        df = frame(48)
+
+        sliced = slice_series(
+            df, datetime(2024, 1, 1, 5), datetime(2024, 1, 1, 8), ["B04", "B19"]
+        )
+        sliced.loc[0, "B04"] = -1.0
+
+        self.assertEqual(list(sliced.columns), ["start_time", "B04"])
+        self.assertEqual(sliced["start_time"].iloc[0], datetime(2024, 1, 1, 5))
+        self.assertEqual(len(sliced), 3)
+        self.assertEqual(df.loc[5, "B04"], 5.0)
+
+
+class TestFetcherMemory(FetcherCacheTestCase):
+    def load(self, start_date, end_date):
+        return asyncio.run(
+            self.fetcher._load_from_cache(dict(FLOW_PARAMS), start_date, end_date)
+        )
+
+    def test_repeated_loads_skip_the_disk_until_the_series_changes(self):
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now)
+        self.load(datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+        with patch.object(
+            self.fetcher.cache, "load", wraps=self.fetcher.cache.load
+        ) as mock_load:
+            df = self.load(datetime(2024, 1, 1, 6), datetime(2024, 1, 1, 9))
+            mock_load.assert_not_called()
+            self.assertEqual(df["Power"].tolist(), [6.0, 7.0, 8.0])
+            self.assertTrue(df.attrs["canonical"])
+
+            # Written by another process
+            other = open_backend("columnar", self.cache_dir)
+            revised = pd.DataFrame(
+                {"start_time": [datetime(2024, 1, 1, 7)], "Power": [70.0]}
+            )
+            other.append("flow_es_to_pt", FLOW_PARAMS, revised, [], canonical=True)
+            df = self.load(datetime(2024, 1, 1, 6), datetime(2024, 1, 1, 9))
+
+        mock_load.assert_called_once()
+        self.assertEqual(df["Power"].tolist(), [6.0, 70.0, 8.0])
+
+    def test_preload_holds_every_cached_series(self):
+        now = datetime(2024, 1, 5)
+        self.fetch(datetime(2024, 1, 1), datetime(2024, 1, 2), now)
+        # As in a new process
+        self.fetcher.memory = SeriesMemo(1 << 20)
+
+        self.assertEqual(self.fetcher.preload(), ["flow_es_to_pt"])
+
+        with patch.object(self.fetcher.cache, "load") as mock_load:
+            self.load(datetime(2024, 1, 1), datetime(2024, 1, 2))
+        mock_load.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""Compare cache formats on the real .data_cache files.
+
+For every legacy <series>.pkl.gz in the cache directory this measures on-disk size,
+encode time and decode time of:
+
+  - pickle:  the legacy format (ENTSOEDataFetcher.COMPRESSION_METHOD over a pickled
+             DataFrame, stored with ENTSOEDataFetcher.CACHE_EXTENSION)
+  - npy:     raw float64 columns on the hourly grid (memory-mappable)
+  - edz:     series_codec (implicit timestamps, quantized deltas, NaN bitmap)
+
+Usage: python tools/benchmark_cache_codec.py [cache_dir]
+"""
+
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core")
+sys.path.insert(0, CORE_DIR)
+
+import series_codec  # noqa: E402
+import utils  # noqa: E402
+from data_fetcher import ENTSOEDataFetcher  # noqa: E402
+
+REPEATS = 3
+
+
+def _best_time(function):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _to_grid(df: pd.DataFrame) -> dict:
+    offsets = (
+        (df["start_time"] - pd.Timestamp(utils.RECORDS_START)) // utils.HOUR
+    ).to_numpy()
+    first, rows = offsets.min(), offsets.max() + 1
+    columns = {}
+    for column in df.columns.drop("start_time"):
+        values = np.full(rows - first, np.nan)
+        values[offsets - first] = df[column].to_numpy(dtype="float64")
+        columns[column] = values
+    return columns
+
+
+def bench_pickle(df: pd.DataFrame):
+    compression = {
+        "method": ENTSOEDataFetcher.COMPRESSION_METHOD,
+        "compresslevel": 1,
+        "mtime": 0,
+    }
+
+    def encode():
+        buffer = io.BytesIO()
+        df.to_pickle(buffer, compression=compression)
+        return buffer.getvalue()
+
+    encode_time, data = _best_time(encode)
+    decode_time, _ = _best_time(
+        lambda: pd.read_pickle(
+            io.BytesIO(data), compression=ENTSOEDataFetcher.COMPRESSION_METHOD
+        )
+    )
+    return len(data), encode_time, decode_time, 0.0
+
+
+def bench_npy(columns: dict):
+    def encode():
+        encoded = {}
+        for column, values in columns.items():
+            buffer = io.BytesIO()
+            np.save(buffer, values)
+            encoded[column] = buffer.getvalue()
+        return encoded
+
+    encode_time, encoded = _best_time(encode)
+    decode_time, _ = _best_time(
+        lambda: {c: np.load(io.BytesIO(data)) for c, data in encoded.items()}
+    )
+    return sum(map(len, encoded.values())), encode_time, decode_time, 0.0
+
+
+def bench_edz(columns: dict):
+    encode_time, encoded = _best_time(
+        lambda: {c: series_codec.encode_column(v) for c, v in columns.items()}
+    )
+    decode_time, decoded = _best_time(
+        lambda: {c: series_codec.decode_column(data) for c, data in encoded.items()}
+    )
+    max_error = max(
+        float(np.nanmax(np.abs(decoded[c] - v), initial=0.0))
+        for c, v in columns.items()
+    )
+    return sum(map(len, encoded.values())), encode_time, decode_time, max_error
+
+
+def main():
+    cache_dir = sys.argv[1] if len(sys.argv) > 1 else ENTSOEDataFetcher.CACHE_DIR
+    suffix = f".{ENTSOEDataFetcher.CACHE_EXTENSION}"
+    files = sorted(f for f in os.listdir(cache_dir) if f.endswith(suffix))
+    if not files:
+        print(f"No *{suffix} files found in {cache_dir}")
+        return
+
+    header = (
+        f"{'series':<16}{'format':<8}{'size (KB)':>12}{'encode (ms)':>14}"
+        f"{'decode (ms)':>14}{'max err (MW)':>14}"
+    )
+    print(header)
+    print("-" * len(header))
+    totals = {}
+    for file_name in files:
+        df = pd.read_pickle(os.path.join(cache_dir, file_name))
+        columns = _to_grid(df)
+        series = file_name[: -len(suffix)]
+        for name, result in (
+            ("pickle", bench_pickle(df)),
+            ("npy", bench_npy(columns)),
+            ("edz", bench_edz(columns)),
+        ):
+            size, encode_time, decode_time, max_error = result
+            total = totals.setdefault(name, [0, 0.0, 0.0])
+            total[0] += size
+            total[1] += encode_time
+            total[2] += decode_time
+            print(
+                f"{series:<16}{name:<8}{size / 1024:>12.1f}{encode_time * 1000:>14.1f}"
+                f"{decode_time * 1000:>14.1f}{max_error:>14.4f}"
+            )
+
+    print("-" * len(header))
+    for name, (size, encode_time, decode_time) in totals.items():
+        print(
+            f"{'TOTAL':<16}{name:<8}{size / 1024:>12.1f}{encode_time * 1000:>14.1f}"
+            f"{decode_time * 1000:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()